@@ -21,7 +21,6 @@ import pandas as pd
 import great_expectations as ge
 from great_expectations.core.batch import RuntimeBatchRequest
 from great_expectations.validator.validator import Validator
-from pyspark.sql import SparkSession
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -29,6 +28,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Import GE setup module
 from data_validation.ge_setup import create_data_context, configure_spark_datasource
 
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -48,17 +50,12 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 BRONZE_DIR = os.path.join(DATA_DIR, "bronze")
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Bronze Data Validation")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", os.path.join(DATA_DIR, "warehouse"))
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session(
+        "E-commerce Bronze Data Validation", profile, input_bytes,
+        extra_config={"spark.sql.warehouse.dir": os.path.join(DATA_DIR, "warehouse")}
+    )
 
 def create_user_activity_expectations(context, suite_name="user_activity_bronze_suite"):
     """
@@ -238,7 +235,7 @@ def create_orders_expectations(context, suite_name="orders_bronze_suite"):
                 ("customer_id", "string"),
                 ("order_date", "string"),
                 ("order_status", "string"),
-                ("items_str", "string"),
+                ("items", "array<struct<product_id:int,category:string,price:double,quantity:int>>"),
                 ("payment_method", "string"),
                 ("shipping_method", "string"),
                 ("shipping_cost", "double"),
@@ -247,8 +244,8 @@ def create_orders_expectations(context, suite_name="orders_bronze_suite"):
                 ("coupon_code", "string"),
                 ("subtotal", "double"),
                 ("total", "double"),
-                ("billing_address_str", "string"),
-                ("shipping_address_str", "string")
+                ("billing_address", "struct<street:string,city:string,state:string,zip:string,country:string>"),
+                ("shipping_address", "struct<street:string,city:string,state:string,zip:string,country:string>")
             ]
             
             data = []
@@ -279,9 +276,9 @@ def create_orders_expectations(context, suite_name="orders_bronze_suite"):
         validator.expect_table_row_count_to_be_between(min_value=1, max_value=None)
         validator.expect_table_columns_to_match_ordered_list(
             column_list=[
-                "order_id", "customer_id", "order_date", "order_status", "items_str",
+                "order_id", "customer_id", "order_date", "order_status", "items",
                 "payment_method", "shipping_method", "shipping_cost", "tax", "discount",
-                "coupon_code", "subtotal", "total", "billing_address_str", "shipping_address_str"
+                "coupon_code", "subtotal", "total", "billing_address", "shipping_address"
             ]
         )
         
@@ -309,26 +306,9 @@ def create_orders_expectations(context, suite_name="orders_bronze_suite"):
             ["pending", "processing", "shipped", "delivered", "cancelled", "returned"]
         )
         
-        # Column level expectations - items_str
-        validator.expect_column_to_exist("items_str")
-        validator.expect_column_values_to_not_be_null("items_str")
-        validator.expect_column_values_to_match_json_schema(
-            "items_str",
-            {
-                "type": "array",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "product_id": {"type": "integer"},
-                        "category": {"type": "string"},
-                        "price": {"type": "number"},
-                        "quantity": {"type": "integer"}
-                    },
-                    "required": ["product_id", "price", "quantity"]
-                }
-            },
-            mostly=0.95  # Allow some invalid formats
-        )
+        # Column level expectations - items (parsed at ingestion, failures kept in _parse_errors)
+        validator.expect_column_to_exist("items")
+        validator.expect_column_values_to_not_be_null("items", mostly=0.95)  # Allow some invalid formats
         
         # Column level expectations - payment_method
         validator.expect_column_to_exist("payment_method")
@@ -380,8 +360,8 @@ def create_orders_expectations(context, suite_name="orders_bronze_suite"):
         validator.expect_column_values_to_be_of_type("total", "DoubleType")
         validator.expect_column_values_to_be_between("total", min_value=0, max_value=None)
         
-        # Column level expectations - billing_address_str and shipping_address_str
-        for address_field in ["billing_address_str", "shipping_address_str"]:
+        # Column level expectations - billing_address and shipping_address
+        for address_field in ["billing_address", "shipping_address"]:
             validator.expect_column_to_exist(address_field)
             validator.expect_column_values_to_not_be_null(address_field)
   
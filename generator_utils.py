@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""
+Shared Helpers for the E-commerce Data Generators
+
+This module holds helpers used by more than one data generator.
+"""
+
+import random
+import uuid
+
+def generate_uuid():
+    """Generate a random UUID4 string using the seedable random module."""
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
@@ -23,7 +23,6 @@ import numpy as np
 import great_expectations as ge
 from great_expectations.core.batch import RuntimeBatchRequest
 from great_expectations.validator.validator import Validator
-from pyspark.sql import SparkSession
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -31,6 +30,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Import GE setup module
 from data_validation.ge_setup import create_data_context, configure_spark_datasource
 
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -50,17 +52,12 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 GOLD_DIR = os.path.join(DATA_DIR, "gold")
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Gold Data Validation")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", os.path.join(DATA_DIR, "warehouse"))
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session(
+        "E-commerce Gold Data Validation", profile, input_bytes,
+        extra_config={"spark.sql.warehouse.dir": os.path.join(DATA_DIR, "warehouse")}
+    )
 
 def create_dim_customer_expectations(context, suite_name="dim_customer_gold_suite"):
     """
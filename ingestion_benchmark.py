@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Ingestion Benchmark Module for E-commerce Data Pipeline
+
+This module measures how long it takes to turn inventory data held in pandas
+into a Spark DataFrame, comparing:
+- The original path: spark.createDataFrame(pdf) with type inference
+- The Arrow path: pandas_to_spark with the inventory schema
+
+Results are logged and written as a JSON report.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import ingestion and generator modules
+from data_ingestion.ingestion_module import get_spark_session, get_inventory_schema, pandas_to_spark
+from data_generation.inventory_generator import generate_inventory_data
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("../logs/ingestion_benchmark.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("ingestion_benchmark")
+
+# Create logs directory if it doesn't exist
+os.makedirs("../logs", exist_ok=True)
+
+DEFAULT_ROW_COUNTS = [1000, 10000, 100000]
+
+def build_inventory_frame(num_rows):
+    """
+    Build a pandas DataFrame of inventory data, as pd.read_excel would return it.
+    
+    Args:
+        num_rows: Number of inventory rows
+    
+    Returns:
+        pandas DataFrame
+    """
+    inventory_data = generate_inventory_data(num_rows, datetime.datetime(2025, 1, 1))
+    pdf = pd.DataFrame(inventory_data)
+    pdf["last_restock_date"] = pd.to_datetime(pdf["last_restock_date"])
+    return pdf
+
+def time_conversion(convert, repeats):
+    """
+    Time a pandas to Spark conversion, forcing the data into Spark each run.
+    
+    Args:
+        convert: Function returning a Spark DataFrame
+        repeats: Number of timed runs
+    
+    Returns:
+        Best run time in seconds
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        convert().count()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def run_benchmark(spark, row_counts=None, repeats=3):
+    """
+    Benchmark the inferred and Arrow conversion paths across row counts.
+    
+    Args:
+        spark: SparkSession
+        row_counts: List of row counts to benchmark
+        repeats: Number of timed runs per path and row count
+    
+    Returns:
+        List of result dictionaries
+    """
+    if row_counts is None:
+        row_counts = DEFAULT_ROW_COUNTS
+    
+    schema = get_inventory_schema()
+    results = []
+    
+    for num_rows in row_counts:
+        pdf = build_inventory_frame(num_rows)
+        
+        def convert_inferred():
+            # Disable Arrow for this conversion only; the session is shared
+            previous = spark.conf.get("spark.sql.execution.arrow.pyspark.enabled", None)
+            spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "false")
+            try:
+                return spark.createDataFrame(pdf)
+            finally:
+                if previous is None:
+                    spark.conf.unset("spark.sql.execution.arrow.pyspark.enabled")
+                else:
+                    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", previous)
+        
+        def convert_arrow():
+            return pandas_to_spark(spark, pdf, schema)
+        
+        inferred_seconds = time_conversion(convert_inferred, repeats)
+        arrow_seconds = time_conversion(convert_arrow, repeats)
+        
+        result = {
+            "rows": num_rows,
+            "inferred_seconds": round(inferred_seconds, 4),
+            "arrow_seconds": round(arrow_seconds, 4),
+            "speedup": round(inferred_seconds / arrow_seconds, 2) if arrow_seconds > 0 else None
+        }
+        results.append(result)
+        logger.info(
+            f"{num_rows} rows: inferred {result['inferred_seconds']}s, "
+            f"arrow {result['arrow_seconds']}s, speedup {result['speedup']}x"
+        )
+    
+    return results
+
+def main():
+    """Main function to run the conversion benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark pandas to Spark conversion for inventory ingestion")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROW_COUNTS, help="Row counts to benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per path and row count")
+    parser.add_argument("--output", default="../data/benchmarks/inventory_conversion.json", help="Path to JSON report")
+    args = parser.parse_args()
+    
+    spark = get_spark_session()
+    
+    try:
+        results = run_benchmark(spark, args.rows, args.repeats)
+        
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        
+        logger.info(f"Saved benchmark results to {args.output}")
+    
+    except Exception as e:
+        logger.error(f"Error running ingestion benchmark: {str(e)}")
+        raise
+    
+    finally:
+        spark.stop()
+
+if __name__ == "__main__":
+    main()
@@ -15,13 +15,28 @@ It includes functionality for:
 """
 
 import os
+import sys
 import json
+import hashlib
 import pandas as pd
 import datetime
 import logging
-from pyspark.sql import SparkSession
+import argparse
+import time
+import uuid
+import threading
+from pyspark.sql import SparkSession, Observation
+from pyspark.sql.utils import AnalysisException
+from pyspark import StorageLevel, InheritableThread
+from pyspark.sql.functions import col, count, current_date, trim, to_json, from_json, lit, when, size, coalesce, struct, map_filter, expr, explode, array as spark_array, array_except
 from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType, BooleanType, ArrayType, MapType, TimestampType
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,19 +55,15 @@ os.makedirs("../logs", exist_ok=True)
 os.makedirs("../data/bronze", exist_ok=True)
 os.makedirs("../data/silver", exist_ok=True)
 os.makedirs("../data/gold", exist_ok=True)
+os.makedirs("../data/quarantine", exist_ok=True)
 
 # Initialize Spark session
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Data Pipeline")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", "../data/warehouse")
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session(
+        "E-commerce Data Pipeline", profile, input_bytes,
+        extra_config={"spark.scheduler.mode": "FAIR"}
+    )
 
 # Schema definitions
 def get_user_activity_schema():
@@ -84,6 +95,27 @@ def get_user_activity_schema():
         ), True)
     ])
 
+def get_items_schema():
+    """Define and return the schema for order items."""
+    return ArrayType(
+        StructType([
+            StructField("product_id", IntegerType(), True),
+            StructField("category", StringType(), True),
+            StructField("price", DoubleType(), True),
+            StructField("quantity", IntegerType(), True)
+        ])
+    )
+
+def get_address_schema():
+    """Define and return the schema for addresses."""
+    return StructType([
+        StructField("street", StringType(), True),
+        StructField("city", StringType(), True),
+        StructField("state", StringType(), True),
+        StructField("zip", StringType(), True),
+        StructField("country", StringType(), True)
+    ])
+
 def get_orders_schema():
     """Define and return the schema for orders data."""
     return StructType([
@@ -99,10 +131,10 @@ def get_orders_schema():
         StructField("discount", DoubleType(), True),
         StructField("coupon_code", StringType(), True),
         StructField("total", DoubleType(), False),
-        # Complex fields will be handled separately
-        StructField("items_str", StringType(), True),
-        StructField("billing_address_str", StringType(), True),
-        StructField("shipping_address_str", StringType(), True)
+        # Complex fields, parsed from JSON text at ingestion
+        StructField("items", get_items_schema(), True),
+        StructField("billing_address", get_address_schema(), True),
+        StructField("shipping_address", get_address_schema(), True)
     ])
 
 def get_inventory_schema():
@@ -123,110 +155,868 @@ def get_inventory_schema():
         StructField("is_active", BooleanType(), True)
     ])
 
+# Rows per Arrow record batch when streaming XLSX files
+XLSX_CHUNK_ROWS = 50000
+
+def spark_type_to_arrow(data_type):
+    """
+    Convert a PySpark DataType to the equivalent Arrow type.
+    
+    Args:
+        data_type: PySpark DataType
+    
+    Returns:
+        pyarrow DataType
+    """
+    import pyarrow as pa
+    
+    if isinstance(data_type, StructType):
+        return pa.struct([(field.name, spark_type_to_arrow(field.dataType)) for field in data_type.fields])
+    elif isinstance(data_type, ArrayType):
+        return pa.list_(spark_type_to_arrow(data_type.elementType))
+    elif isinstance(data_type, StringType):
+        return pa.string()
+    elif isinstance(data_type, IntegerType):
+        return pa.int32()
+    elif isinstance(data_type, DoubleType):
+        return pa.float64()
+    elif isinstance(data_type, BooleanType):
+        return pa.bool_()
+    elif isinstance(data_type, TimestampType):
+        return pa.timestamp("us")
+    else:
+        raise ValueError(f"Unsupported data type: {data_type}")
+
+def parse_text_column(strings, arrow_type):
+    """
+    Parse an Arrow string array into the given type, with nulls for bad values.
+    
+    Values are checked with vectorized pattern matches before the cast, so
+    one bad cell does not force a per-value conversion of the whole column.
+    
+    Args:
+        strings: pyarrow string Array
+        arrow_type: Target pyarrow DataType
+    
+    Returns:
+        pyarrow Array
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    trimmed = pc.utf8_trim_whitespace(strings)
+    
+    if pa.types.is_integer(arrow_type):
+        valid = pc.match_substring_regex(trimmed, r"^[-+]?\d+$")
+    elif pa.types.is_floating(arrow_type):
+        valid = pc.match_substring_regex(trimmed, r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+    elif pa.types.is_boolean(arrow_type):
+        lowered = pc.utf8_lower(trimmed)
+        is_true = pc.is_in(lowered, value_set=pa.array(["true", "1"]))
+        is_known = pc.is_in(lowered, value_set=pa.array(["true", "false", "1", "0"]))
+        return pc.if_else(is_known, is_true, pa.scalar(None, type=pa.bool_()))
+    elif pa.types.is_timestamp(arrow_type):
+        return pc.coalesce(*[
+            pc.strptime(trimmed, format=fmt, unit=arrow_type.unit, error_is_null=True)
+            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d")
+        ])
+    else:
+        return pc.cast(trimmed, arrow_type)
+    
+    return pc.cast(pc.if_else(valid, trimmed, pa.scalar(None, type=pa.string())), arrow_type)
+
+def rows_to_arrow_column(values, arrow_type):
+    """
+    Convert a list of cell values into an Arrow array of the given type.
+    
+    The column is cast as a whole. Only if that fails are the values parsed
+    from their text form, where cells that cannot be converted become nulls,
+    the same as a failed cast in handle_schema_evolution.
+    
+    Args:
+        values: List of Python cell values
+        arrow_type: Target pyarrow DataType
+    
+    Returns:
+        pyarrow Array
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed cell types, fall back to parsing their text form
+        array = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    
+    if array.type == arrow_type:
+        return array
+    
+    try:
+        return array.cast(arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
+    
+    strings = array if pa.types.is_string(array.type) else array.cast(pa.string())
+    try:
+        return parse_text_column(strings, arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Values that match the pattern can still overflow the type
+        converted = []
+        for value in pc.utf8_trim_whitespace(strings).to_pylist():
+            try:
+                converted.append(pc.cast(pa.array([value]), arrow_type)[0].as_py())
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                converted.append(None)
+        return pa.array(converted, type=arrow_type)
+
+def iter_xlsx_record_batches(input_path, schema, chunk_rows=XLSX_CHUNK_ROWS):
+    """
+    Stream an XLSX sheet as Arrow record batches typed by a Spark schema.
+    
+    The workbook is opened in openpyxl read-only mode, so only one chunk of
+    rows is held in memory at a time. Columns the schema does not know are
+    kept as strings so schema evolution still sees them.
+    
+    Args:
+        input_path: Path to input XLSX file
+        schema: PySpark StructType schema to type the columns with
+        chunk_rows: Number of rows per record batch
+    
+    Yields:
+        pyarrow.RecordBatch objects
+    """
+    import pyarrow as pa
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(input_path, read_only=True, data_only=True)
+    
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        
+        # Keep each header's sheet position, as blank header cells still take up a position
+        header = [(pos, str(name)) for pos, name in enumerate(next(rows, ())) if name is not None]
+        header_positions = {}
+        for pos, name in header:
+            header_positions.setdefault(name, pos)
+        
+        # Schema columns first, then any extra columns of the sheet
+        fields = [(field.name, spark_type_to_arrow(field.dataType)) for field in schema.fields]
+        known = {name for name, _ in fields}
+        fields += [(name, pa.string()) for pos, name in header if name not in known and header_positions[name] == pos]
+        arrow_schema = pa.schema(fields)
+        positions = [header_positions.get(name) for name, _ in fields]
+        
+        def to_batch(chunk):
+            arrays = []
+            for (name, arrow_type), pos in zip(fields, positions):
+                if pos is None:
+                    arrays.append(pa.nulls(len(chunk), type=arrow_type))
+                else:
+                    values = [row[pos] if pos < len(row) else None for row in chunk]
+                    arrays.append(rows_to_arrow_column(values, arrow_type))
+            return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+        
+        chunk = []
+        for row in rows:
+            # Skip fully empty trailing rows
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield to_batch(chunk)
+                chunk = []
+        
+        if chunk:
+            yield to_batch(chunk)
+    
+    finally:
+        workbook.close()
+
+def can_stage_locally(spark, path):
+    """
+    Check whether a file written by the driver at path can be read by Spark.
+    
+    Staging goes through the driver's local disk, which executors only
+    share when Spark runs in local mode and the path has no remote scheme.
+    
+    Args:
+        spark: SparkSession
+        path: Staging or output path
+    
+    Returns:
+        True if a locally staged file is readable by every executor
+    """
+    scheme = path.split("://", 1)[0] if "://" in path else "file"
+    return scheme == "file" and spark.sparkContext.master.startswith("local")
+
+def stage_xlsx_as_parquet(input_path, staging_path, schema, chunk_rows=XLSX_CHUNK_ROWS):
+    """
+    Convert an XLSX file to a typed Parquet file in bounded memory.
+    
+    Args:
+        input_path: Path to input XLSX file
+        staging_path: Path to the Parquet file to write
+        schema: PySpark StructType schema to type the columns with
+        chunk_rows: Number of rows per record batch
+    
+    Returns:
+        Number of rows staged
+    """
+    import pyarrow.parquet as pq
+    
+    os.makedirs(os.path.dirname(os.path.abspath(staging_path)), exist_ok=True)
+    
+    row_count = 0
+    writer = None
+    try:
+        for batch in iter_xlsx_record_batches(input_path, schema, chunk_rows):
+            if writer is None:
+                writer = pq.ParquetWriter(staging_path, batch.schema)
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    return row_count
+
+# Text values accepted for boolean columns; anything else becomes null
+BOOLEAN_STRINGS = {"true": True, "false": False, "1": True, "0": False}
+
+def align_pandas_to_schema(pdf, schema):
+    """
+    Order and coerce pandas columns to match a Spark schema.
+    
+    Args:
+        pdf: pandas DataFrame
+        schema: PySpark StructType schema
+    
+    Returns:
+        pandas DataFrame with the schema's columns in order, or None if the
+        columns do not match the schema
+    """
+    if set(pdf.columns) != set(schema.fieldNames()):
+        return None
+    
+    def to_bool(value):
+        # bool("False") is True, so text values are mapped explicitly
+        if isinstance(value, str):
+            return BOOLEAN_STRINGS.get(value.strip().lower())
+        return bool(value)
+    
+    def as_objects(column, convert):
+        # Object dtype keeps missing values as None instead of NaN
+        return pd.Series(
+            [convert(v) if pd.notna(v) else None for v in column],
+            index=column.index, dtype=object
+        )
+    
+    aligned = pdf[schema.fieldNames()].copy()
+    for field in schema.fields:
+        column = aligned[field.name]
+        if isinstance(field.dataType, IntegerType):
+            aligned[field.name] = as_objects(pd.to_numeric(column, errors="coerce"), int)
+        elif isinstance(field.dataType, DoubleType):
+            aligned[field.name] = pd.to_numeric(column, errors="coerce").astype("float64")
+        elif isinstance(field.dataType, BooleanType):
+            aligned[field.name] = as_objects(column, to_bool)
+        elif isinstance(field.dataType, TimestampType):
+            aligned[field.name] = pd.to_datetime(column, errors="coerce")
+        elif isinstance(field.dataType, StringType):
+            aligned[field.name] = as_objects(column, str)
+    
+    return aligned
+
+def pandas_to_spark(spark, pdf, schema):
+    """
+    Convert a pandas DataFrame to Spark using Arrow and an explicit schema.
+    
+    If the columns do not match the schema, or the typed conversion fails,
+    the conversion falls back to Arrow with type inference and leaves the
+    casting to handle_schema_evolution.
+    
+    Args:
+        spark: SparkSession
+        pdf: pandas DataFrame
+        schema: PySpark StructType schema
+    
+    Returns:
+        Spark DataFrame
+    """
+    # The session is shared, so restore the previous Arrow settings afterwards
+    arrow_config = {
+        "spark.sql.execution.arrow.pyspark.enabled": "true",
+        "spark.sql.execution.arrow.pyspark.fallback.enabled": "true"
+    }
+    previous_config = {key: spark.conf.get(key, None) for key in arrow_config}
+    for key, value in arrow_config.items():
+        spark.conf.set(key, value)
+    
+    try:
+        aligned = align_pandas_to_schema(pdf, schema)
+        if aligned is None:
+            logger.warning("Columns do not match the expected schema, converting with inferred types")
+            return spark.createDataFrame(pdf)
+        
+        # Arrow does not check nullability, so relax it and let validation filter nulls
+        nullable_schema = StructType([StructField(field.name, field.dataType, True) for field in schema.fields])
+        
+        try:
+            return spark.createDataFrame(aligned, schema=nullable_schema)
+        except Exception as e:
+            logger.warning(f"Typed Arrow conversion failed, converting with inferred types: {str(e)}")
+            return spark.createDataFrame(pdf)
+    
+    finally:
+        for key, value in previous_config.items():
+            if value is None:
+                spark.conf.unset(key)
+            else:
+                spark.conf.set(key, value)
+
+def is_parquet_source(input_path):
+    """Check whether an ingestion source is Parquet output of the data generators."""
+    return input_path.rstrip("/").endswith(".parquet")
+
+# Column holding source fields the read schema does not know, as a JSON object
+RESCUED_DATA_COLUMN = "_rescued_data"
+
+# Column holding the raw text of complex fields that failed to parse, as a JSON object
+PARSE_ERRORS_COLUMN = "_parse_errors"
+
+# Source column names of the orders complex fields, which older schemas named *_str
+ORDERS_SOURCE_FIELD_NAMES = {
+    "items_str": "items",
+    "billing_address_str": "billing_address",
+    "shipping_address_str": "shipping_address"
+}
+
+def is_json_lines_source(input_path):
+    """Check whether a JSON source holds one record per line rather than a single array."""
+    base_path = input_path.rstrip("/")
+    for suffix in (".gz", ".zst"):
+        if base_path.endswith(suffix):
+            base_path = base_path[:-len(suffix)]
+    return base_path.endswith((".jsonl", ".ndjson"))
+
+def get_orders_read_schema(schema):
+    """
+    Derive the schema orders are read with from the bronze orders schema.
+    
+    The complex fields arrive as JSON text under their source names, and are
+    parsed by parse_orders_complex_fields after the read.
+    
+    Args:
+        schema: Bronze orders schema (older *_str versions are accepted too)
+    
+    Returns:
+        PySpark StructType schema
+    """
+    fields = []
+    for field in schema.fields:
+        name = ORDERS_SOURCE_FIELD_NAMES.get(field.name, field.name)
+        if name in ORDERS_SOURCE_FIELD_NAMES.values():
+            fields.append(StructField(name, StringType(), True))
+        else:
+            fields.append(field)
+    return StructType(fields)
+
+def has_typed_orders_fields(source_schema, orders_schema):
+    """
+    Check whether a source holds the orders complex fields already typed.
+    
+    Nullability is ignored, as Parquet writers differ in what they record.
+    
+    Args:
+        source_schema: Schema of the source data
+        orders_schema: Bronze orders schema
+    
+    Returns:
+        True if items and both addresses have the bronze orders types
+    """
+    source_types = {field.name: field.dataType for field in source_schema.fields}
+    expected_types = {field.name: field.dataType for field in orders_schema.fields}
+    
+    return all(
+        name in source_types and name in expected_types
+        and source_types[name].simpleString() == expected_types[name].simpleString()
+        for name in ORDERS_SOURCE_FIELD_NAMES.values()
+    )
+
+def conform_to_schema(df, schema):
+    """
+    Move columns the schema does not know into the rescued data column and
+    add the schema columns the DataFrame lacks as typed nulls.
+    
+    Args:
+        df: DataFrame read with (a subset of) the schema
+        schema: PySpark StructType schema
+    
+    Returns:
+        DataFrame with the schema columns in order followed by the rescued data column
+    """
+    known_fields = schema.fieldNames()
+    unknown_fields = [name for name in df.columns if name not in known_fields and name != RESCUED_DATA_COLUMN]
+    
+    if RESCUED_DATA_COLUMN in df.columns:
+        rescued = col(RESCUED_DATA_COLUMN)
+    elif unknown_fields:
+        logger.info(f"Rescuing unknown columns: {unknown_fields}")
+        unknown = [col(name).cast(StringType()) for name in unknown_fields]
+        rescued = when(coalesce(*unknown).isNotNull(), to_json(struct(*[col(name) for name in unknown_fields])))
+    else:
+        rescued = lit(None).cast(StringType())
+    
+    columns = []
+    for field in schema.fields:
+        if field.name in df.columns:
+            columns.append(col(field.name))
+        else:
+            logger.info(f"Adding missing column: {field.name}")
+            columns.append(lit(None).cast(field.dataType).alias(field.name))
+    
+    return df.select(*columns, rescued.alias(RESCUED_DATA_COLUMN))
+
+def read_json_with_schema(spark, input_path, schema):
+    """
+    Read JSON or JSON Lines data with a fixed schema instead of inferring one.
+    
+    JSON Lines records are parsed once into the schema types. Only records
+    whose keys the schema does not know are parsed again into a map of raw
+    values, from which those fields are kept in the rescued data column.
+    A JSON array document is read whole and parsed once into a list of raw
+    value maps; the schema columns are typed from each map, and the keys the
+    schema does not know are kept in the rescued data column.
+    
+    Args:
+        spark: SparkSession
+        input_path: Path to input JSON (single array) or JSON Lines file
+        schema: PySpark StructType schema
+    
+    Returns:
+        DataFrame with the schema columns and the rescued data column
+    """
+    known_fields = schema.fieldNames()
+    raw_type = MapType(StringType(), StringType())
+    
+    if is_json_lines_source(input_path):
+        known_keys = spark_array(*[lit(name) for name in known_fields])
+        unknown_keys = array_except(expr("json_object_keys(value)"), known_keys)
+        unknown = map_filter(from_json(col("value"), raw_type), lambda k, v: ~k.isin(known_fields))
+        
+        # The map is only parsed for records that carry unknown keys
+        return (spark.read.text(input_path)
+                .select(from_json(col("value"), schema).alias("record"),
+                        when(size(unknown_keys) > 0, to_json(unknown)).alias(RESCUED_DATA_COLUMN))
+                .select(col("record.*"), col(RESCUED_DATA_COLUMN)))
+    
+    def typed_value(field):
+        # Nested values arrive as their JSON text, scalars as their text
+        value = col("raw").getItem(field.name)
+        if isinstance(field.dataType, (StructType, ArrayType, MapType)):
+            return from_json(value, field.dataType).alias(field.name)
+        return value.cast(field.dataType).alias(field.name)
+    
+    unknown = map_filter(col("raw"), lambda k, v: ~k.isin(known_fields))
+    
+    return (spark.read.text(input_path, wholetext=True)
+            .select(explode(from_json(col("value"), ArrayType(raw_type))).alias("raw"))
+            .select(*[typed_value(field) for field in schema.fields],
+                    when(size(unknown) > 0, to_json(unknown)).alias(RESCUED_DATA_COLUMN)))
+
+def read_csv_with_schema(spark, input_path, schema):
+    """
+    Read CSV data with a fixed schema instead of inferring one.
+    
+    Only the header line is read up front, to line the schema up with the
+    file's columns. Columns the schema does not know are read as strings and
+    kept in the rescued data column.
+    
+    Args:
+        spark: SparkSession
+        input_path: Path to input CSV file
+        schema: PySpark StructType schema
+    
+    Returns:
+        DataFrame with the schema columns and the rescued data column
+    """
+    # Without inferSchema Spark only reads the header line here
+    header_columns = spark.read.option("header", "true").csv(input_path).columns
+    
+    known_types = {field.name: field.dataType for field in schema.fields}
+    read_schema = StructType([
+        StructField(name, known_types.get(name, StringType()), True)
+        for name in header_columns
+    ])
+    
+    df = spark.read.option("header", "true").schema(read_schema).csv(input_path)
+    return conform_to_schema(df, schema)
+
+# Required fields of each source; records missing any of them are quarantined
+USER_ACTIVITY_REQUIRED_FIELDS = ["user_id", "session_id", "timestamp", "event_type"]
+ORDERS_REQUIRED_FIELDS = ["order_id", "customer_id", "order_date", "order_status", "subtotal", "total"]
+INVENTORY_REQUIRED_FIELDS = ["product_id", "product_name", "category", "retail_price", "current_stock"]
+
+# Column holding why a record was rejected, null for valid records
+REJECTION_REASON_COLUMN = "_rejection_reason"
+
+def get_quarantine_path(output_path):
+    """Return the default quarantine directory for a bronze output directory."""
+    output_path = output_path.rstrip("/")
+    return os.path.join(os.path.dirname(os.path.dirname(output_path)), "quarantine", os.path.basename(output_path))
+
+def tag_rejection_reason(df, required_fields):
+    """
+    Tag each record with the first required field it is missing.
+    
+    Args:
+        df: DataFrame to tag
+        required_fields: List of required field names, in check order
+    
+    Returns:
+        DataFrame with a rejection reason column, null for valid records
+    """
+    reason = lit(None).cast(StringType())
+    for field_name in reversed(required_fields):
+        reason = when(col(field_name).isNull(), lit(f"missing_{field_name}")).otherwise(reason)
+    return df.withColumn(REJECTION_REASON_COLUMN, reason)
+
+def write_with_quarantine(df, output_path, partition_column, mode, quarantine_path):
+    """
+    Write valid records to bronze and rejected records to the quarantine dataset.
+    
+    The tagged records are persisted, so the source is read once for both
+    writes. Rejected records are appended to the quarantine dataset,
+    partitioned by date and rejection reason.
+    
+    Args:
+        df: DataFrame tagged by a validate_*_data function
+        output_path: Path to output Parquet directory
+        partition_column: Column to partition the bronze output by
+        mode: Write mode for the bronze output
+        quarantine_path: Path to quarantine Parquet directory
+    
+    Returns:
+        Tuple of (valid row Observation, rejected row Observation)
+    """
+    df = df.persist(StorageLevel.MEMORY_AND_DISK)
+    
+    try:
+        valid_df, valid_observation = observe_row_count(
+            df.filter(col(REJECTION_REASON_COLUMN).isNull()).drop(REJECTION_REASON_COLUMN)
+        )
+        rejected_df, rejected_observation = observe_row_count(
+            df.filter(col(REJECTION_REASON_COLUMN).isNotNull())
+              .withColumn("_quarantine_date", current_date())
+        )
+        
+        # Write to Parquet
+        valid_df.write.mode(mode).partitionBy(partition_column).parquet(output_path)
+        rejected_df.write.mode("append").partitionBy("_quarantine_date", REJECTION_REASON_COLUMN).parquet(quarantine_path)
+    
+    finally:
+        df.unpersist()
+    
+    return valid_observation, rejected_observation
+
+def observe_row_count(df):
+    """
+    Attach a row counter to a DataFrame that fills in when it is next executed.
+    
+    Args:
+        df: DataFrame to count
+    
+    Returns:
+        Tuple of (observed DataFrame, Observation)
+    """
+    observation = Observation()
+    return df.observe(observation, count(lit(1)).alias("rows")), observation
+
+def collect_partition_stats(output_path, since=None):
+    """
+    Collect file statistics for each partition of a Parquet output directory.
+    
+    Row counts are read from the Parquet footers when pyarrow is installed,
+    so no data pages are scanned.
+    
+    Args:
+        output_path: Path to output Parquet directory
+        since: Only count files modified at or after this POSIX timestamp,
+            i.e. the files written by an appending run
+    
+    Returns:
+        List of partition statistics dictionaries
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        pq = None
+    
+    partitions = []
+    for dirpath, dirnames, filenames in os.walk(output_path):
+        dirnames.sort()
+        data_files = sorted(
+            f for f in filenames
+            if f.endswith(".parquet") and not f.startswith(("_", "."))
+            and (since is None or os.path.getmtime(os.path.join(dirpath, f)) >= since)
+        )
+        if not data_files:
+            continue
+        
+        partition = os.path.relpath(dirpath, output_path)
+        stats = {
+            "partition": "" if partition == "." else partition,
+            "files": len(data_files),
+            "bytes": sum(os.path.getsize(os.path.join(dirpath, f)) for f in data_files),
+            "rows": None
+        }
+        if pq is not None:
+            stats["rows"] = sum(pq.read_metadata(os.path.join(dirpath, f)).num_rows for f in data_files)
+        partitions.append(stats)
+    
+    return partitions
+
+def build_ingestion_report(source_name, input_path, output_path, started_at, output_observation, rejected_observation, quarantine_path):
+    """
+    Build the report of a finished ingestion run.
+    
+    Args:
+        source_name: Name of the data source
+        input_path: Path to input data
+        output_path: Path to output Parquet directory
+        started_at: datetime the run started
+        output_observation: Observation counting rows written
+        rejected_observation: Observation counting rows quarantined
+        quarantine_path: Path to quarantine Parquet directory
+    
+    Returns:
+        Ingestion report dictionary
+    """
+    finished_at = datetime.datetime.now()
+    output_rows = output_observation.get["rows"]
+    rejected_rows = rejected_observation.get["rows"]
+    
+    report = {
+        "source": source_name,
+        "input_path": input_path,
+        "output_path": output_path,
+        "started_at": started_at.isoformat(),
+        "finished_at": finished_at.isoformat(),
+        "duration_seconds": round((finished_at - started_at).total_seconds(), 3),
+        "input_rows": output_rows + rejected_rows,
+        "output_rows": output_rows,
+        "rejected_rows": rejected_rows,
+        "partitions": collect_partition_stats(output_path, since=started_at.timestamp()),
+        "quarantine_path": quarantine_path,
+        "quarantine_partitions": collect_partition_stats(quarantine_path, since=started_at.timestamp())
+    }
+    
+    if rejected_rows > 0:
+        logger.warning(f"Quarantined {rejected_rows} bad {source_name} records to {quarantine_path}")
+    
+    return report
+
 # Data ingestion functions
-def ingest_user_activity(spark, input_path, output_path):
+def ingest_user_activity(spark, input_path, output_path, schema=None, mode="overwrite", quarantine_path=None,
+                         evolution_plan=None):
     """
     Ingest user activity data from JSON file.
     
     Args:
         spark: SparkSession
-        input_path: Path to input JSON file
+        input_path: Path to input JSON or JSON Lines file (or a .parquet file/directory)
         output_path: Path to output Parquet directory
+        schema: Schema to read with, e.g. a SchemaRegistry version
+            (defaults to get_user_activity_schema())
+        mode: Write mode, "overwrite" or "append"
+        quarantine_path: Path to quarantine Parquet directory for bad records
+            (defaults to ../quarantine/<output name> next to the bronze directory)
+        evolution_plan: Plan from SchemaRegistry.get_evolution_plan to evolve
+            records read with schema to a newer version, instead of diffing
+            the schemas at runtime
     
     Returns:
-        DataFrame with ingested data
+        Ingestion report with row counts and per-partition file statistics
     """
     logger.info(f"Ingesting user activity data from {input_path}")
+    started_at = datetime.datetime.now()
     
     try:
-        # Read JSON file
-        df = spark.read.json(input_path)
+        # Get expected schema
+        expected_schema = schema if schema is not None else get_user_activity_schema()
+        
+        # Read JSON with the expected schema, or Parquet without any text parsing
+        if is_parquet_source(input_path):
+            df = conform_to_schema(spark.read.parquet(input_path), expected_schema)
+        else:
+            df = read_json_with_schema(spark, input_path, expected_schema)
         
         # Get current schema
         current_schema = df.schema
         
-        # Get expected schema
-        expected_schema = get_user_activity_schema()
-        
-        # Handle schema evolution
-        df = handle_schema_evolution(spark, df, current_schema, expected_schema)
+        # Handle schema evolution, with the precompiled plan when one is given
+        if evolution_plan is not None:
+            df = apply_evolution_plan(df, evolution_plan)
+        else:
+            df = handle_schema_evolution(spark, df, current_schema, expected_schema)
         
         # Validate data
         df = validate_user_activity_data(df)
         
-        # Write to Parquet
-        df.write.mode("overwrite").partitionBy("event_type").parquet(output_path)
+        # Write valid records to bronze and bad records to quarantine, counting both during the writes
+        if quarantine_path is None:
+            quarantine_path = get_quarantine_path(output_path)
+        output_observation, rejected_observation = write_with_quarantine(df, output_path, "event_type", mode, quarantine_path)
         
-        logger.info(f"Successfully ingested {df.count()} user activity records")
-        return df
+        report = build_ingestion_report("user_activity", input_path, output_path, started_at, output_observation, rejected_observation, quarantine_path)
+        logger.info(f"Successfully ingested {report['output_rows']} user activity records")
+        return report
     
     except Exception as e:
         logger.error(f"Error ingesting user activity data: {str(e)}")
         raise
 
-def ingest_orders(spark, input_path, output_path):
+def ingest_orders(spark, input_path, output_path, schema=None, mode="overwrite", quarantine_path=None,
+                  evolution_plan=None):
     """
     Ingest orders data from CSV file.
     
     Args:
         spark: SparkSession
-        input_path: Path to input CSV file
+        input_path: Path to input CSV file (or a .parquet file/directory)
         output_path: Path to output Parquet directory
+        schema: Schema to read with, e.g. a SchemaRegistry version
+            (defaults to get_orders_schema())
+        mode: Write mode, "overwrite" or "append"
+        quarantine_path: Path to quarantine Parquet directory for bad records
+            (defaults to ../quarantine/<output name> next to the bronze directory)
+        evolution_plan: Plan from SchemaRegistry.get_evolution_plan to evolve
+            records read with schema to a newer version
     
     Returns:
-        DataFrame with ingested data
+        Ingestion report with row counts and per-partition file statistics
     """
     logger.info(f"Ingesting orders data from {input_path}")
+    started_at = datetime.datetime.now()
     
     try:
-        # Read CSV file
-        df = spark.read.option("header", "true").csv(input_path)
+        orders_schema = schema if schema is not None else get_orders_schema()
         
-        # Get current schema
-        current_schema = df.schema
+        # Get expected schema, with the complex fields as JSON text
+        expected_schema = get_orders_read_schema(orders_schema)
         
-        # Get expected schema
-        expected_schema = get_orders_schema()
+        # Read CSV with the expected schema, or Parquet without any text parsing
+        parquet_df = spark.read.parquet(input_path) if is_parquet_source(input_path) else None
         
-        # Handle schema evolution
-        df = handle_schema_evolution(spark, df, current_schema, expected_schema)
+        if parquet_df is not None and has_typed_orders_fields(parquet_df.schema, orders_schema):
+            # Nested fields are already typed, so they need no serializing or parsing
+            df = conform_to_schema(parquet_df, orders_schema)
+            df = handle_schema_evolution(spark, df, df.schema, orders_schema)
+            df = df.withColumn(PARSE_ERRORS_COLUMN, lit(None).cast(StringType()))
+        else:
+            if parquet_df is not None:
+                # Serialize nested fields so they are parsed by the same rules as CSV input
+                df = parquet_df
+                for field_name in ["items", "billing_address", "shipping_address"]:
+                    if field_name in df.columns:
+                        df = df.withColumn(field_name, to_json(col(field_name)))
+                df = conform_to_schema(df, expected_schema)
+            else:
+                df = read_csv_with_schema(spark, input_path, expected_schema)
+            
+            # Get current schema
+            current_schema = df.schema
+            
+            # Handle schema evolution
+            df = handle_schema_evolution(spark, df, current_schema, expected_schema)
+            
+            # Parse complex fields
+            df = parse_orders_complex_fields(df)
         
-        # Parse complex fields
-        df = parse_orders_complex_fields(df)
+        # Evolve the parsed records with the precompiled plan when one is given
+        if evolution_plan is not None:
+            df = apply_evolution_plan(df, evolution_plan)
         
         # Validate data
         df = validate_orders_data(df)
         
-        # Write to Parquet
-        df.write.mode("overwrite").partitionBy("order_status").parquet(output_path)
+        # Write valid records to bronze and bad records to quarantine, counting both during the writes
+        if quarantine_path is None:
+            quarantine_path = get_quarantine_path(output_path)
+        output_observation, rejected_observation = write_with_quarantine(df, output_path, "order_status", mode, quarantine_path)
         
-        logger.info(f"Successfully ingested {df.count()} order records")
-        return df
+        report = build_ingestion_report("orders", input_path, output_path, started_at, output_observation, rejected_observation, quarantine_path)
+        logger.info(f"Successfully ingested {report['output_rows']} order records")
+        return report
     
     except Exception as e:
         logger.error(f"Error ingesting orders data: {str(e)}")
         raise
 
-def ingest_inventory(spark, input_path, output_path):
+def ingest_inventory(spark, input_path, output_path, xlsx_reader="streaming", staging_path=None, mode="overwrite", quarantine_path=None,
+                     evolution_plan=None):
     """
     Ingest inventory data from XLSX file.
     
     Args:
         spark: SparkSession
-        input_path: Path to input XLSX file
+        input_path: Path to input XLSX file (or a .parquet file/directory)
         output_path: Path to output Parquet directory
+        xlsx_reader: "streaming" to convert the workbook to typed Parquet in
+            bounded chunks (or "arrow" when the staging location is not
+            visible to executors), "arrow" to load it with pd.read_excel and convert
+            it through Arrow with the inventory schema, or "pandas" to load it
+            with pd.read_excel and let Spark infer the types
+        staging_path: Parquet file for the streaming reader (defaults to
+            a _staging directory next to output_path), deleted once the
+            bronze write has finished
+        mode: Write mode, "overwrite" or "append"
+        quarantine_path: Path to quarantine Parquet directory for bad records
+            (defaults to ../quarantine/<output name> next to the bronze directory)
+        evolution_plan: Plan from SchemaRegistry.get_evolution_plan to evolve
+            records read with schema to a newer version
     
     Returns:
-        DataFrame with ingested data
+        Ingestion report with row counts and per-partition file statistics
     """
     logger.info(f"Ingesting inventory data from {input_path}")
+    started_at = datetime.datetime.now()
+    staged_file = None
     
     try:
-        # Read XLSX file using pandas (PySpark doesn't directly support XLSX)
-        pdf = pd.read_excel(input_path)
-        
-        # Convert pandas DataFrame to Spark DataFrame
-        df = spark.createDataFrame(pdf)
+        if is_parquet_source(input_path):
+            # Parquet is read directly by Spark, no driver-side pandas step
+            df = spark.read.parquet(input_path)
+        elif xlsx_reader == "streaming" and can_stage_locally(spark, staging_path or output_path):
+            # Stream the workbook into typed Parquet, then let Spark read it in parallel
+            if staging_path is None:
+                staging_path = os.path.join(
+                    os.path.dirname(output_path.rstrip("/")), "_staging",
+                    os.path.splitext(os.path.basename(input_path))[0] + ".parquet"
+                )
+            staged_file = staging_path
+            row_count = stage_xlsx_as_parquet(input_path, staging_path, get_inventory_schema())
+            logger.info(f"Staged {row_count} inventory rows to {staging_path}")
+            
+            if row_count == 0:
+                # An empty workbook stages no file
+                df = spark.createDataFrame([], get_inventory_schema())
+            else:
+                df = spark.read.parquet(staging_path)
+        elif xlsx_reader in ("streaming", "arrow"):
+            if xlsx_reader == "streaming":
+                logger.info("Staging directory is not visible to executors, reading the workbook with pandas")
+            pdf = pd.read_excel(input_path)
+            
+            # Convert in Arrow batches with the expected types instead of row-by-row inference
+            df = pandas_to_spark(spark, pdf, get_inventory_schema())
+        else:
+            # Read XLSX file using pandas (PySpark doesn't directly support XLSX)
+            pdf = pd.read_excel(input_path)
+            
+            # Convert pandas DataFrame to Spark DataFrame
+            df = spark.createDataFrame(pdf)
         
         # Get current schema
         current_schema = df.schema
@@ -234,21 +1024,244 @@ def ingest_inventory(spark, input_path, output_path):
         # Get expected schema
         expected_schema = get_inventory_schema()
         
-        # Handle schema evolution
-        df = handle_schema_evolution(spark, df, current_schema, expected_schema)
+        # Handle schema evolution, with the precompiled plan when one is given
+        if evolution_plan is not None:
+            df = apply_evolution_plan(df, evolution_plan)
+        else:
+            df = handle_schema_evolution(spark, df, current_schema, expected_schema)
         
         # Validate data
         df = validate_inventory_data(df)
         
-        # Write to Parquet
-        df.write.mode("overwrite").partitionBy("category").parquet(output_path)
+        # Write valid records to bronze and bad records to quarantine, counting both during the writes
+        if quarantine_path is None:
+            quarantine_path = get_quarantine_path(output_path)
+        output_observation, rejected_observation = write_with_quarantine(df, output_path, "category", mode, quarantine_path)
         
-        logger.info(f"Successfully ingested {df.count()} inventory records")
-        return df
+        report = build_ingestion_report("inventory", input_path, output_path, started_at, output_observation, rejected_observation, quarantine_path)
+        logger.info(f"Successfully ingested {report['output_rows']} inventory records")
+        return report
     
     except Exception as e:
         logger.error(f"Error ingesting inventory data: {str(e)}")
         raise
+    
+    finally:
+        # The staged Parquet is only read by the writes above
+        if staged_file is not None:
+            remove_data_files([staged_file])
+
+# Incremental ingestion functions
+def get_manifest_path(output_path):
+    """Return the default processed-files manifest path for a bronze output directory."""
+    output_path = output_path.rstrip("/")
+    return os.path.join(os.path.dirname(output_path), "_manifests", os.path.basename(output_path) + ".json")
+
+def load_manifest(manifest_path):
+    """
+    Load a processed-files manifest.
+    
+    Args:
+        manifest_path: Path to manifest JSON file
+    
+    Returns:
+        Dictionary of source file path to manifest entry
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    
+    with open(manifest_path, 'r') as f:
+        return json.load(f)["files"]
+
+def save_manifest(manifest, manifest_path):
+    """
+    Save a processed-files manifest, replacing the previous file atomically.
+    
+    Args:
+        manifest: Dictionary of source file path to manifest entry
+        manifest_path: Path to manifest JSON file
+    """
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({"files": manifest}, f, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 hash of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_listing_hash(directory):
+    """
+    Compute the SHA-256 hash of a directory listing.
+    
+    Covers the relative name, size and mtime of every file below the
+    directory, so a dataset directory is recognised as changed without
+    reading its files.
+    """
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for f in sorted(filenames):
+            stat = os.stat(os.path.join(dirpath, f))
+            relative_path = os.path.relpath(os.path.join(dirpath, f), directory)
+            digest.update(f"{relative_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def list_data_files(output_path):
+    """Return the set of Parquet data files below an output directory."""
+    data_files = set()
+    for dirpath, dirnames, filenames in os.walk(output_path):
+        data_files.update(
+            os.path.join(dirpath, f) for f in filenames
+            if f.endswith(".parquet") and not f.startswith(("_", "."))
+        )
+    return data_files
+
+def remove_data_files(data_files):
+    """Delete previously written data files, ignoring files already removed."""
+    for file_path in data_files:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+def list_source_files(input_path):
+    """
+    List the source files under an input path.
+    
+    Args:
+        input_path: Path to a source file, or a directory of source files
+    
+    Returns:
+        Sorted list of absolute file paths
+    """
+    input_path = os.path.abspath(input_path)
+    
+    # A single file, or a Parquet dataset directory that is ingested as one unit
+    if not os.path.isdir(input_path) or is_parquet_source(input_path):
+        return [input_path]
+    
+    source_files = []
+    for dirpath, dirnames, filenames in os.walk(input_path):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(("_", ".")))
+        source_files.extend(
+            os.path.join(dirpath, f) for f in filenames if not f.startswith(("_", "."))
+        )
+    
+    return sorted(source_files)
+
+def find_unprocessed_files(source_files, manifest):
+    """
+    Find source files that are new or changed since they were last ingested.
+    
+    Files whose size and mtime match the manifest are skipped without being
+    read. Files whose size or mtime changed are hashed, and skipped if only
+    their mtime changed. A Parquet dataset directory is compared by the hash
+    of its listing, since its own size and mtime miss changes to nested files.
+    
+    Args:
+        source_files: List of source file paths
+        manifest: Dictionary of source file path to manifest entry
+    
+    Returns:
+        List of (file path, file entry) tuples to ingest
+    """
+    unprocessed = []
+    for file_path in source_files:
+        stat = os.stat(file_path)
+        entry = manifest.get(file_path)
+        is_file = os.path.isfile(file_path)
+        
+        if is_file and entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            continue
+        
+        file_hash = compute_file_hash(file_path) if is_file else compute_listing_hash(file_path)
+        if entry is not None and entry["sha256"] == file_hash:
+            # Touched but unchanged, only refresh the recorded mtime
+            entry["mtime"] = stat.st_mtime
+            continue
+        
+        unprocessed.append((file_path, {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": file_hash
+        }))
+    
+    return unprocessed
+
+def ingest_incremental(spark, ingest_function, input_path, output_path, manifest_path=None, **kwargs):
+    """
+    Ingest only source files that are new or changed since the last run.
+    
+    Each new or changed file is appended to the bronze partitions, then
+    recorded in the manifest with its path, size, mtime, content hash and the
+    data files it wrote. When a changed file is ingested again, the data files
+    written for its previous version are deleted once the new rows are in, so
+    bronze and quarantine keep one copy of each file's rows.
+    
+    Args:
+        spark: SparkSession
+        ingest_function: ingest_user_activity, ingest_orders or ingest_inventory
+        input_path: Path to a source file, or a directory of source files
+        output_path: Path to output Parquet directory
+        manifest_path: Path to manifest JSON file (defaults to
+            _manifests/<output name>.json next to output_path)
+        **kwargs: Additional arguments for the ingest function
+    
+    Returns:
+        List of ingestion reports, one per ingested file
+    """
+    if manifest_path is None:
+        manifest_path = get_manifest_path(output_path)
+    
+    manifest = load_manifest(manifest_path)
+    
+    # Finish replacements a failed run recorded but did not get to delete
+    for entry in manifest.values():
+        if entry.get("superseded_files"):
+            remove_data_files(entry.pop("superseded_files"))
+            save_manifest(manifest, manifest_path)
+    
+    unprocessed = find_unprocessed_files(list_source_files(input_path), manifest)
+    
+    logger.info(f"Found {len(unprocessed)} new or changed files under {input_path}")
+    
+    quarantine_path = kwargs.get("quarantine_path") or get_quarantine_path(output_path)
+    
+    reports = []
+    for file_path, entry in unprocessed:
+        existing_files = list_data_files(output_path) | list_data_files(quarantine_path)
+        report = ingest_function(spark, file_path, output_path, mode="append", **kwargs)
+        written_files = (list_data_files(output_path) | list_data_files(quarantine_path)) - existing_files
+        
+        # Record each file as soon as it is written, so a failed run resumes where it stopped
+        previous_entry = manifest.get(file_path, {})
+        entry["ingested_at"] = report["finished_at"]
+        entry["rows"] = report["output_rows"]
+        entry["data_files"] = sorted(written_files)
+        if previous_entry.get("data_files"):
+            entry["superseded_files"] = previous_entry["data_files"]
+        manifest[file_path] = entry
+        save_manifest(manifest, manifest_path)
+        
+        if "superseded_files" in entry:
+            logger.info(f"Replacing {len(entry['superseded_files'])} data files written for the previous version of {file_path}")
+            remove_data_files(entry.pop("superseded_files"))
+            save_manifest(manifest, manifest_path)
+        
+        reports.append(report)
+    
+    if not unprocessed:
+        # Persist refreshed mtimes of touched files
+        save_manifest(manifest, manifest_path)
+    
+    return reports
 
 # Schema evolution and validation functions
 def handle_schema_evolution(spark, df, current_schema, expected_schema):
@@ -264,147 +1277,343 @@ def handle_schema_evolution(spark, df, current_schema, expected_schema):
     Returns:
         DataFrame with evolved schema
     """
+    return align_to_schema(df, expected_schema, current_schema)
+
+def align_to_schema(df, expected_schema, current_schema=None):
+    """
+    Align a DataFrame to an expected schema with a single projection.
+    
+    Missing columns are added as typed null literals and mistyped columns are
+    cast, all in one select, so the plan grows by one node however wide the
+    schema is. Columns the expected schema does not know are kept.
+    
+    Args:
+        df: DataFrame to align
+        expected_schema: Expected schema
+        current_schema: Current schema of the DataFrame (defaults to df.schema)
+    
+    Returns:
+        DataFrame with aligned schema
+    """
+    if current_schema is None:
+        current_schema = df.schema
+    
     # Get current and expected field names
     current_fields = {field.name: field.dataType for field in current_schema.fields}
     expected_fields = {field.name: field.dataType for field in expected_schema.fields}
     
-    # Add missing columns
-    for field_name, data_type in expected_fields.items():
-        if field_name not in current_fields:
-            logger.info(f"Adding missing column: {field_name}")
-            df = df.withColumn(field_name, spark.createDataFrame([(None,)], [field_name]).select(field_name))
-    
     # Cast columns to expected types
+    casts = {}
     for field_name, data_type in expected_fields.items():
         if field_name in current_fields and current_fields[field_name] != data_type:
             logger.info(f"Casting column {field_name} from {current_fields[field_name]} to {data_type}")
+            casts[field_name] = data_type
+    
+    # Add missing columns
+    missing = [name for name in expected_fields if name not in current_fields]
+    for field_name in missing:
+        logger.info(f"Adding missing column: {field_name}")
+    
+    if not casts and not missing:
+        return df
+    
+    def build_projection():
+        projection = [
+            col(name).cast(casts[name]).alias(name) if name in casts else col(name)
+            for name in df.columns
+        ]
+        projection += [lit(None).cast(expected_fields[name]).alias(name) for name in missing]
+        return projection
+    
+    try:
+        return df.select(*build_projection())
+    except AnalysisException:
+        # Find the casts Spark rejects, analysing one column at a time only on this slow path
+        for field_name, data_type in list(casts.items()):
             try:
-                df = df.withColumn(field_name, df[field_name].cast(data_type))
-            except Exception as e:
+                df.select(col(field_name).cast(data_type))
+            except AnalysisException as e:
                 logger.warning(f"Could not cast column {field_name}: {str(e)}")
+                del casts[field_name]
+        return df.select(*build_projection())
+
+def apply_evolution_plan(df, plan):
+    """
+    Evolve a DataFrame with a plan from SchemaRegistry.get_evolution_plan.
+    
+    The plan is applied as a single select: kept fields pass through, cast
+    fields are cast, added fields become typed nulls and dropped fields are
+    left out. Columns the plan does not mention, such as the rescued data
+    column, are kept after the plan's fields. Only widening casts are
+    applied; an incompatible plan is rejected rather than silently turning
+    values into nulls.
     
-    return df
+    Args:
+        df: DataFrame with data of the plan's from_version
+        plan: Evolution plan dictionary
+    
+    Returns:
+        DataFrame with the plan's to_version schema
+    
+    Raises:
+        ValueError: If the plan is incompatible or has a narrowing cast
+    """
+    if not plan["is_compatible"]:
+        raise ValueError(
+            f"Evolution plan {plan.get('from_version')} -> {plan.get('to_version')} is not compatible: {plan['issues']}"
+        )
+    
+    widening = {cast["name"]: cast["widening"] for cast in plan["casts"]}
+    
+    projection = []
+    for field in plan["fields"]:
+        if field["action"] == "add" or field["name"] not in df.columns:
+            projection.append(lit(None).cast(field["data_type"]).alias(field["name"]))
+        elif field["action"] == "cast":
+            if not widening.get(field["name"], False):
+                raise ValueError(f"Evolution plan casts {field['name']} to {field['data_type']}, which is not a widening cast")
+            projection.append(col(field["name"]).cast(field["data_type"]).alias(field["name"]))
+        else:
+            projection.append(col(field["name"]))
+    
+    planned = {field["name"] for field in plan["fields"]} | set(plan["dropped"])
+    projection += [col(name) for name in df.columns if name not in planned]
+    
+    return df.select(*projection)
 
 def validate_user_activity_data(df):
     """
-    Validate user activity data and handle bad records.
+    Validate user activity data and tag bad records with their rejection reason.
     
     Args:
         df: DataFrame to validate
     
     Returns:
-        Validated DataFrame
+        DataFrame with a _rejection_reason column, null for valid records
     """
-    # Filter out records with missing required fields
-    validated_df = df.filter(
-        df.user_id.isNotNull() & 
-        df.session_id.isNotNull() & 
-        df.timestamp.isNotNull() & 
-        df.event_type.isNotNull()
-    )
-    
-    # Log number of bad records
-    bad_records_count = df.count() - validated_df.count()
-    if bad_records_count > 0:
-        logger.warning(f"Filtered out {bad_records_count} bad user activity records")
-    
-    return validated_df
+    # Tag records with missing required fields instead of dropping them
+    return tag_rejection_reason(df, USER_ACTIVITY_REQUIRED_FIELDS)
 
 def parse_orders_complex_fields(df):
     """
     Parse complex fields in orders data.
     
+    The JSON text of items and addresses is parsed once into typed arrays and
+    structs. The raw text of values that fail to parse is kept in a side column.
+    
     Args:
         df: DataFrame with orders data
     
     Returns:
         DataFrame with parsed complex fields
     """
-    # This would be more complex in a real implementation
-    # For now, we'll just rename the string fields
-    return df.withColumnRenamed("items", "items_str") \
-             .withColumnRenamed("billing_address", "billing_address_str") \
-             .withColumnRenamed("shipping_address", "shipping_address_str")
+    complex_fields = {
+        "items": get_items_schema(),
+        "billing_address": get_address_schema(),
+        "shipping_address": get_address_schema()
+    }
+    
+    # The generator's CSV files hold Python reprs of these fields, hence single quotes
+    parsed = {
+        name: from_json(col(name), data_type, {"allowSingleQuotes": "true"})
+        for name, data_type in complex_fields.items()
+    }
+    
+    # A value failed to parse if it had text but came back null, or as a struct of nulls
+    failed = {}
+    for name, data_type in complex_fields.items():
+        is_empty = parsed[name].isNull()
+        if isinstance(data_type, StructType):
+            is_empty = is_empty | coalesce(*[parsed[name][field.name] for field in data_type.fields]).isNull()
+        failed[name] = when(col(name).isNotNull() & (trim(col(name)) != "") & is_empty, col(name))
+    
+    parse_errors = when(
+        coalesce(*failed.values()).isNotNull(),
+        to_json(struct(*[failed[name].alias(name) for name in complex_fields]))
+    )
+    
+    other_columns = [col(name) for name in df.columns if name not in complex_fields]
+    return df.select(
+        *other_columns,
+        *[parsed[name].alias(name) for name in complex_fields],
+        parse_errors.alias(PARSE_ERRORS_COLUMN)
+    )
 
 def validate_orders_data(df):
     """
-    Validate orders data and handle bad records.
+    Validate orders data and tag bad records with their rejection reason.
     
     Args:
         df: DataFrame to validate
     
     Returns:
-        Validated DataFrame
+        DataFrame with a _rejection_reason column, null for valid records
     """
-    # Filter out records with missing required fields
-    validated_df = df.filter(
-        df.order_id.isNotNull() & 
-        df.customer_id.isNotNull() & 
-        df.order_date.isNotNull() & 
-        df.order_status.isNotNull() &
-        df.subtotal.isNotNull() &
-        df.total.isNotNull()
-    )
-    
-    # Log number of bad records
-    bad_records_count = df.count() - validated_df.count()
-    if bad_records_count > 0:
-        logger.warning(f"Filtered out {bad_records_count} bad order records")
-    
-    return validated_df
+    # Tag records with missing required fields instead of dropping them
+    return tag_rejection_reason(df, ORDERS_REQUIRED_FIELDS)
 
 def validate_inventory_data(df):
     """
-    Validate inventory data and handle bad records.
+    Validate inventory data and tag bad records with their rejection reason.
     
     Args:
         df: DataFrame to validate
     
     Returns:
-        Validated DataFrame
+        DataFrame with a _rejection_reason column, null for valid records
+    """
+    # Tag records with missing required fields instead of dropping them
+    return tag_rejection_reason(df, INVENTORY_REQUIRED_FIELDS)
+
+# Parallel ingestion driver
+def run_ingestion_job(spark, dataset_name, ingest_function, input_path, output_path, incremental=False):
     """
-    # Filter out records with missing required fields
-    validated_df = df.filter(
-        df.product_id.isNotNull() & 
-        df.product_name.isNotNull() & 
-        df.category.isNotNull() & 
-        df.retail_price.isNotNull() &
-        df.current_stock.isNotNull()
+    Run one dataset's ingestion in its own FAIR scheduler pool and measure it.
+    
+    Args:
+        spark: SparkSession
+        dataset_name: Name of the dataset, also used as pool name and job group prefix
+        ingest_function: ingest_user_activity, ingest_orders or ingest_inventory
+        input_path: Path to input data
+        output_path: Path to output Parquet directory
+        incremental: Whether to ingest only new or changed files
+    
+    Returns:
+        Dictionary with wall time, driver CPU time, Spark job, stage and task
+        counts, and the ingestion reports
+    """
+    sc = spark.sparkContext
+    
+    # A group id unique to this run, so earlier runs' jobs are not counted
+    job_group = f"{dataset_name}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    
+    # Local properties apply to jobs submitted from the calling thread only
+    sc.setLocalProperty("spark.scheduler.pool", dataset_name)
+    sc.setJobGroup(job_group, f"Ingest {dataset_name}")
+    
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    
+    try:
+        if incremental:
+            reports = ingest_incremental(spark, ingest_function, input_path, output_path)
+        else:
+            reports = [ingest_function(spark, input_path, output_path)]
+    
+    finally:
+        sc.setLocalProperty("spark.scheduler.pool", None)
+        sc.setLocalProperty("spark.jobGroup.id", None)
+    
+    # Count the Spark work submitted under this dataset's job group
+    tracker = sc.statusTracker()
+    job_ids = tracker.getJobIdsForGroup(job_group)
+    stage_ids = set()
+    for job_id in job_ids:
+        job_info = tracker.getJobInfo(job_id)
+        if job_info is not None:
+            stage_ids.update(job_info.stageIds)
+    stage_infos = [tracker.getStageInfo(stage_id) for stage_id in stage_ids]
+    
+    result = {
+        "dataset": dataset_name,
+        "job_group": job_group,
+        "wall_seconds": round(time.perf_counter() - start_wall, 3),
+        "driver_cpu_seconds": round(time.thread_time() - start_cpu, 3),
+        "spark_jobs": len(job_ids),
+        "spark_stages": len(stage_ids),
+        "spark_tasks": sum(info.numTasks for info in stage_infos if info is not None),
+        "reports": reports
+    }
+    
+    logger.info(
+        f"Ingested {dataset_name} in {result['wall_seconds']}s "
+        f"({result['driver_cpu_seconds']}s driver CPU, {result['spark_jobs']} jobs, {result['spark_tasks']} tasks)"
     )
+    return result
+
+def ingest_all_parallel(spark, sources, incremental=False, max_workers=None):
+    """
+    Ingest several datasets concurrently as parallel Spark jobs.
+    
+    Each dataset is driven from its own InheritableThread and submits its
+    jobs to its own FAIR scheduler pool, so driver-side work for one dataset
+    (such as reading an XLSX file) overlaps with cluster work for the others.
+    InheritableThread keeps each Python thread's local properties on its
+    own JVM thread, which a plain thread pool does not guarantee.
+    
+    Args:
+        spark: SparkSession (created with spark.scheduler.mode=FAIR)
+        sources: List of (dataset name, ingest function, input path, output path) tuples
+        incremental: Whether to ingest only new or changed files
+        max_workers: Maximum number of concurrent datasets (defaults to one per source)
     
-    # Log number of bad records
-    bad_records_count = df.count() - validated_df.count()
-    if bad_records_count > 0:
-        logger.warning(f"Filtered out {bad_records_count} bad inventory records")
+    Returns:
+        List of per-dataset results from run_ingestion_job, in source order
+    """
+    start_wall = time.perf_counter()
+    
+    slots = threading.Semaphore(max_workers or len(sources))
+    outcomes = [None] * len(sources)
+    
+    def run_source(index, dataset_name, ingest_function, input_path, output_path):
+        with slots:
+            try:
+                outcomes[index] = (run_ingestion_job(spark, dataset_name, ingest_function, input_path, output_path, incremental), None)
+            except Exception as e:
+                outcomes[index] = (None, e)
     
-    return validated_df
+    threads = [
+        InheritableThread(target=run_source, args=(index, *source))
+        for index, source in enumerate(sources)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    # Wait for every dataset before raising, so one failure doesn't hide the others
+    results = []
+    errors = []
+    for (dataset_name, _, _, _), (result, error) in zip(sources, outcomes):
+        if error is None:
+            results.append(result)
+        else:
+            logger.error(f"Error ingesting {dataset_name}: {str(error)}")
+            errors.append(dataset_name)
+    
+    logger.info(f"Parallel ingestion of {len(sources)} datasets took {time.perf_counter() - start_wall:.3f}s")
+    
+    if errors:
+        raise RuntimeError(f"Ingestion failed for datasets: {errors}")
+    
+    return results
 
 def main():
     """Main function to run data ingestion."""
-    # Initialize Spark session
-    spark = get_spark_session()
+    parser = argparse.ArgumentParser(description="Ingest source data into the bronze layer")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append only new or changed source files recorded in the processed-files manifest")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Ingest the datasets one after another instead of in parallel")
+    args = parser.parse_args()
+    
+    sources = [
+        ("user_activity", ingest_user_activity, "../data/user_activity.json", "../data/bronze/user_activity"),
+        ("orders", ingest_orders, "../data/orders.csv", "../data/bronze/orders"),
+        ("inventory", ingest_inventory, "../data/inventory.xlsx", "../data/bronze/inventory")
+    ]
+    
+    # Initialize Spark session, sized for the sources
+    spark = get_spark_session(input_bytes=spark_session.get_input_size([source[2] for source in sources]))
     
     try:
-        # Ingest user activity data
-        user_activity_df = ingest_user_activity(
-            spark, 
-            "../data/user_activity.json", 
-            "../data/bronze/user_activity"
-        )
+        if args.sequential:
+            results = [run_ingestion_job(spark, *source, incremental=args.incremental) for source in sources]
+        else:
+            results = ingest_all_parallel(spark, sources, incremental=args.incremental)
         
-        # Ingest orders data
-        orders_df = ingest_orders(
-            spark, 
-            "../data/orders.csv", 
-            "../data/bronze/orders"
-        )
-        
-        # Ingest inventory data
-        inventory_df = ingest_inventory(
-            spark, 
-            "../data/inventory.xlsx", 
-            "../data/bronze/inventory"
-        )
+        for result in results:
+            logger.info(f"Ingestion result: {json.dumps(result)}")
         
         logger.info("Data ingestion completed successfully")
     
@@ -21,6 +21,7 @@ The data includes:
 - Is Active
 """
 
+import io
 import random
 import datetime
 import os
@@ -168,13 +169,15 @@ def generate_product_name(category, brand):
     # Default fallback
     return f"{brand} {category.title()} Product {random.randint(100, 999)}"
 
-def generate_inventory_data(num_products=1000, as_of_date=None):
+def generate_inventory_data(num_products=1000, as_of_date=None, categories=None):
     """
     Generate inventory data.
     
     Args:
         num_products: Number of products to generate
         as_of_date: Date for inventory data (datetime object)
+        categories: Subset of CATEGORIES to generate products for (all if None).
+            Products are still distributed as if all categories were generated.
     
     Returns:
         List of inventory items as dictionaries
@@ -195,6 +198,9 @@ def generate_inventory_data(num_products=1000, as_of_date=None):
             category_products += 1
             remaining_products -= 1
         
+        if categories is not None and category not in categories:
+            continue
+        
         # Product ID range for this category
         id_range = PRODUCT_RANGES[category]
         price_range = PRICE_RANGES[category]
@@ -259,19 +265,100 @@ def generate_inventory_data(num_products=1000, as_of_date=None):
     
     return inventory_items
 
-def save_to_excel(inventory_data, filename):
-    """Save inventory data to an Excel file."""
+def save_workbook_reproducibly(workbook, filename, timestamp):
+    """
+    Save an openpyxl workbook so the same content always gives the same bytes.
+    
+    openpyxl stamps the document's modified time and every zip entry with
+    the current or a temporary file's time; both are pinned to the given timestamp instead.
+    
+    Args:
+        workbook: openpyxl Workbook
+        filename: Path to the XLSX file
+        timestamp: datetime used for the document and zip entry times
+    """
+    import zipfile
+    from openpyxl.writer.excel import ExcelWriter
+    
+    date_time = timestamp.timetuple()[:6]
+    
+    class FixedTimeZipFile(zipfile.ZipFile):
+        def writestr(self, zinfo_or_arcname, data, *args, **kwargs):
+            if not isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+                zinfo_or_arcname = zipfile.ZipInfo(zinfo_or_arcname, date_time=date_time)
+                zinfo_or_arcname.compress_type = self.compression
+            super().writestr(zinfo_or_arcname, data, *args, **kwargs)
+        
+        def write(self, filename, arcname=None, *args, **kwargs):
+            with open(filename, 'rb') as f:
+                self.writestr(arcname or os.path.basename(filename), f.read())
+    
+    workbook.properties.created = timestamp
+    workbook.properties.modified = timestamp
+    
+    archive = FixedTimeZipFile(filename, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+    ExcelWriter(workbook, archive).save()
+
+def save_to_excel(inventory_data, filename, timestamp=None):
+    """
+    Save inventory data to an Excel file.
+    
+    Args:
+        inventory_data: List of inventory items as dictionaries
+        filename: Path to the XLSX file
+        timestamp: datetime to pin the workbook's created/modified times to,
+            for byte-identical output (defaults to the current time)
+    """
     # Convert to DataFrame
     df = pd.DataFrame(inventory_data)
     
-    # Create Excel writer
-    writer = pd.ExcelWriter(filename, engine='openpyxl')
+    if timestamp is None:
+        # Create Excel writer
+        writer = pd.ExcelWriter(filename, engine='openpyxl')
+        
+        # Write data to Excel
+        df.to_excel(writer, sheet_name='Inventory', index=False)
+        
+        # Save the Excel file
+        writer.close()
+        return
     
-    # Write data to Excel
+    # Build the workbook in memory, then save it with pinned times
+    writer = pd.ExcelWriter(io.BytesIO(), engine='openpyxl')
     df.to_excel(writer, sheet_name='Inventory', index=False)
+    save_workbook_reproducibly(writer.book, filename, timestamp)
+
+def get_inventory_arrow_schema():
+    """Define and return the Arrow schema for inventory data."""
+    import pyarrow as pa
+    
+    return pa.schema([
+        ("product_id", pa.int32()),
+        ("product_name", pa.string()),
+        ("category", pa.string()),
+        ("brand", pa.string()),
+        ("supplier", pa.string()),
+        ("cost_price", pa.float64()),
+        ("retail_price", pa.float64()),
+        ("current_stock", pa.int32()),
+        ("reorder_level", pa.int32()),
+        ("reorder_quantity", pa.int32()),
+        ("warehouse_location", pa.string()),
+        ("last_restock_date", pa.timestamp("us")),
+        ("is_active", pa.bool_())
+    ])
+
+def save_to_parquet(inventory_data, filename):
+    """Save inventory data to a Parquet file with typed columns."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    rows = [
+        dict(item, last_restock_date=datetime.datetime.strptime(item["last_restock_date"], "%Y-%m-%d"))
+        for item in inventory_data
+    ]
     
-    # Save the Excel file
-    writer.close()
+    pq.write_table(pa.Table.from_pylist(rows, schema=get_inventory_arrow_schema()), filename)
 
 def main():
     """Main function to generate and save inventory data."""
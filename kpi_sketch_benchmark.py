@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+KPI Sketch Benchmark Module for E-commerce Data Pipeline
+
+This module compares the sketch-backed KPIs with exact results over the facts:
+- Distinct users: countDistinct(user_id) over the user activity fact against
+  merged HyperLogLog sketches, per day, per month and overall
+- Distinct customers: countDistinct(customer_id) over the sales fact against
+  the customer sketches, per day, per month and overall
+- Top products: the exact top products per category by items sold against
+  estimate_top_products, with how often its bounds contain the exact
+  items sold and rank, and whether every product above the threshold is kept
+
+Timings, relative errors and bound coverage are logged and written as a JSON report.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from pyspark.sql import Window
+from pyspark.sql.functions import col, countDistinct, year, month, row_number, sum as spark_sum
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import processing module
+from data_processing.transformation_module import (
+    get_spark_session, get_sketch_paths, compute_kpi_sketches, estimate_distinct, estimate_top_products,
+    read_sketches, read_sales_fact, read_user_activity_fact, TOP_K_CAPACITY
+)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("../logs/kpi_sketch_benchmark.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("kpi_sketch_benchmark")
+
+# Create logs directory if it doesn't exist
+os.makedirs("../logs", exist_ok=True)
+
+def time_query(query):
+    """
+    Time a query, collecting its result.
+    
+    Args:
+        query: Function returning a DataFrame
+    
+    Returns:
+        Tuple of (seconds, list of Rows)
+    """
+    start = time.perf_counter()
+    rows = query().collect()
+    return time.perf_counter() - start, rows
+
+def compare_counts(exact_rows, sketch_rows, key_columns):
+    """
+    Compare exact and estimated distinct counts row by row.
+    
+    Args:
+        exact_rows: Rows with key columns and distinct_count from the fact
+        sketch_rows: Rows with key columns and distinct_count from the sketches
+        key_columns: List of columns identifying a row
+    
+    Returns:
+        Dictionary with the number of rows and the mean and max relative error
+    """
+    estimates = {tuple(row[c] for c in key_columns): row["distinct_count"] for row in sketch_rows}
+    
+    errors = []
+    for row in exact_rows:
+        key = tuple(row[c] for c in key_columns)
+        if row["distinct_count"] and key in estimates:
+            errors.append(abs(estimates[key] - row["distinct_count"]) / row["distinct_count"])
+    
+    return {
+        "rows": len(errors),
+        "mean_relative_error": round(sum(errors) / len(errors), 5) if errors else None,
+        "max_relative_error": round(max(errors), 5) if errors else None
+    }
+
+def compare_top_products(exact_rows, estimated_rows, threshold_rows, top_n):
+    """
+    Compare estimated top products per category with the exact ranking.
+    
+    A product's rank is bounded by the estimated products around it: it
+    ranks after every product whose lower bound exceeds its upper bound, and
+    at worst after every product whose upper bound reaches its lower bound.
+    Products left out of a full list can reach up to the lowest kept count
+    plus the category's total threshold, so when that reaches a product's
+    lower bound its worst rank is unbounded.
+    
+    Args:
+        exact_rows: Rows with product_category, product_id, items_sold and
+            rank for every product of the sales fact
+        estimated_rows: Rows from estimate_top_products
+        threshold_rows: Rows with product_category and total_threshold
+        top_n: Number of products estimated per category
+    
+    Returns:
+        Dictionary with the share of the exact top products found, of
+        estimates at their exact rank, of exact counts and ranks within the
+        bounds, and the recall of exact top products above the total threshold
+    """
+    exact = {(row["product_category"], row["product_id"]): row for row in exact_rows}
+    thresholds = {row["product_category"]: row["total_threshold"] for row in threshold_rows}
+    
+    by_category = {}
+    for row in estimated_rows:
+        by_category.setdefault(row["product_category"], []).append(row)
+    
+    rank_matches = count_covered = rank_covered = 0
+    for category, rows in by_category.items():
+        lowest_kept = min(row["items_sold"] for row in rows)
+        unlisted_upper = lowest_kept + thresholds.get(category, 0) if len(rows) == top_n else None
+        
+        for row in rows:
+            exact_row = exact.get((category, row["product_id"]))
+            if exact_row is None:
+                continue
+            
+            best_rank = 1 + sum(1 for other in rows if other["items_sold"] > row["items_sold_upper_bound"])
+            worst_rank = sum(1 for other in rows if other["items_sold_upper_bound"] >= row["items_sold"])
+            if unlisted_upper is not None and unlisted_upper >= row["items_sold"]:
+                worst_rank = float("inf")
+            
+            rank_matches += exact_row["rank"] == row["rank"]
+            count_covered += row["items_sold"] <= exact_row["items_sold"] <= row["items_sold_upper_bound"]
+            rank_covered += best_rank <= exact_row["rank"] <= worst_rank
+    
+    estimated_keys = {(row["product_category"], row["product_id"]) for row in estimated_rows}
+    exact_top = [key for key, row in exact.items() if row["rank"] <= top_n]
+    heavy_hitters = [key for key in exact_top if exact[key]["items_sold"] > thresholds.get(key[0], 0)]
+    
+    def share(part, total):
+        return round(part / total, 5) if total else None
+    
+    return {
+        "products": len(estimated_rows),
+        "top_n_recall": share(sum(1 for key in exact_top if key in estimated_keys), len(exact_top)),
+        "rank_match_share": share(rank_matches, len(estimated_rows)),
+        "count_bounds_coverage": share(count_covered, len(estimated_rows)),
+        "rank_bounds_coverage": share(rank_covered, len(estimated_rows)),
+        "heavy_hitters": len(heavy_hitters),
+        "heavy_hitter_recall": share(sum(1 for key in heavy_hitters if key in estimated_keys), len(heavy_hitters))
+    }
+
+def get_distinct_queries(spark, fact_df, column, date_column, sketch_path, sketch_column):
+    """
+    Build the exact and sketch-backed distinct count queries of one KPI.
+    
+    Args:
+        spark: SparkSession
+        fact_df: Fact DataFrame holding the counted column
+        column: Column to count distinct values of
+        date_column: Date column shared by the fact and the sketch table
+        sketch_path: Path to the sketch table
+        sketch_column: Sketch column of the sketch table
+    
+    Returns:
+        Dictionary of period to (key columns, exact query, sketch query)
+    """
+    return {
+        "overall": (
+            [],
+            lambda: fact_df.agg(countDistinct(column).alias("distinct_count")),
+            lambda: estimate_distinct(spark, sketch_path, date_column, sketch_column)
+        ),
+        "by_month": (
+            ["year", "month"],
+            lambda: fact_df.groupBy(year(col(date_column)).alias("year"), month(col(date_column)).alias("month"))
+                .agg(countDistinct(column).alias("distinct_count")),
+            lambda: estimate_distinct(spark, sketch_path, date_column, sketch_column, period="month")
+        ),
+        "by_day": (
+            [date_column],
+            lambda: fact_df.groupBy(date_column).agg(countDistinct(column).alias("distinct_count")),
+            lambda: estimate_distinct(spark, sketch_path, date_column, sketch_column, period="day")
+        )
+    }
+
+def run_benchmark(spark, sales_fact_path, activity_fact_path, kpi_dir, bucketed=False, top_n=TOP_K_CAPACITY):
+    """
+    Benchmark exact and sketch-backed distinct users, distinct customers and top products.
+    
+    Args:
+        spark: SparkSession
+        sales_fact_path: Path to the sales fact Parquet directory
+        activity_fact_path: Path to the user activity fact Parquet directory
+        kpi_dir: Path to the gold KPI directory holding the sketches
+        bucketed: Whether the fact tables are bucketed tables
+        top_n: Number of top products per category to compare
+    
+    Returns:
+        List of result dictionaries
+    """
+    activity_df = read_user_activity_fact(spark, activity_fact_path, bucketed)
+    sales_df = read_sales_fact(spark, sales_fact_path, bucketed)
+    sketch_paths = get_sketch_paths(kpi_dir)
+    
+    start = time.perf_counter()
+    compute_kpi_sketches(spark, sales_df, activity_df, kpi_dir)
+    logger.info(f"Built KPI sketches in {time.perf_counter() - start:.2f}s")
+    
+    # (fact, counted column, fact date column, sketch table, sketch column)
+    distinct_kpis = {
+        "users": (activity_df, "user_id", "event_date", sketch_paths["users_by_date"], "users_sketch"),
+        "customers": (sales_df, "customer_id", "order_date", sketch_paths["customers_by_date"], "customers_sketch")
+    }
+    
+    queries = {}
+    for kpi, (fact_df, column, date_column, sketch_path, sketch_column) in distinct_kpis.items():
+        for period, query in get_distinct_queries(
+            spark, fact_df, column, date_column, sketch_path, sketch_column
+        ).items():
+            queries[f"{kpi}_{period}"] = query
+    
+    results = []
+    for name, (key_columns, exact_query, sketch_query) in queries.items():
+        exact_seconds, exact_rows = time_query(exact_query)
+        sketch_seconds, sketch_rows = time_query(sketch_query)
+        
+        result = {
+            "query": name,
+            "exact_seconds": round(exact_seconds, 4),
+            "sketch_seconds": round(sketch_seconds, 4),
+            **compare_counts(exact_rows, sketch_rows, key_columns)
+        }
+        results.append(result)
+        logger.info(
+            f"{name}: exact {result['exact_seconds']}s, sketch {result['sketch_seconds']}s, "
+            f"mean error {result['mean_relative_error']}, max error {result['max_relative_error']}"
+        )
+    
+    # Top products: the exact ranking covers every product, so estimates ranked past top_n can be checked too
+    top_path = sketch_paths["top_products_by_date"]
+    category_window = Window.partitionBy("product_category").orderBy(col("items_sold").desc(), col("product_id"))
+    exact_seconds, exact_rows = time_query(
+        lambda: sales_df.groupBy("product_category", "product_id")
+            .agg(spark_sum("quantity").alias("items_sold"))
+            .withColumn("rank", row_number().over(category_window))
+    )
+    sketch_seconds, estimated_rows = time_query(lambda: estimate_top_products(spark, top_path, top_n=top_n))
+    threshold_rows = read_sketches(spark, top_path, "order_date") \
+        .select("order_date", "product_category", "threshold").distinct() \
+        .groupBy("product_category").agg(spark_sum("threshold").alias("total_threshold")) \
+        .collect()
+    
+    result = {
+        "query": f"top_{top_n}_products_by_category",
+        "exact_seconds": round(exact_seconds, 4),
+        "sketch_seconds": round(sketch_seconds, 4),
+        **compare_top_products(exact_rows, estimated_rows, threshold_rows, top_n)
+    }
+    results.append(result)
+    logger.info(
+        f"{result['query']}: exact {result['exact_seconds']}s, sketch {result['sketch_seconds']}s, "
+        f"top {top_n} recall {result['top_n_recall']}, rank matches {result['rank_match_share']}, "
+        f"count bounds coverage {result['count_bounds_coverage']}, "
+        f"rank bounds coverage {result['rank_bounds_coverage']}, "
+        f"heavy hitter recall {result['heavy_hitter_recall']}"
+    )
+    
+    return results
+
+def main():
+    """Main function to run the sketch benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark sketch-backed KPIs against exact results")
+    parser.add_argument("--sales-fact", default="../data/gold/facts/sales", help="Path to sales fact")
+    parser.add_argument("--activity-fact", default="../data/gold/facts/user_activity", help="Path to user activity fact")
+    parser.add_argument("--kpi-dir", default="../data/gold/kpis", help="Path to gold KPI directory")
+    parser.add_argument("--bucketed", action="store_true", help="Read the facts as bucketed tables")
+    parser.add_argument("--top-n", type=int, default=TOP_K_CAPACITY, help="Top products per category to compare")
+    parser.add_argument("--output", default="../data/benchmarks/kpi_sketches.json", help="Path to JSON report")
+    args = parser.parse_args()
+    
+    spark = get_spark_session()
+    
+    try:
+        results = run_benchmark(spark, args.sales_fact, args.activity_fact, args.kpi_dir, args.bucketed, args.top_n)
+        
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+        
+        logger.info(f"Saved benchmark results to {args.output}")
+    
+    except Exception as e:
+        logger.error(f"Error running KPI sketch benchmark: {str(e)}")
+        raise
+    
+    finally:
+        spark.stop()
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,6 @@ import logging
 import argparse
 import datetime
 import json
-from pyspark.sql import SparkSession
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -28,6 +27,9 @@ from data_validation.monitoring_alerts import process_validation_results, integr
 from data_validation.validation_optimization import ValidationOptimizer, optimize_validation_pipeline
 from data_validation.test_runner import ValidationTestRunner
 
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -49,14 +51,7 @@ def create_spark_session():
     Returns:
         SparkSession: Spark session
     """
-    return (SparkSession.builder
-            .appName("E-commerce Data Validation")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+    return spark_session.get_spark_session("E-commerce Data Validation")
 
 def setup_validation_environment():
     """
@@ -23,9 +23,14 @@ import statistics
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from pyspark.sql import SparkSession
 from pyspark.sql.functions import col, count, sum as spark_sum, avg, stddev, min as spark_min, max as spark_max
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -46,17 +51,9 @@ os.makedirs("../monitoring/data_quality", exist_ok=True)
 os.makedirs("../monitoring/pipeline_health", exist_ok=True)
 os.makedirs("../monitoring/anomaly_detection", exist_ok=True)
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Data Monitoring")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", "../data/warehouse")
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session("E-commerce Data Monitoring", profile, input_bytes)
 
 class DataQualityMonitor:
     """Data Quality Monitoring for the data pipeline."""
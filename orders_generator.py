@@ -25,11 +25,19 @@ The data includes:
 
 import csv
 import random
-import uuid
 import datetime
+import json
 import os
+import sys
+import numpy as np
 from faker import Faker
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared generator helpers
+from data_generation.generator_utils import generate_uuid
+
 # Initialize Faker
 fake = Faker()
 
@@ -115,6 +123,9 @@ PRICE_RANGES = {
     "automotive": (20, 500)
 }
 
+# Default number of pre-generated addresses in an address pool
+ADDRESS_POOL_SIZE = 10000
+
 def generate_product_data(category=None):
     """Generate random product data."""
     if not category:
@@ -160,7 +171,67 @@ def generate_address():
         "country": "US"
     }
 
-def generate_orders(num_orders=1000, start_date=None, end_date=None):
+def build_address_pool(size=ADDRESS_POOL_SIZE, cache_path=None):
+    """
+    Pre-generate a pool of addresses with Faker.
+    
+    Faker is the slowest part of order generation, so orders can sample
+    from a pool built once instead of calling Faker for every address.
+    
+    Args:
+        size: Number of addresses in the pool
+        cache_path: Optional JSON file to load the pool from and save it to,
+            so the pool is reused across runs
+    
+    Returns:
+        Dictionary mapping address fields to NumPy object arrays
+    """
+    fields = ["street", "city", "state", "zip"]
+    
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if len(cached["street"]) >= size:
+            return {field: np.array(cached[field][:size], dtype=object) for field in fields}
+    
+    pool = {field: [] for field in fields}
+    for _ in range(size):
+        address = generate_address()
+        for field in fields:
+            pool[field].append(address[field])
+    
+    if cache_path:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(pool, f)
+    
+    return {field: np.array(values, dtype=object) for field, values in pool.items()}
+
+def sample_addresses(address_pool, size, rng):
+    """
+    Sample addresses from an address pool with vectorized indexing.
+    
+    Args:
+        address_pool: Pool from build_address_pool
+        size: Number of addresses to sample
+        rng: NumPy random generator
+    
+    Returns:
+        List of address dictionaries
+    """
+    idx = rng.integers(0, len(address_pool["street"]), size=size)
+    
+    return [
+        {"street": street, "city": city, "state": state, "zip": zip_code, "country": "US"}
+        for street, city, state, zip_code in zip(
+            address_pool["street"][idx].tolist(),
+            address_pool["city"][idx].tolist(),
+            address_pool["state"][idx].tolist(),
+            address_pool["zip"][idx].tolist()
+        )
+    ]
+
+def generate_orders(num_orders=1000, start_date=None, end_date=None, address_pool=None):
     """
     Generate order data.
     
@@ -168,6 +239,8 @@ def generate_orders(num_orders=1000, start_date=None, end_date=None):
         num_orders: Number of orders to generate
         start_date: Start date for orders (datetime object)
         end_date: End date for orders (datetime object)
+        address_pool: Optional pool from build_address_pool to sample
+            addresses from instead of calling Faker per order
     
     Returns:
         List of orders as dictionaries
@@ -181,9 +254,15 @@ def generate_orders(num_orders=1000, start_date=None, end_date=None):
     
     # Generate customer IDs (fewer than orders as customers can have multiple orders)
     num_customers = int(num_orders * 0.7)  # Assume 70% unique customers
-    customer_ids = [str(uuid.uuid4()) for _ in range(num_customers)]
+    customer_ids = [generate_uuid() for _ in range(num_customers)]
     
-    for _ in range(num_orders):
+    # Sample pooled addresses in bulk, seeded from random so runs stay reproducible
+    if address_pool is not None:
+        rng = np.random.default_rng(random.getrandbits(64))
+        billing_addresses = sample_addresses(address_pool, num_orders, rng)
+        shipping_addresses = sample_addresses(address_pool, num_orders, rng)
+    
+    for i in range(num_orders):
         # Select a random customer
         customer_id = random.choice(customer_ids)
         
@@ -232,17 +311,22 @@ def generate_orders(num_orders=1000, start_date=None, end_date=None):
         total = subtotal - discount + tax + shipping_cost
         
         # Generate addresses
-        billing_address = generate_address()
+        if address_pool is not None:
+            billing_address = billing_addresses[i]
+        else:
+            billing_address = generate_address()
         
         # Same shipping address as billing 80% of the time
         if random.random() < 0.8:
             shipping_address = billing_address
+        elif address_pool is not None:
+            shipping_address = shipping_addresses[i]
         else:
             shipping_address = generate_address()
         
         # Create order
         order = {
-            "order_id": str(uuid.uuid4()),
+            "order_id": generate_uuid(),
             "customer_id": customer_id,
             "order_date": order_date.isoformat(),
             "order_status": random.choices(
@@ -306,6 +390,63 @@ def save_to_csv(orders, filename):
         writer.writeheader()
         writer.writerows(flat_orders)
 
+def get_orders_arrow_schema():
+    """Define and return the Arrow schema for orders data with nested items and addresses."""
+    import pyarrow as pa
+    
+    item_type = pa.struct([
+        ("product_id", pa.int32()),
+        ("category", pa.string()),
+        ("price", pa.float64()),
+        ("quantity", pa.int32())
+    ])
+    address_type = pa.struct([
+        ("street", pa.string()),
+        ("city", pa.string()),
+        ("state", pa.string()),
+        ("zip", pa.string()),
+        ("country", pa.string())
+    ])
+    
+    return pa.schema([
+        ("order_id", pa.string()),
+        ("customer_id", pa.string()),
+        ("order_date", pa.timestamp("us")),
+        ("order_status", pa.string()),
+        ("payment_method", pa.string()),
+        ("shipping_method", pa.string()),
+        ("subtotal", pa.float64()),
+        ("tax", pa.float64()),
+        ("shipping_cost", pa.float64()),
+        ("discount", pa.float64()),
+        ("coupon_code", pa.string()),
+        ("total", pa.float64()),
+        ("items", pa.list_(item_type)),
+        ("billing_address", address_type),
+        ("shipping_address", address_type)
+    ])
+
+def save_to_parquet(orders, filename):
+    """
+    Save orders to a Parquet file.
+    
+    Unlike save_to_csv, items and addresses are stored as nested list and
+    struct columns rather than stringified.
+    
+    Args:
+        orders: List of order dictionaries
+        filename: Path to output Parquet file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    rows = [
+        dict(order, order_date=datetime.datetime.fromisoformat(order["order_date"]))
+        for order in orders
+    ]
+    
+    pq.write_table(pa.Table.from_pylist(rows, schema=get_orders_arrow_schema()), filename)
+
 def main():
     """Main function to generate and save orders data."""
     # Create data directory if it doesn't exist
@@ -295,7 +295,7 @@ def process_inventory_data(input_dir, output_dir="../data/silver/inventory"):
     return output_dir
 
 @task(retries=2, retry_delay_seconds=120)
-def transform_to_gold_layer(user_activity_dir, orders_dir, inventory_dir, output_dir="../data/gold"):
+def transform_to_gold_layer(user_activity_dir, orders_dir, inventory_dir, output_dir="../data/gold", bucketed=False):
     """
     Transform data to gold layer.
     
@@ -304,6 +304,7 @@ def transform_to_gold_layer(user_activity_dir, orders_dir, inventory_dir, output
         orders_dir: Path to orders silver directory
         inventory_dir: Path to inventory silver directory
         output_dir: Path to gold layer directory
+        bucketed: Whether the fact tables are bucketed tables
     
     Returns:
         Path to output directory
@@ -325,6 +326,36 @@ def transform_to_gold_layer(user_activity_dir, orders_dir, inventory_dir, output
     # For this demo, we'll just log a message
     logger.info(f"Data transformed to gold layer at {output_dir}")
     
+    # Build the KPI tables from the fact tables: in full on the first run,
+    # afterwards by merging only the changed sales fact months
+    sales_fact_dir = f"{output_dir}/facts/sales"
+    activity_fact_dir = f"{output_dir}/facts/user_activity"
+    kpi_dir = f"{output_dir}/kpis"
+    if os.listdir(sales_fact_dir) and os.listdir(activity_fact_dir):
+        # Imported here so defining the flows does not require PySpark
+        from data_processing.transformation_module import (
+            compute_kpis, update_kpis_incremental, read_sales_fact, read_user_activity_fact,
+            get_spark_session as get_processing_spark_session
+        )
+        
+        spark = get_processing_spark_session()
+        activity_df = read_user_activity_fact(spark, activity_fact_dir, bucketed)
+        if os.path.exists(f"{kpi_dir}/total_revenue/_partials"):
+            merged = update_kpis_incremental(spark, sales_fact_dir, kpi_dir, bucketed=bucketed)
+            logger.info(f"Merged sales fact partitions {merged} into KPIs at {kpi_dir}")
+            
+            # User retention is not maintained incrementally, refresh it from the activity fact
+            compute_kpis(spark, None, activity_df, kpi_dir)
+        else:
+            compute_kpis(
+                spark,
+                read_sales_fact(spark, sales_fact_dir, bucketed),
+                activity_df,
+                kpi_dir,
+                sales_fact_path=sales_fact_dir
+            )
+        logger.info(f"KPIs computed at {kpi_dir}")
+    
     return output_dir
 
 @task(retries=1, retry_delay_seconds=60)
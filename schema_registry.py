@@ -12,6 +12,7 @@ Features:
 - Schema evolution support
 """
 
+import copy
 import json
 import os
 import logging
@@ -35,6 +36,16 @@ os.makedirs("../logs", exist_ok=True)
 # Create schema registry directory if it doesn't exist
 os.makedirs("../schema_registry", exist_ok=True)
 
+# Type changes that never lose information, as (from type, to type) class names
+WIDENING_CASTS = {
+    ("IntegerType", "DoubleType"),
+    ("IntegerType", "StringType"),
+    ("DoubleType", "StringType"),
+    ("BooleanType", "IntegerType"),
+    ("BooleanType", "StringType"),
+    ("TimestampType", "StringType")
+}
+
 class SchemaRegistry:
     """Schema Registry for managing data schemas."""
     
@@ -47,6 +58,16 @@ class SchemaRegistry:
         """
         self.registry_dir = registry_dir
         os.makedirs(registry_dir, exist_ok=True)
+        
+        # Parsed schemas keyed by (source, version), with the file mtime (ns) they were read at
+        self._schema_cache = {}
+        
+        # Version indexes keyed by source, with the index file mtime (ns) they were read at
+        self._index_cache = {}
+        
+        # Evolution plans keyed by (source, from version, to version), with the schemas they were built from
+        self._plan_cache = {}
+        
         logger.info(f"Initialized schema registry at {registry_dir}")
     
     def register_schema(self, source_name, schema, version=None):
@@ -76,6 +97,11 @@ class SchemaRegistry:
         with open(schema_file, 'w') as f:
             f.write(schema_json)
         
+        # Add the version to the source's version index
+        versions = self._get_version_index(source_name)
+        if version not in versions:
+            self._write_version_index(source_name, versions + [version])
+        
         logger.info(f"Registered schema for {source_name} version {version}")
         return version
     
@@ -83,6 +109,21 @@ class SchemaRegistry:
         """
         Get a schema for a data source.
         
+        Args:
+            source_name: Name of the data source
+            version: Schema version (or "latest" for the latest version)
+        
+        Returns:
+            PySpark StructType schema, a copy the caller may modify
+        """
+        return StructType.fromJson(self._load_schema(source_name, version).jsonValue())
+    
+    def _load_schema(self, source_name, version="latest"):
+        """
+        Load a schema for a data source through the parsed-schema cache.
+        
+        The returned StructType is the cached object and must not be modified.
+        
         Args:
             source_name: Name of the data source
             version: Schema version (or "latest" for the latest version)
@@ -92,33 +133,100 @@ class SchemaRegistry:
         """
         source_dir = os.path.join(self.registry_dir, source_name)
         
-        if not os.path.exists(source_dir):
-            raise ValueError(f"No schemas found for source {source_name}")
-        
         if version == "latest":
-            # Get the latest version
-            versions = [f for f in os.listdir(source_dir) if f.startswith("v") and f.endswith(".json")]
+            # Get the latest version from the version index
+            versions = self._get_version_index(source_name)
             if not versions:
                 raise ValueError(f"No schemas found for source {source_name}")
             
-            versions.sort(reverse=True)
-            version = versions[0].replace("v", "").replace(".json", "")
+            version = max(versions, key=lambda v: f"v{v}.json")
         
         schema_file = os.path.join(source_dir, f"v{version}.json")
         
-        if not os.path.exists(schema_file):
+        try:
+            mtime = os.stat(schema_file).st_mtime_ns
+        except FileNotFoundError:
             raise ValueError(f"Schema version {version} not found for source {source_name}")
         
+        # Serve the parsed schema from the cache unless the file changed
+        cached = self._schema_cache.get((source_name, version))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
         # Read schema from file
         with open(schema_file, 'r') as f:
             schema_json = f.read()
         
         # Convert JSON to schema
         schema = self._json_to_schema(schema_json)
+        self._schema_cache[(source_name, version)] = (mtime, schema)
         
         logger.info(f"Retrieved schema for {source_name} version {version}")
         return schema
     
+    def _get_version_index(self, source_name):
+        """
+        Get the registered versions of a data source from its version index.
+        
+        The index file is only re-read when its mtime changes, and is rebuilt
+        from the schema files if it does not exist yet.
+        
+        Args:
+            source_name: Name of the data source
+        
+        Returns:
+            List of registered versions
+        """
+        source_dir = os.path.join(self.registry_dir, source_name)
+        index_file = os.path.join(source_dir, "_index.json")
+        
+        try:
+            mtime = os.stat(index_file).st_mtime_ns
+        except FileNotFoundError:
+            if not os.path.exists(source_dir):
+                return []
+            
+            # Registries written before the index existed, build it once
+            versions = [
+                f[len("v"):-len(".json")] for f in os.listdir(source_dir)
+                if f.startswith("v") and f.endswith(".json")
+            ]
+            return self._write_version_index(source_name, versions)
+        
+        cached = self._index_cache.get(source_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        with open(index_file, 'r') as f:
+            versions = json.load(f)["versions"]
+        
+        self._index_cache[source_name] = (mtime, versions)
+        return versions
+    
+    def _write_version_index(self, source_name, versions):
+        """
+        Write the version index of a data source.
+        
+        Args:
+            source_name: Name of the data source
+            versions: List of registered versions
+        
+        Returns:
+            List of registered versions
+        """
+        source_dir = os.path.join(self.registry_dir, source_name)
+        index_file = os.path.join(source_dir, "_index.json")
+        
+        # Replace the index atomically so concurrent readers never see a partial file
+        temp_file = index_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({"versions": sorted(versions)}, f, indent=2)
+        os.replace(temp_file, index_file)
+        
+        versions = sorted(versions)
+        self._index_cache[source_name] = (os.stat(index_file).st_mtime_ns, versions)
+        return versions
+    
     def check_compatibility(self, source_name, new_schema, version="latest"):
         """
         Check if a new schema is compatible with an existing schema.
@@ -132,7 +240,7 @@ class SchemaRegistry:
             Tuple of (is_compatible, compatibility_issues)
         """
         try:
-            existing_schema = self.get_schema(source_name, version)
+            existing_schema = self._load_schema(source_name, version)
         except ValueError:
             # If no existing schema, then it's compatible
             return True, []
@@ -147,6 +255,52 @@ class SchemaRegistry:
         
         return is_compatible, issues
     
+    def get_evolution_plan(self, source_name, from_version, to_version="latest"):
+        """
+        Get the plan for evolving data from one schema version to another.
+        
+        Plans are memoized per version pair and rebuilt only when either
+        schema file changes, so streaming and batch jobs can apply the same
+        precompiled projection to every batch.
+        
+        Args:
+            source_name: Name of the data source
+            from_version: Schema version the data was written with
+            to_version: Schema version to evolve the data to (or "latest")
+        
+        Returns:
+            Evolution plan dictionary with the target fields in order and the
+            action for each (keep, cast or add), the dropped fields, and the
+            compatibility result
+        """
+        if to_version == "latest":
+            versions = self._get_version_index(source_name)
+            if not versions:
+                raise ValueError(f"No schemas found for source {source_name}")
+            to_version = max(versions, key=lambda v: f"v{v}.json")
+        
+        old_schema = self._load_schema(source_name, from_version)
+        new_schema = self._load_schema(source_name, to_version)
+        
+        # _load_schema returns the same objects until a schema file changes
+        cached = self._plan_cache.get((source_name, from_version, to_version))
+        if cached is not None and cached[0] is old_schema and cached[1] is new_schema:
+            return copy.deepcopy(cached[2])
+        
+        plan = self._build_evolution_plan(old_schema, new_schema)
+        plan.update({
+            "source_name": source_name,
+            "from_version": from_version,
+            "to_version": to_version
+        })
+        self._plan_cache[(source_name, from_version, to_version)] = (old_schema, new_schema, copy.deepcopy(plan))
+        
+        logger.info(
+            f"Built evolution plan for {source_name} {from_version} -> {to_version}: "
+            f"{len(plan['added'])} added, {len(plan['casts'])} cast, {len(plan['dropped'])} dropped"
+        )
+        return plan
+    
     def evolve_schema(self, source_name, new_schema, version=None):
         """
         Evolve a schema for a data source.
@@ -300,6 +454,50 @@ class SchemaRegistry:
         else:
             raise ValueError(f"Unexpected type format: {type(type_dict)}")
     
+    def _build_evolution_plan(self, old_schema, new_schema):
+        """
+        Build the plan for evolving data from an old schema to a new schema.
+        
+        Args:
+            old_schema: Old PySpark StructType schema
+            new_schema: New PySpark StructType schema
+        
+        Returns:
+            Evolution plan dictionary
+        """
+        old_fields = {field.name: field for field in old_schema.fields}
+        new_field_names = {field.name for field in new_schema.fields}
+        
+        fields = []
+        added = []
+        casts = []
+        for field in new_schema.fields:
+            old_field = old_fields.get(field.name)
+            if old_field is None:
+                fields.append({"name": field.name, "action": "add", "data_type": field.dataType})
+                added.append(field.name)
+            elif str(old_field.dataType) != str(field.dataType):
+                fields.append({"name": field.name, "action": "cast", "data_type": field.dataType})
+                casts.append({
+                    "name": field.name,
+                    "from_type": old_field.dataType,
+                    "to_type": field.dataType,
+                    "widening": (type(old_field.dataType).__name__, type(field.dataType).__name__) in WIDENING_CASTS
+                })
+            else:
+                fields.append({"name": field.name, "action": "keep", "data_type": field.dataType})
+        
+        is_compatible, issues = self._check_schema_compatibility(old_schema, new_schema)
+        
+        return {
+            "fields": fields,
+            "added": added,
+            "casts": casts,
+            "dropped": [name for name in old_fields if name not in new_field_names],
+            "is_compatible": is_compatible,
+            "issues": issues
+        }
+    
     def _check_schema_compatibility(self, old_schema, new_schema):
         """
         Check if a new schema is compatible with an old schema.
@@ -427,9 +625,10 @@ if __name__ == "__main__":
     
     # Example of schema evolution
     # Evolve user activity schema to add a new field
-    new_user_activity_schema = StructType([
-        StructField("user_id", StringType(), False),
-        StructField("session_id", StringType(), False),
-        StructField("timestamp", TimestampType(), False),
-        StructField("event
-(Content truncated due to size limit. Use line ranges to read in chunks)
\ No newline at end of file
+    new_user_activity_schema = StructType(
+        get_user_activity_schema().fields + [StructField("referrer", StringType(), True)]
+    )
+    
+    new_version = registry.evolve_schema("user_activity", new_user_activity_schema, "1.1.0")
+    plan = registry.get_evolution_plan("user_activity", "1.0.0", new_version)
+    logger.info(f"Evolution plan for user_activity 1.0.0 -> {new_version}: added {plan['added']}")
@@ -14,7 +14,7 @@ source ../venv/bin/activate
 
 # Install required packages
 echo "Installing required packages..."
-pip install great_expectations pandas numpy pyspark faker python-dateutil pytz
+pip install great_expectations pandas numpy "pyspark>=3.5" faker python-dateutil pytz
 
 # Initialize Great Expectations if not already initialized
 if [ ! -d "../great_expectations" ]; then
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Sharded Data Generation Module for E-commerce Data Pipeline
+
+This module runs the user activity, orders and inventory generators in
+parallel across a process pool. Work is split into shards (users, orders or
+categories), each shard is seeded from a seed derived from the run seed and
+writes its own part file.
+
+Features:
+- Process pool generation for all three data sources
+- Deterministic per-shard seeds
+- One output part file per shard
+- Output independent of the number of worker processes
+"""
+
+import os
+import sys
+import json
+import random
+import hashlib
+import logging
+import argparse
+import datetime
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import generator modules
+from data_generation import user_activity_generator
+from data_generation import orders_generator
+from data_generation import inventory_generator
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("../logs/sharded_generation.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("sharded_generation")
+
+# Create logs directory if it doesn't exist
+os.makedirs("../logs", exist_ok=True)
+
+# Default number of shards; kept fixed so output does not depend on the machine
+DEFAULT_NUM_SHARDS = 16
+
+def derive_shard_seed(seed, dataset, shard_index):
+    """
+    Derive a stable 64-bit seed for one shard of a dataset.
+    
+    Args:
+        seed: Run seed
+        dataset: Dataset name (user_activity, orders or inventory)
+        shard_index: Index of the shard
+    
+    Returns:
+        Integer seed
+    """
+    digest = hashlib.sha256(f"{seed}:{dataset}:{shard_index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def split_evenly(total, num_shards):
+    """Split a total into num_shards counts that differ by at most one."""
+    base, remainder = divmod(total, num_shards)
+    return [base + (1 if i < remainder else 0) for i in range(num_shards)]
+
+def seed_generator(module, shard_seed):
+    """Seed the random module and the Faker instance of a generator module."""
+    random.seed(shard_seed)
+    module.fake.seed_instance(shard_seed)
+
+def generate_user_activity_shard(task):
+    """
+    Generate one user activity shard and write it as a JSON Lines part file.
+    
+    Args:
+        task: Dictionary with the shard parameters
+    
+    Returns:
+        Tuple of (part file path, number of events)
+    """
+    seed_generator(user_activity_generator, task["seed"])
+    
+    if task["engine"] == "numpy":
+        batches = user_activity_generator.generate_user_activity_batches(
+            num_users=task["num_users"],
+            events_per_user_range=task["events_per_user_range"],
+            start_date=task["start_date"],
+            end_date=task["end_date"],
+            seed=task["seed"]
+        )
+        events = itertools.chain.from_iterable(
+            user_activity_generator.batch_to_records(batch) for batch in batches
+        )
+    else:
+        events = user_activity_generator.iter_user_activity(
+            num_users=task["num_users"],
+            events_per_user_range=task["events_per_user_range"],
+            start_date=task["start_date"],
+            end_date=task["end_date"]
+        )
+    
+    count = user_activity_generator.save_to_jsonl(events, task["path"], task["compression"])
+    return task["path"], count
+
+def generate_orders_shard(task):
+    """
+    Generate one orders shard and write it as a CSV part file.
+    
+    Args:
+        task: Dictionary with the shard parameters
+    
+    Returns:
+        Tuple of (part file path, number of orders)
+    """
+    seed_generator(orders_generator, task["seed"])
+    
+    address_pool = None
+    if task["address_pool_size"]:
+        address_pool = orders_generator.build_address_pool(task["address_pool_size"])
+    
+    orders = orders_generator.generate_orders(
+        num_orders=task["num_orders"],
+        start_date=task["start_date"],
+        end_date=task["end_date"],
+        address_pool=address_pool
+    )
+    
+    orders_generator.save_to_csv(orders, task["path"])
+    return task["path"], len(orders)
+
+def generate_inventory_shard(task):
+    """
+    Generate one inventory shard and write it as an XLSX part file.
+    
+    Args:
+        task: Dictionary with the shard parameters
+    
+    Returns:
+        Tuple of (part file path, number of products)
+    """
+    seed_generator(inventory_generator, task["seed"])
+    
+    inventory_data = inventory_generator.generate_inventory_data(
+        num_products=task["num_products"],
+        as_of_date=task["as_of_date"],
+        categories=task["categories"]
+    )
+    
+    # Pin the workbook times so parts are byte-identical across runs
+    inventory_generator.save_to_excel(inventory_data, task["path"], timestamp=task["as_of_date"])
+    return task["path"], len(inventory_data)
+
+def run_shards(worker, tasks, num_workers=None):
+    """
+    Run shard tasks on a process pool.
+    
+    Args:
+        worker: Shard function to run for each task
+        tasks: List of task dictionaries
+        num_workers: Number of worker processes (defaults to CPU count)
+    
+    Returns:
+        List of (part file path, record count) tuples in shard order
+    """
+    if not tasks:
+        return []
+    
+    num_workers = min(num_workers or os.cpu_count() or 1, len(tasks))
+    
+    if num_workers == 1:
+        return [worker(task) for task in tasks]
+    
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(worker, tasks))
+
+def generate_user_activity_sharded(output_dir, num_users=1000, events_per_user_range=(1, 20), start_date=None,
+                                   end_date=None, seed=0, num_shards=DEFAULT_NUM_SHARDS, num_workers=None,
+                                   compression=None, engine="python"):
+    """
+    Generate user activity data in parallel, one JSON Lines part file per shard.
+    
+    Users are split evenly across shards. The same seed, dates and shard
+    count always produce byte-identical part files.
+    
+    Args:
+        output_dir: Directory to write part files to
+        num_users: Number of unique users to simulate
+        events_per_user_range: Range of events per user (min, max)
+        start_date: Start date for events (datetime object)
+        end_date: End date for events (datetime object)
+        seed: Run seed
+        num_shards: Number of shards (part files)
+        num_workers: Number of worker processes (defaults to CPU count)
+        compression: None, "gzip" or "zstd"
+        engine: "python" for iter_user_activity (globally time ordered per
+            part) or "numpy" for generate_user_activity_batches
+    
+    Returns:
+        List of (part file path, event count) tuples
+    """
+    if not start_date:
+        start_date = datetime.datetime.now() - datetime.timedelta(days=30)
+    if not end_date:
+        end_date = datetime.datetime.now()
+    
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}[compression]
+    
+    tasks = [
+        {
+            "path": os.path.join(output_dir, f"part-{i:05d}{suffix}"),
+            "seed": derive_shard_seed(seed, "user_activity", i),
+            "num_users": shard_users,
+            "events_per_user_range": events_per_user_range,
+            "start_date": start_date,
+            "end_date": end_date,
+            "compression": compression,
+            "engine": engine
+        }
+        for i, shard_users in enumerate(split_evenly(num_users, num_shards))
+        if shard_users > 0
+    ]
+    
+    logger.info(f"Generating user activity for {num_users} users in {len(tasks)} shards")
+    results = run_shards(generate_user_activity_shard, tasks, num_workers)
+    logger.info(f"Generated {sum(count for _, count in results)} user activity events in {output_dir}")
+    return results
+
+def generate_orders_sharded(output_dir, num_orders=1000, start_date=None, end_date=None, seed=0,
+                            num_shards=DEFAULT_NUM_SHARDS, num_workers=None, address_pool_size=None):
+    """
+    Generate orders data in parallel, one CSV part file per shard.
+    
+    Orders are split evenly across shards and each shard draws from its own
+    customer pool. The same seed, dates and shard count always produce
+    byte-identical part files.
+    
+    Args:
+        output_dir: Directory to write part files to
+        num_orders: Number of orders to generate
+        start_date: Start date for orders (datetime object)
+        end_date: End date for orders (datetime object)
+        seed: Run seed
+        num_shards: Number of shards (part files)
+        num_workers: Number of worker processes (defaults to CPU count)
+        address_pool_size: If set, each shard samples addresses from a
+            pool of this many Faker addresses instead of calling Faker per order
+    
+    Returns:
+        List of (part file path, order count) tuples
+    """
+    if not start_date:
+        start_date = datetime.datetime.now() - datetime.timedelta(days=30)
+    if not end_date:
+        end_date = datetime.datetime.now()
+    
+    os.makedirs(output_dir, exist_ok=True)
+    
+    tasks = [
+        {
+            "path": os.path.join(output_dir, f"part-{i:05d}.csv"),
+            "seed": derive_shard_seed(seed, "orders", i),
+            "num_orders": shard_orders,
+            "start_date": start_date,
+            "end_date": end_date,
+            "address_pool_size": address_pool_size
+        }
+        for i, shard_orders in enumerate(split_evenly(num_orders, num_shards))
+        if shard_orders > 0
+    ]
+    
+    logger.info(f"Generating {num_orders} orders in {len(tasks)} shards")
+    results = run_shards(generate_orders_shard, tasks, num_workers)
+    logger.info(f"Generated {sum(count for _, count in results)} orders in {output_dir}")
+    return results
+
+def generate_inventory_sharded(output_dir, num_products=1000, as_of_date=None, seed=0,
+                               num_shards=len(inventory_generator.CATEGORIES), num_workers=None):
+    """
+    Generate inventory data in parallel, one XLSX part file per shard.
+    
+    Categories are assigned to shards round robin, so there are at most as
+    many shards as categories. The same seed, date and shard count always
+    produce byte-identical part files: the workbook and zip entry times are
+    pinned to as_of_date.
+    
+    Args:
+        output_dir: Directory to write part files to
+        num_products: Number of products to generate
+        as_of_date: Date for inventory data (datetime object)
+        seed: Run seed
+        num_shards: Number of shards (part files)
+        num_workers: Number of worker processes (defaults to CPU count)
+    
+    Returns:
+        List of (part file path, product count) tuples
+    """
+    if not as_of_date:
+        as_of_date = datetime.datetime.now()
+    
+    os.makedirs(output_dir, exist_ok=True)
+    categories = inventory_generator.CATEGORIES
+    num_shards = max(1, min(num_shards, len(categories)))
+    
+    tasks = [
+        {
+            "path": os.path.join(output_dir, f"part-{i:05d}.xlsx"),
+            "seed": derive_shard_seed(seed, "inventory", i),
+            "num_products": num_products,
+            "as_of_date": as_of_date,
+            "categories": categories[i::num_shards]
+        }
+        for i in range(num_shards)
+    ]
+    
+    logger.info(f"Generating {num_products} inventory items in {len(tasks)} shards")
+    results = run_shards(generate_inventory_shard, tasks, num_workers)
+    logger.info(f"Generated {sum(count for _, count in results)} inventory items in {output_dir}")
+    return results
+
+def main():
+    """Main function to generate all datasets with sharding."""
+    parser = argparse.ArgumentParser(description="Sharded E-commerce Data Generation")
+    parser.add_argument("--output-dir", default="../data/sharded", help="Base output directory")
+    parser.add_argument("--seed", type=int, default=0, help="Run seed")
+    parser.add_argument("--num-shards", type=int, default=DEFAULT_NUM_SHARDS, help="Number of shards per dataset")
+    parser.add_argument("--num-workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--num-users", type=int, default=1000, help="Number of users")
+    parser.add_argument("--num-orders", type=int, default=1000, help="Number of orders")
+    parser.add_argument("--address-pool-size", type=int, default=None, help="Size of the per-shard address pool")
+    parser.add_argument("--num-products", type=int, default=1000, help="Number of products")
+    parser.add_argument("--end-date", default=None, help="End date (YYYY-MM-DD), defaults to today")
+    parser.add_argument("--days", type=int, default=30, help="Number of days of activity and orders")
+    args = parser.parse_args()
+    
+    # Fix the dates once so every shard sees the same window
+    if args.end_date:
+        end_date = datetime.datetime.strptime(args.end_date, "%Y-%m-%d")
+    else:
+        end_date = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    start_date = end_date - datetime.timedelta(days=args.days)
+    
+    results = {
+        "user_activity": generate_user_activity_sharded(
+            os.path.join(args.output_dir, "user_activity"),
+            num_users=args.num_users,
+            events_per_user_range=(5, 30),
+            start_date=start_date,
+            end_date=end_date,
+            seed=args.seed,
+            num_shards=args.num_shards,
+            num_workers=args.num_workers
+        ),
+        "orders": generate_orders_sharded(
+            os.path.join(args.output_dir, "orders"),
+            num_orders=args.num_orders,
+            start_date=start_date,
+            end_date=end_date,
+            seed=args.seed,
+            num_shards=args.num_shards,
+            num_workers=args.num_workers,
+            address_pool_size=args.address_pool_size
+        ),
+        "inventory": generate_inventory_sharded(
+            os.path.join(args.output_dir, "inventory"),
+            num_products=args.num_products,
+            as_of_date=end_date,
+            seed=args.seed,
+            num_shards=args.num_shards,
+            num_workers=args.num_workers
+        )
+    }
+    
+    print(json.dumps({name: [path for path, _ in parts] for name, parts in results.items()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,6 @@ import pandas as pd
 import great_expectations as ge
 from great_expectations.core.batch import RuntimeBatchRequest
 from great_expectations.validator.validator import Validator
-from pyspark.sql import SparkSession
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -30,6 +29,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Import GE setup module
 from data_validation.ge_setup import create_data_context, configure_spark_datasource
 
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -49,17 +51,12 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 SILVER_DIR = os.path.join(DATA_DIR, "silver")
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Silver Data Validation")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", os.path.join(DATA_DIR, "warehouse"))
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session(
+        "E-commerce Silver Data Validation", profile, input_bytes,
+        extra_config={"spark.sql.warehouse.dir": os.path.join(DATA_DIR, "warehouse")}
+    )
 
 def create_user_activity_silver_expectations(context, suite_name="user_activity_silver_suite"):
     """
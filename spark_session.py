@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Spark Session Factory for E-commerce Data Pipeline
+
+This module provides the one place where the pipeline's Spark sessions are
+configured. Sessions are built from named performance profiles:
+- local-dev: small local runs on a laptop or CI machine
+- batch-large: large batch jobs on a cluster
+- streaming: long-running streaming ingestion
+
+Features:
+- Shared Delta Lake, Parquet and serialization settings
+- Adaptive query execution, skew join and broadcast settings per profile
+- Shuffle partitions and broadcast threshold chosen from input size
+- Reuse of the active session instead of building a new one
+"""
+
+import os
+import logging
+from pyspark.sql import SparkSession
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("../logs/spark_session.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("spark_session")
+
+# Create logs directory if it doesn't exist
+os.makedirs("../logs", exist_ok=True)
+
+# Profile used when none is given, overridable per environment
+DEFAULT_PROFILE = os.environ.get("PIPELINE_SPARK_PROFILE", "local-dev")
+
+# Target size of one shuffle partition when sizing from input
+TARGET_PARTITION_BYTES = 128 * 1024 * 1024
+
+# Settings shared by every profile
+COMMON_CONFIG = {
+    "spark.sql.extensions": "io.delta.sql.DeltaSparkSessionExtension",
+    "spark.sql.catalog.spark_catalog": "org.apache.spark.sql.delta.catalog.DeltaCatalog",
+    "spark.sql.warehouse.dir": "../data/warehouse",
+    "spark.serializer": "org.apache.spark.serializer.KryoSerializer",
+    "spark.sql.execution.arrow.pyspark.enabled": "true",
+    "spark.sql.execution.arrow.pyspark.fallback.enabled": "true",
+    "spark.sql.parquet.filterPushdown": "true",
+    "spark.sql.files.maxPartitionBytes": "134217728",  # 128 MB
+    "spark.sql.files.openCostInBytes": "4194304"  # 4 MB
+}
+
+# Performance profiles
+PROFILES = {
+    "local-dev": {
+        "master": "local[*]",
+        "config": {
+            "spark.driver.memory": "2g",
+            "spark.executor.memory": "2g",
+            "spark.sql.shuffle.partitions": "8",
+            "spark.sql.adaptive.enabled": "true",
+            "spark.sql.adaptive.coalescePartitions.enabled": "true",
+            "spark.sql.adaptive.skewJoin.enabled": "true",
+            "spark.sql.autoBroadcastJoinThreshold": "10485760",  # 10 MB
+            "spark.sql.parquet.compression.codec": "snappy"
+        }
+    },
+    "batch-large": {
+        "master": None,
+        "config": {
+            "spark.driver.memory": "4g",
+            "spark.executor.memory": "8g",
+            "spark.executor.memoryOverhead": "2g",
+            "spark.memory.fraction": "0.6",
+            "spark.sql.shuffle.partitions": "400",
+            "spark.sql.adaptive.enabled": "true",
+            "spark.sql.adaptive.coalescePartitions.enabled": "true",
+            "spark.sql.adaptive.advisoryPartitionSizeInBytes": "134217728",  # 128 MB
+            "spark.sql.adaptive.skewJoin.enabled": "true",
+            "spark.sql.adaptive.skewJoin.skewedPartitionFactor": "5",
+            "spark.sql.adaptive.skewJoin.skewedPartitionThresholdInBytes": "268435456",  # 256 MB
+            "spark.sql.autoBroadcastJoinThreshold": "67108864",  # 64 MB
+            "spark.sql.parquet.compression.codec": "zstd"
+        }
+    },
+    "streaming": {
+        "master": None,
+        "config": {
+            "spark.driver.memory": "2g",
+            "spark.executor.memory": "2g",
+            # Micro-batches are small, so few shuffle partitions keep per-batch overhead low
+            "spark.sql.shuffle.partitions": "16",
+            "spark.sql.adaptive.enabled": "false",
+            "spark.sql.autoBroadcastJoinThreshold": "10485760",  # 10 MB
+            "spark.sql.streaming.stateStore.providerClass":
+                "org.apache.spark.sql.execution.streaming.state.RocksDBStateStoreProvider",
+            "spark.sql.parquet.compression.codec": "snappy"
+        }
+    }
+}
+
+def get_input_size(paths):
+    """
+    Get the total size in bytes of local input files or directories.
+    
+    Args:
+        paths: Path or list of paths
+    
+    Returns:
+        Total size in bytes
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    
+    total_size = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total_size += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for filename in filenames:
+                    total_size += os.path.getsize(os.path.join(dirpath, filename))
+    
+    return total_size
+
+def get_size_based_config(input_bytes, profile="local-dev"):
+    """
+    Choose shuffle partitions and join thresholds from the input size.
+    
+    Shuffle partitions aim at TARGET_PARTITION_BYTES each, bounded below by
+    the profile's own setting for small inputs. Small inputs are where
+    broadcasting pays off, since every table fits on the executors, so their
+    broadcast threshold is raised up to the input size (at most 64 MB).
+    Skew detection scales with the partition size.
+    
+    Args:
+        input_bytes: Total input size in bytes
+        profile: Name of the performance profile
+    
+    Returns:
+        Dictionary of Spark SQL settings
+    """
+    profile_config = PROFILES[profile]["config"]
+    min_partitions = int(profile_config["spark.sql.shuffle.partitions"])
+    
+    shuffle_partitions = max(min_partitions, min(4000, -(-input_bytes // TARGET_PARTITION_BYTES)))
+    broadcast_threshold = int(profile_config["spark.sql.autoBroadcastJoinThreshold"])
+    if input_bytes < 1024 * 1024 * 1024:
+        broadcast_threshold = max(broadcast_threshold, min(input_bytes, 64 * 1024 * 1024))
+    
+    return {
+        "spark.sql.shuffle.partitions": str(shuffle_partitions),
+        "spark.sql.autoBroadcastJoinThreshold": str(broadcast_threshold),
+        "spark.sql.adaptive.advisoryPartitionSizeInBytes": str(TARGET_PARTITION_BYTES),
+        "spark.sql.adaptive.skewJoin.skewedPartitionThresholdInBytes": str(2 * TARGET_PARTITION_BYTES)
+    }
+
+def get_spark_session(app_name, profile=None, input_bytes=None, extra_config=None):
+    """
+    Get a Spark session configured from a performance profile.
+    
+    If a session is already active it is reused, and only the runtime SQL
+    settings (spark.sql.*) are applied to it; settings such as memory or
+    the scheduler mode only take effect when a session is created, so a
+    warning is logged for each one the active session has differently.
+    
+    Args:
+        app_name: Application name for a new session
+        profile: Name of the performance profile (defaults to DEFAULT_PROFILE)
+        input_bytes: Total input size in bytes, to size shuffles and joins
+        extra_config: Dictionary of additional settings, applied last
+    
+    Returns:
+        SparkSession
+    """
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown Spark profile: {profile}")
+    
+    config = dict(COMMON_CONFIG)
+    config.update(PROFILES[profile]["config"])
+    if input_bytes is not None:
+        config.update(get_size_based_config(input_bytes, profile))
+    if extra_config:
+        config.update(extra_config)
+    
+    spark = SparkSession.getActiveSession()
+    
+    if spark is not None:
+        for key, value in config.items():
+            if key.startswith("spark.sql.") and spark.conf.isModifiable(key):
+                spark.conf.set(key, value)
+            elif spark.conf.get(key, None) != value:
+                logger.warning(
+                    f"Static setting {key}={value} is not applied to the active Spark session "
+                    f"(it has {spark.conf.get(key, None)}); restart the session to change it"
+                )
+        logger.info(f"Reusing active Spark session with profile {profile}")
+        return spark
+    
+    builder = SparkSession.builder.appName(app_name)
+    if PROFILES[profile]["master"] is not None:
+        builder = builder.master(PROFILES[profile]["master"])
+    for key, value in config.items():
+        builder = builder.config(key, value)
+    
+    logger.info(f"Creating Spark session {app_name} with profile {profile}")
+    return builder.getOrCreate()
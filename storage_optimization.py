@@ -13,12 +13,18 @@ Features:
 """
 
 import os
+import sys
 import logging
 import time
 import json
-from pyspark.sql import SparkSession
 from pyspark.sql.functions import col, count, sum as spark_sum, max as spark_max
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,22 +39,12 @@ logger = logging.getLogger("storage_optimization")
 # Create logs directory if it doesn't exist
 os.makedirs("../logs", exist_ok=True)
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Data Storage Optimization")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", "../data/warehouse")
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .config("spark.sql.parquet.compression.codec", "snappy")
-            .config("spark.sql.parquet.mergeSchema", "true")
-            .config("spark.sql.parquet.filterPushdown", "true")
-            .config("spark.sql.files.maxPartitionBytes", "134217728")  # 128 MB
-            .config("spark.sql.files.openCostInBytes", "4194304")  # 4 MB
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session(
+        "E-commerce Data Storage Optimization", profile, input_bytes,
+        extra_config={"spark.sql.parquet.mergeSchema": "true"}
+    )
 
 def compact_parquet_files(spark, input_path, output_path, partition_columns=None, target_size_mb=128):
     """
@@ -13,14 +13,23 @@ Features:
 """
 
 import os
+import sys
 import json
 import time
+import itertools
 import random
 import logging
 from datetime import datetime
-from pyspark.sql import SparkSession
 from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType, ArrayType, TimestampType
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared Spark session factory
+from data_processing import spark_session
+from data_ingestion.ingestion_module import apply_evolution_plan
+from data_generation.user_activity_generator import open_jsonl
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,17 +47,9 @@ os.makedirs("../logs", exist_ok=True)
 # Create data directories if they don't exist
 os.makedirs("../data/bronze/user_activity_stream", exist_ok=True)
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Streaming Data Pipeline")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", "../data/warehouse")
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+def get_spark_session(profile="streaming", input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session("E-commerce Streaming Data Pipeline", profile, input_bytes)
 
 def get_user_activity_schema():
     """Define and return the schema for user activity data."""
@@ -79,12 +80,43 @@ def get_user_activity_schema():
         ), True)
     ])
 
+def iter_source_records(input_file):
+    """
+    Iterate over the records of a user activity source file.
+    
+    JSON Lines files (.jsonl / .ndjson, optionally .gz or .zst compressed)
+    are read one line at a time. Plain .json files holding a single array
+    are loaded whole, as before.
+    
+    Args:
+        input_file: Path to input JSON or JSON Lines file
+    
+    Yields:
+        Records as dictionaries
+    """
+    base_name = input_file
+    for suffix in (".gz", ".zst"):
+        if base_name.endswith(suffix):
+            base_name = base_name[:-len(suffix)]
+    
+    if not base_name.endswith((".jsonl", ".ndjson")):
+        with open(input_file, 'r') as f:
+            yield from json.load(f)
+        return
+    
+    f = open_jsonl(input_file, "rt")
+    
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
 def simulate_streaming_source(input_file, output_dir, batch_size=10, interval_seconds=5):
     """
     Simulate a streaming source by reading from a JSON file and writing batches to output directory.
     
     Args:
-        input_file: Path to input JSON file
+        input_file: Path to input JSON or JSON Lines file
         output_dir: Directory to write streaming batches
         batch_size: Number of records per batch
         interval_seconds: Seconds between batches
@@ -95,17 +127,17 @@ def simulate_streaming_source(input_file, output_dir, batch_size=10, interval_se
     os.makedirs(output_dir, exist_ok=True)
     
     try:
-        # Read all data from JSON file
-        with open(input_file, 'r') as f:
-            all_data = json.load(f)
+        # Read records lazily so only one batch is held in memory
+        records = iter_source_records(input_file)
         
         # Process data in batches
-        total_records = len(all_data)
         batch_count = 0
         
-        for i in range(0, total_records, batch_size):
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
             batch_count += 1
-            batch = all_data[i:i+batch_size]
             
             # Add some randomness to simulate real-time data
             for record in batch:
@@ -143,7 +175,7 @@ def simulate_streaming_source(input_file, output_dir, batch_size=10, interval_se
         logger.error(f"Error in streaming simulation: {str(e)}")
         raise
 
-def process_streaming_data(spark, schema, input_dir, checkpoint_dir, output_dir):
+def process_streaming_data(spark, schema, input_dir, checkpoint_dir, output_dir, evolution_plan=None):
     """
     Process streaming data using Spark Structured Streaming.
     
@@ -153,6 +185,8 @@ def process_streaming_data(spark, schema, input_dir, checkpoint_dir, output_dir)
         input_dir: Directory to read streaming data from
         checkpoint_dir: Directory for streaming checkpoints
         output_dir: Directory to write processed data
+        evolution_plan: Plan from SchemaRegistry.get_evolution_plan to evolve
+            records read with schema to a newer version
     """
     logger.info(f"Starting streaming processing from {input_dir}")
     
@@ -167,6 +201,10 @@ def process_streaming_data(spark, schema, input_dir, checkpoint_dir, output_dir)
             .json(input_dir)
         )
         
+        # The plan's projection is part of the query plan, so it is compiled once, not per micro-batch
+        if evolution_plan is not None:
+            streaming_df = apply_evolution_plan(streaming_df, evolution_plan)
+        
         # Validate data - filter out records with missing required fields
         validated_df = streaming_df.filter(
             streaming_df.user_id.isNotNull() & 
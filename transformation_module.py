@@ -14,13 +14,29 @@ Features:
 """
 
 import os
+import sys
+import json
+import re
+import shutil
 import logging
+import datetime
+from functools import reduce
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession, Window
 from pyspark.sql.functions import col, when, lit, sum as spark_sum, count, avg, max as spark_max
 from pyspark.sql.functions import datediff, to_date, date_format, month, year, dayofmonth
-from pyspark.sql.functions import explode, from_json, expr, rank, dense_rank, row_number
+from pyspark.sql.functions import explode, from_json, expr, rank, dense_rank, row_number, xxhash64
+from pyspark.sql.functions import format_string, min as spark_min
+from pyspark.sql.functions import broadcast, coalesce, least, greatest, current_timestamp
+from pyspark.sql.functions import sha2, concat_ws, date_sub
 from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType, ArrayType
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared Spark session factory
+from data_processing import spark_session
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,17 +55,81 @@ os.makedirs("../logs", exist_ok=True)
 os.makedirs("../data/silver", exist_ok=True)
 os.makedirs("../data/gold", exist_ok=True)
 
-def get_spark_session():
-    """Initialize and return a Spark session."""
-    return (SparkSession.builder
-            .appName("E-commerce Data Processing")
-            .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-            .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-            .config("spark.sql.warehouse.dir", "../data/warehouse")
-            .config("spark.executor.memory", "2g")
-            .config("spark.driver.memory", "2g")
-            .master("local[*]")
-            .getOrCreate())
+# Catalog database and bucket count of bucketed gold tables. Facts and the
+# dimensions they join must use the same bucket count to avoid a shuffle.
+GOLD_DATABASE = "gold"
+GOLD_BUCKETS = 32
+
+# Product attributes whose changes start a new product dimension version
+PRODUCT_TRACKED_COLUMNS = ["retail_price", "cost_price", "brand", "supplier", "is_active"]
+
+# valid_from of the first product dimension versions, and valid_to of current versions
+SCD_START_DATE = datetime.date(1900, 1, 1)
+SCD_END_DATE = datetime.date(9999, 12, 31)
+
+# Number of products kept per top products table
+KPI_TOP_N = 10
+
+# Grouping sets of the shared sales fact aggregation, with the group-by
+# columns in grouping_id() bit order
+REVENUE_GROUP_COLUMNS = ["order_date", "order_year", "order_month", "product_category", "product_id"]
+REVENUE_GROUPING_SETS = {
+    "by_date": ["order_date"],
+    "by_month": ["order_year", "order_month"],
+    "by_category": ["product_category"],
+    "by_product": ["product_category", "product_id"],
+    "by_category_month": ["order_year", "order_month", "product_category"],
+    "by_product_month": ["order_year", "order_month", "product_category", "product_id"]
+}
+
+# Cross-month revenue KPIs and the per-month partials they are merged from.
+# All measures, distinct order counts included, add up across months, as
+# every order falls in a single month.
+REVENUE_PARTIALS = {
+    "by_category": "by_category_month",
+    "by_product": "by_product_month"
+}
+REVENUE_MEASURES = {
+    "total_revenue": "SUM(item_total)",
+    "items_sold": "SUM(quantity)"
+}
+
+# Distinct counts, measure name to counted column, computed outside the
+# grouping sets aggregation
+REVENUE_DISTINCT_COUNTS = {
+    "order_count": "order_id"
+}
+
+# Grouping sets of the shared user activity fact aggregation
+ACTIVITY_GROUP_COLUMNS = ["event_date", "user_id", "activity_year", "activity_month"]
+ACTIVITY_GROUPING_SETS = {
+    "by_date": ["event_date"],
+    "by_user_month": ["user_id", "activity_year", "activity_month"]
+}
+ACTIVITY_MEASURES = {
+    "event_count": "COUNT(*)"
+}
+ACTIVITY_DISTINCT_COUNTS = {
+    "active_users": "user_id"
+}
+
+# HyperLogLog precision (log2 of the number of buckets) of the KPI sketches;
+# relative standard error is about 1.04 / sqrt(2 ** HLL_LG_CONFIG_K), 1.6% at 12
+HLL_LG_CONFIG_K = 12
+
+# Spark version that added the hll_* sketch functions
+HLL_MIN_SPARK_VERSION = (3, 5)
+
+# Products kept per day and category in the top-K product summaries
+TOP_K_CAPACITY = 100
+
+# Columns of the deduplication key index
+KEY_HASH_COLUMN = "_key_hash"
+KEY_DATE_COLUMN = "_key_date"
+
+def get_spark_session(profile=None, input_bytes=None):
+    """Initialize and return a Spark session from a performance profile."""
+    return spark_session.get_spark_session("E-commerce Data Processing", profile, input_bytes)
 
 # Schema for parsing complex fields
 def get_items_schema():
@@ -73,8 +153,366 @@ def get_address_schema():
         StructField("country", StringType(), True)
     ])
 
+# Partition-pruned read and write helpers
+def to_datetime(value):
+    """Convert a date, datetime or YYYY-MM-DD string to a datetime at midnight."""
+    if isinstance(value, str):
+        value = datetime.datetime.strptime(value, "%Y-%m-%d")
+    return datetime.datetime(value.year, value.month, value.day)
+
+def get_month_bounds(start_date, end_date):
+    """
+    Widen a date range to whole months.
+    
+    Args:
+        start_date: First date of the range (or None for no lower bound)
+        end_date: Last date of the range (or None for no upper bound)
+    
+    Returns:
+        Tuple of (first day of the start month, last day of the end month)
+    """
+    start = to_datetime(start_date).replace(day=1) if start_date is not None else None
+    end = None
+    if end_date is not None:
+        next_month = (to_datetime(end_date).replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        end = next_month - datetime.timedelta(days=1)
+    return start, end
+
+def read_bronze(spark, input_path, partition_filters=None, date_column=None, start_date=None, end_date=None):
+    """
+    Read a bronze dataset, pruning partitions and pushing date predicates into the scan.
+    
+    Filters on partition columns let Spark skip whole partition directories,
+    and the date range is compared against timestamp literals so Parquet can
+    skip row groups by their min/max statistics.
+    
+    Args:
+        spark: SparkSession
+        input_path: Path to input Parquet directory
+        partition_filters: Dictionary of partition column to value or list of values
+        date_column: Timestamp or date column the date range applies to
+        start_date: First date to read (inclusive)
+        end_date: Last date to read (inclusive)
+    
+    Returns:
+        DataFrame with the selected bronze data
+    """
+    df = spark.read.parquet(input_path)
+    
+    for column_name, values in (partition_filters or {}).items():
+        if isinstance(values, str):
+            values = [values]
+        df = df.filter(col(column_name).isin(list(values)))
+    
+    if date_column is not None and start_date is not None:
+        df = df.filter(col(date_column) >= lit(to_datetime(start_date)))
+    if date_column is not None and end_date is not None:
+        df = df.filter(col(date_column) < lit(to_datetime(end_date) + datetime.timedelta(days=1)))
+    
+    return df
+
+def write_silver(df, output_path, partition_columns, dynamic_overwrite=False, mode="overwrite"):
+    """
+    Write a silver dataset, optionally replacing only the partitions being written.
+    
+    With dynamic overwrite, partitions that receive no rows keep their
+    existing files, so a filtered run leaves the rest of the dataset intact.
+    
+    Args:
+        df: DataFrame to write
+        output_path: Path to output Parquet directory
+        partition_columns: List of columns to partition by
+        dynamic_overwrite: Whether to overwrite only the partitions present in df
+        mode: Write mode, "overwrite" or "append"
+    """
+    writer = df.write.mode(mode).partitionBy(*partition_columns)
+    if dynamic_overwrite and mode == "overwrite":
+        writer = writer.option("partitionOverwriteMode", "dynamic")
+    writer.parquet(output_path)
+
+def get_key_index_path(output_path):
+    """
+    Get the path of the deduplication key index for a silver dataset.
+    
+    Args:
+        output_path: Path to the silver Parquet directory
+    
+    Returns:
+        Path to the key index directory
+    """
+    output_path = output_path.rstrip("/")
+    return os.path.join(os.path.dirname(output_path), "_key_index", os.path.basename(output_path))
+
+def add_key_hash(df, key_columns, date_column):
+    """
+    Add the hashed dedup key and its date bucket to a DataFrame.
+    
+    Args:
+        df: DataFrame
+        key_columns: List of columns identifying a record
+        date_column: Column whose date buckets the key
+    
+    Returns:
+        DataFrame with KEY_HASH_COLUMN and KEY_DATE_COLUMN added
+    """
+    return df.withColumn(KEY_HASH_COLUMN, xxhash64(*[col(c) for c in key_columns])) \
+        .withColumn(KEY_DATE_COLUMN, to_date(col(date_column)))
+
+def drop_indexed_keys(spark, df, index_path, batch_dates):
+    """
+    Drop records of a batch whose keys are already in the key index.
+    
+    The batch is anti-joined on (date, key hash) against the index partitions
+    for the dates present in the batch. Keys are 64-bit hashes, so a new
+    record is dropped only on a hash collision within the same date, which
+    is negligible at pipeline volumes.
+    
+    Args:
+        spark: SparkSession
+        df: Deduplicated batch with KEY_HASH_COLUMN and KEY_DATE_COLUMN
+        index_path: Path to the key index directory
+        batch_dates: List of the dates present in the batch
+    
+    Returns:
+        DataFrame of new records, with KEY_HASH_COLUMN and KEY_DATE_COLUMN
+    """
+    if not os.path.exists(index_path):
+        return df
+    
+    index_df = spark.read.parquet(index_path).filter(col(KEY_DATE_COLUMN).isin(batch_dates))
+    
+    return df.join(index_df, [KEY_DATE_COLUMN, KEY_HASH_COLUMN], "left_anti")
+
+def update_key_index(df, index_path):
+    """
+    Append the keys of newly written records to the key index.
+    
+    Call this only after the records themselves have been written, so a
+    failed write never leaves keys indexed for records that are missing.
+    
+    Args:
+        df: DataFrame returned by drop_indexed_keys
+        index_path: Path to the key index directory
+    """
+    df.select(KEY_DATE_COLUMN, KEY_HASH_COLUMN) \
+        .write.mode("append") \
+        .partitionBy(KEY_DATE_COLUMN) \
+        .parquet(index_path)
+
+def rebuild_key_index(spark, output_path, key_columns, date_column, index_path, start_date=None, end_date=None):
+    """
+    Rebuild the key index from the records of a silver dataset.
+    
+    Without a date range the whole index is rewritten. With one, only the
+    index partitions of the dates in the range are replaced, and dates in
+    the range that no longer hold records lose their partition.
+    
+    Args:
+        spark: SparkSession
+        output_path: Path to the silver Parquet directory
+        key_columns: List of columns identifying a record
+        date_column: Column whose date buckets the key
+        index_path: Path to the key index directory
+        start_date: First date to rebuild (inclusive)
+        end_date: Last date to rebuild (inclusive)
+    """
+    if not os.path.exists(output_path):
+        return
+    
+    silver_df = read_bronze(spark, output_path, None, date_column, start_date, end_date)
+    keys_df = add_key_hash(silver_df, key_columns, date_column) \
+        .filter(col(KEY_DATE_COLUMN).isNotNull()) \
+        .select(KEY_DATE_COLUMN, KEY_HASH_COLUMN)
+    
+    if start_date is None and end_date is None:
+        keys_df.write.mode("overwrite").partitionBy(KEY_DATE_COLUMN).parquet(index_path)
+        logger.info(f"Rebuilt key index {index_path} from {output_path}")
+        return
+    
+    keys_df.write.mode("overwrite") \
+        .option("partitionOverwriteMode", "dynamic") \
+        .partitionBy(KEY_DATE_COLUMN) \
+        .parquet(index_path)
+    
+    # Dynamic overwrite keeps partitions that received no keys, so clear emptied dates
+    written_dates = {row[KEY_DATE_COLUMN] for row in keys_df.select(KEY_DATE_COLUMN).distinct().collect()}
+    first_date = to_datetime(start_date).date() if start_date is not None else datetime.date.min
+    last_date = to_datetime(end_date).date() if end_date is not None else datetime.date.max
+    for entry in os.listdir(index_path):
+        if not entry.startswith(f"{KEY_DATE_COLUMN}="):
+            continue
+        key_date = datetime.date.fromisoformat(entry.split("=", 1)[1])
+        if first_date <= key_date <= last_date and key_date not in written_dates:
+            shutil.rmtree(os.path.join(index_path, entry))
+    
+    logger.info(f"Rebuilt key index {index_path} for {start_date} to {end_date}")
+
+def write_silver_incremental(spark, df, output_path, partition_columns, key_columns, date_column, key_index_path=None):
+    """
+    Append only the records of a batch that are not yet in a silver dataset.
+    
+    The batch should be a bounded slice of bronze (a date range or partition
+    filter): it is deduplicated exactly on its key columns, so the shuffle
+    only covers the slice. If the key index does not exist yet, it is first
+    seeded from the records already in the silver dataset, so a first
+    incremental run after a full clean does not append them again. Records
+    with a null date cannot be keyed and are dropped with a warning. Both the deduplicated batch and the new records
+    are persisted while in use, so the dates, the silver write and the index
+    update share one lineage, and are unpersisted before returning.
+    
+    Args:
+        spark: SparkSession
+        df: DataFrame holding the new batch
+        output_path: Path to output Parquet directory
+        partition_columns: List of columns to partition by
+        key_columns: List of columns identifying a record
+        date_column: Column whose date buckets the key
+        key_index_path: Path to the key index (defaults to get_key_index_path)
+    
+    Returns:
+        Number of appended records
+    """
+    if key_index_path is None:
+        key_index_path = get_key_index_path(output_path)
+    
+    if not os.path.exists(key_index_path) and os.path.exists(output_path):
+        logger.info(f"Seeding missing key index {key_index_path} from {output_path}")
+        rebuild_key_index(spark, output_path, key_columns, date_column, key_index_path)
+    
+    batch_df = add_key_hash(df.dropDuplicates(key_columns), key_columns, date_column)
+    batch_df = batch_df.persist(StorageLevel.MEMORY_AND_DISK)
+    new_df = None
+    
+    try:
+        batch_dates = [row[KEY_DATE_COLUMN] for row in batch_df.select(KEY_DATE_COLUMN).distinct().collect()]
+        if None in batch_dates:
+            null_count = batch_df.filter(col(KEY_DATE_COLUMN).isNull()).count()
+            logger.warning(f"Dropping {null_count} records with a null {date_column} from the incremental batch")
+            batch_dates = [d for d in batch_dates if d is not None]
+        
+        new_df = drop_indexed_keys(spark, batch_df.filter(col(KEY_DATE_COLUMN).isNotNull()), key_index_path, batch_dates)
+        
+        # Recomputing new_df after the index update would find every key already indexed
+        new_df = new_df.persist(StorageLevel.MEMORY_AND_DISK)
+        write_silver(new_df.drop(KEY_HASH_COLUMN, KEY_DATE_COLUMN), output_path, partition_columns, mode="append")
+        batch_df.unpersist()
+        
+        update_key_index(new_df, key_index_path)
+        return new_df.count()
+    
+    finally:
+        batch_df.unpersist()
+        if new_df is not None:
+            new_df.unpersist()
+
+def get_gold_table_name(output_path):
+    """
+    Get the catalog table name of a gold dataset from its path.
+    
+    Args:
+        output_path: Path to the gold Parquet directory
+    
+    Returns:
+        Qualified table name, e.g. gold.dim_product
+    """
+    return f"{GOLD_DATABASE}.{os.path.basename(output_path.rstrip('/'))}"
+
+def write_gold(df, output_path, partition_columns=None, bucket_column=None, num_buckets=GOLD_BUCKETS,
+               dynamic_overwrite=False):
+    """
+    Write a gold dataset, optionally as a bucketed table sorted within buckets.
+    
+    Bucketed datasets are saved as external catalog tables at output_path, as
+    Spark only keeps bucketing metadata for tables. The data is repartitioned
+    by the bucket column first, so each task writes a single bucket and every
+    partition holds at most num_buckets files.
+    
+    With dynamic overwrite, only the partitions present in df are replaced
+    and all others keep their files untouched, so a run that writes a few
+    new months leaves the other months' files (and their signatures) as they
+    were.
+    
+    Args:
+        df: DataFrame to write
+        output_path: Path to output Parquet directory
+        partition_columns: List of columns to partition by
+        bucket_column: Column to bucket and sort by (None for plain Parquet)
+        num_buckets: Number of buckets
+        dynamic_overwrite: Whether to overwrite only the partitions present in df
+    """
+    partition_columns = partition_columns or []
+    dynamic_overwrite = dynamic_overwrite and bool(partition_columns)
+    
+    if bucket_column is None:
+        writer = df.write.mode("overwrite").partitionBy(*partition_columns)
+        if dynamic_overwrite:
+            writer = writer.option("partitionOverwriteMode", "dynamic")
+        writer.parquet(output_path)
+        return
+    
+    table_name = get_gold_table_name(output_path)
+    df.sparkSession.sql(f"CREATE DATABASE IF NOT EXISTS {GOLD_DATABASE}")
+    bucketed_df = df.repartition(num_buckets, col(bucket_column))
+    
+    if dynamic_overwrite and os.path.exists(output_path):
+        # Insert into the existing table, which keeps its bucketing, replacing only the written partitions
+        table_df = read_gold_table(df.sparkSession, output_path, partition_columns, bucket_column, num_buckets)
+        bucketed_df.select(*table_df.columns) \
+            .write.option("partitionOverwriteMode", "dynamic") \
+            .insertInto(table_name, overwrite=True)
+        logger.info(f"Overwrote the written partitions of {table_name}")
+        return
+    
+    bucketed_df \
+        .write.mode("overwrite") \
+        .partitionBy(*partition_columns) \
+        .bucketBy(num_buckets, bucket_column) \
+        .sortBy(bucket_column) \
+        .option("path", output_path) \
+        .saveAsTable(table_name)
+    
+    logger.info(f"Saved {table_name} with {num_buckets} buckets on {bucket_column}")
+
+def read_gold_table(spark, output_path, partition_columns=None, bucket_column=None, num_buckets=GOLD_BUCKETS):
+    """
+    Read a bucketed gold table, registering it in the catalog if needed.
+    
+    Without a persistent metastore the catalog only lives as long as the
+    session, so a later session re-registers the table over the existing
+    files. Reading through the table, rather than the Parquet path, is what
+    lets Spark use the bucketing to skip the shuffle in joins and group-bys.
+    
+    Args:
+        spark: SparkSession
+        output_path: Path to the gold Parquet directory
+        partition_columns: List of columns the table is partitioned by
+        bucket_column: Column the table is bucketed and sorted by
+        num_buckets: Number of buckets
+    
+    Returns:
+        DataFrame backed by the catalog table
+    """
+    table_name = get_gold_table_name(output_path)
+    
+    if not spark.catalog.tableExists(table_name):
+        spark.sql(f"CREATE DATABASE IF NOT EXISTS {GOLD_DATABASE}")
+        partition_clause = f"PARTITIONED BY ({', '.join(partition_columns)})" if partition_columns else ""
+        spark.sql(f"""
+            CREATE TABLE {table_name}
+            USING parquet
+            {partition_clause}
+            CLUSTERED BY ({bucket_column}) SORTED BY ({bucket_column}) INTO {num_buckets} BUCKETS
+            LOCATION '{os.path.abspath(output_path)}'
+        """)
+        if partition_columns:
+            spark.sql(f"ALTER TABLE {table_name} RECOVER PARTITIONS")
+        logger.info(f"Registered {table_name} over {output_path}")
+    
+    return spark.table(table_name)
+
 # Data cleaning and normalization functions
-def clean_user_activity(spark, input_path, output_path):
+def clean_user_activity(spark, input_path, output_path, start_date=None, end_date=None, event_types=None,
+                        incremental=False, key_index_path=None):
     """
     Clean and normalize user activity data.
     
@@ -82,15 +520,27 @@ def clean_user_activity(spark, input_path, output_path):
         spark: SparkSession
         input_path: Path to input Parquet directory
         output_path: Path to output Parquet directory
+        start_date: First event date to process (defaults to all history)
+        end_date: Last event date to process (defaults to all history)
+        event_types: Event types to process (defaults to all)
+        incremental: Whether to append only records missing from the key index
+            instead of deduplicating and overwriting the whole selection;
+            requires a date range or event types, to bound the batch
+        key_index_path: Path to the key index (defaults to get_key_index_path)
     
     Returns:
         DataFrame with cleaned data
     """
     logger.info(f"Cleaning user activity data from {input_path}")
     
+    if incremental and start_date is None and end_date is None and not event_types:
+        raise ValueError("Incremental cleaning needs a date range or event types to bound the batch")
+    
     try:
-        # Read Parquet files
-        df = spark.read.parquet(input_path)
+        # Read Parquet files, only the requested partitions and dates
+        partition_filters = {"event_type": event_types} if event_types else None
+        df = read_bronze(spark, input_path, partition_filters, "timestamp", start_date, end_date)
+        is_partial = bool(partition_filters) or start_date is not None or end_date is not None
         
         # Handle nulls
         df = df.na.fill({
@@ -105,11 +555,29 @@ def clean_user_activity(spark, input_path, output_path):
         # Normalize event types (lowercase)
         df = df.withColumn("event_type", expr("lower(event_type)"))
         
-        # Remove duplicates
-        df = df.dropDuplicates(["user_id", "session_id", "timestamp", "event_type"])
+        key_columns = ["user_id", "session_id", "timestamp", "event_type"]
         
-        # Write to Parquet
-        df.write.mode("overwrite").partitionBy("event_date", "event_type").parquet(output_path)
+        if incremental:
+            # Deduplicate the batch against the key index and append it
+            appended = write_silver_incremental(
+                spark, df, output_path, ["event_date", "event_type"], key_columns, "event_date", key_index_path
+            )
+            logger.info(f"Appended {appended} new user activity records")
+            
+            # Return the silver slice covering the batch
+            df = read_bronze(spark, output_path, partition_filters, "timestamp", start_date, end_date)
+        else:
+            # Remove duplicates
+            df = df.dropDuplicates(key_columns)
+            
+            # Write to Parquet
+            write_silver(df, output_path, ["event_date", "event_type"], dynamic_overwrite=is_partial)
+            
+            # Keep the key index in step with the rewritten dates for later incremental runs
+            rebuild_key_index(
+                spark, output_path, key_columns, "event_date",
+                key_index_path or get_key_index_path(output_path), start_date, end_date
+            )
         
         logger.info(f"Successfully cleaned {df.count()} user activity records")
         return df
@@ -118,53 +586,76 @@ def clean_user_activity(spark, input_path, output_path):
         logger.error(f"Error cleaning user activity data: {str(e)}")
         raise
 
-def clean_orders(spark, input_path, output_path):
+def clean_orders(spark, input_path, output_path, start_date=None, end_date=None, order_statuses=None,
+                 incremental=False, key_index_path=None):
     """
     Clean and normalize orders data.
     
+    Silver orders are partitioned by month, so a date range is widened to
+    whole months to rewrite complete partitions.
+    
     Args:
         spark: SparkSession
         input_path: Path to input Parquet directory
         output_path: Path to output Parquet directory
+        start_date: First order date to process (defaults to all history)
+        end_date: Last order date to process (defaults to all history)
+        order_statuses: Order statuses to process (defaults to all)
+        incremental: Whether to append only orders missing from the key index
+            instead of deduplicating and overwriting the whole selection;
+            requires a date range or order statuses, to bound the batch
+        key_index_path: Path to the key index (defaults to get_key_index_path)
     
     Returns:
         DataFrame with cleaned data
     """
     logger.info(f"Cleaning orders data from {input_path}")
     
+    if incremental and start_date is None and end_date is None and not order_statuses:
+        raise ValueError("Incremental cleaning needs a date range or order statuses to bound the batch")
+    
     try:
-        # Read Parquet files
-        df = spark.read.parquet(input_path)
-        
-        # Parse complex fields
-        items_schema = get_items_schema()
-        address_schema = get_address_schema()
-        
-        # Clean and parse items
-        df = df.withColumn(
-            "items", 
-            when(col("items_str").isNotNull(), 
-                 from_json(col("items_str").cast("string"), items_schema)
-            ).otherwise(lit(None))
-        )
-        
-        # Clean and parse addresses
-        df = df.withColumn(
-            "billing_address", 
-            when(col("billing_address_str").isNotNull(), 
-                 from_json(col("billing_address_str").cast("string"), address_schema)
-            ).otherwise(lit(None))
-        )
+        # Widen the date range to the monthly silver partitions it touches;
+        # appends leave existing partitions alone, so they need no widening
+        if not incremental:
+            start_date, end_date = get_month_bounds(start_date, end_date)
         
-        df = df.withColumn(
-            "shipping_address", 
-            when(col("shipping_address_str").isNotNull(), 
-                 from_json(col("shipping_address_str").cast("string"), address_schema)
-            ).otherwise(lit(None))
-        )
+        # Read Parquet files, only the requested partitions and dates
+        partition_filters = {"order_status": order_statuses} if order_statuses else None
+        df = read_bronze(spark, input_path, partition_filters, "order_date", start_date, end_date)
+        is_partial = bool(partition_filters) or start_date is not None or end_date is not None
         
-        # Drop original string columns
-        df = df.drop("items_str", "billing_address_str", "shipping_address_str")
+        # Bronze orders hold parsed items and addresses; older bronze data holds JSON strings
+        if "items_str" in df.columns:
+            # Parse complex fields
+            items_schema = get_items_schema()
+            address_schema = get_address_schema()
+            
+            # Clean and parse items
+            df = df.withColumn(
+                "items", 
+                when(col("items_str").isNotNull(), 
+                     from_json(col("items_str").cast("string"), items_schema)
+                ).otherwise(lit(None))
+            )
+            
+            # Clean and parse addresses
+            df = df.withColumn(
+                "billing_address", 
+                when(col("billing_address_str").isNotNull(), 
+                     from_json(col("billing_address_str").cast("string"), address_schema)
+                ).otherwise(lit(None))
+            )
+            
+            df = df.withColumn(
+                "shipping_address", 
+                when(col("shipping_address_str").isNotNull(), 
+                     from_json(col("shipping_address_str").cast("string"), address_schema)
+                ).otherwise(lit(None))
+            )
+            
+            # Drop original string columns
+            df = df.drop("items_str", "billing_address_str", "shipping_address_str")
         
         # Handle nulls
         df = df.na.fill({
@@ -185,11 +676,28 @@ def clean_orders(spark, input_path, output_path):
         # Normalize order status (lowercase)
         df = df.withColumn("order_status", expr("lower(order_status)"))
         
-        # Remove duplicates
-        df = df.dropDuplicates(["order_id"])
-        
-        # Write to Parquet
-        df.write.mode("overwrite").partitionBy("order_year", "order_month", "order_status").parquet(output_path)
+        if incremental:
+            # Deduplicate the batch against the key index and append it
+            appended = write_silver_incremental(
+                spark, df, output_path, ["order_year", "order_month", "order_status"],
+                ["order_id"], "order_date", key_index_path
+            )
+            logger.info(f"Appended {appended} new order records")
+            
+            # Return the silver slice covering the batch
+            df = read_bronze(spark, output_path, partition_filters, "order_date", start_date, end_date)
+        else:
+            # Remove duplicates
+            df = df.dropDuplicates(["order_id"])
+            
+            # Write to Parquet
+            write_silver(df, output_path, ["order_year", "order_month", "order_status"], dynamic_overwrite=is_partial)
+            
+            # Keep the key index in step with the rewritten months for later incremental runs
+            rebuild_key_index(
+                spark, output_path, ["order_id"], "order_date",
+                key_index_path or get_key_index_path(output_path), start_date, end_date
+            )
         
         logger.info(f"Successfully cleaned {df.count()} order records")
         return df
@@ -198,7 +706,7 @@ def clean_orders(spark, input_path, output_path):
         logger.error(f"Error cleaning orders data: {str(e)}")
         raise
 
-def clean_inventory(spark, input_path, output_path):
+def clean_inventory(spark, input_path, output_path, categories=None):
     """
     Clean and normalize inventory data.
     
@@ -206,6 +714,7 @@ def clean_inventory(spark, input_path, output_path):
         spark: SparkSession
         input_path: Path to input Parquet directory
         output_path: Path to output Parquet directory
+        categories: Categories to process (defaults to all)
     
     Returns:
         DataFrame with cleaned data
@@ -213,8 +722,9 @@ def clean_inventory(spark, input_path, output_path):
     logger.info(f"Cleaning inventory data from {input_path}")
     
     try:
-        # Read Parquet files
-        df = spark.read.parquet(input_path)
+        # Read Parquet files, only the requested partitions
+        partition_filters = {"category": categories} if categories else None
+        df = read_bronze(spark, input_path, partition_filters)
         
         # Handle nulls
         df = df.na.fill({
@@ -254,7 +764,7 @@ def clean_inventory(spark, input_path, output_path):
         df = df.dropDuplicates(["product_id"])
         
         # Write to Parquet
-        df.write.mode("overwrite").partitionBy("category", "stock_status").parquet(output_path)
+        write_silver(df, output_path, ["category", "stock_status"], dynamic_overwrite=bool(partition_filters))
         
         logger.info(f"Successfully cleaned {df.count()} inventory records")
         return df
@@ -264,7 +774,8 @@ def clean_inventory(spark, input_path, output_path):
         raise
 
 # Data joining functions
-def create_product_dimension(spark, inventory_df, output_path):
+def create_product_dimension(spark, inventory_df, output_path, bucketed=False, num_buckets=GOLD_BUCKETS,
+                             versions_path=None, snapshot_date=None):
     """
     Create product dimension table.
     
@@ -272,6 +783,11 @@ def create_product_dimension(spark, inventory_df, output_path):
         spark: SparkSession
         inventory_df: Inventory DataFrame
         output_path: Path to output Parquet directory
+        bucketed: Whether to write a bucketed table sorted within buckets
+        num_buckets: Number of buckets, matching the tables it is joined with
+        versions_path: Path to the type 2 product dimension to also apply
+            the inventory snapshot to (None to skip it)
+        snapshot_date: Date the snapshot is valid from (defaults to today)
     
     Returns:
         DataFrame with product dimension
@@ -291,135 +807,500 @@ def create_product_dimension(spark, inventory_df, output_path):
             "is_active"
         )
         
-        # Write to Parquet
-        product_df.write.mode("overwrite").partitionBy("category").parquet(output_path)
+        # Write to Parquet, bucketed like the sales fact
+        write_gold(
+            product_df, output_path, ["category"],
+            bucket_column="product_id" if bucketed else None, num_buckets=num_buckets
+        )
         
         logger.info(f"Successfully created product dimension with {product_df.count()} records")
+        
+        # Keep the attribute history for sales to join on their sale dates
+        if versions_path is not None:
+            update_product_dimension(spark, inventory_df, versions_path, snapshot_date)
+        
         return product_df
     
     except Exception as e:
         logger.error(f"Error creating product dimension: {str(e)}")
         raise
 
-def create_customer_dimension(spark, orders_df, user_activity_df, output_path):
+def get_attribute_hash(columns):
     """
-    Create customer dimension table.
+    Hash a list of attribute columns, telling nulls apart from any value.
+    
+    Args:
+        columns: List of column names
+    
+    Returns:
+        Column with the SHA-256 hex digest
+    """
+    return sha2(concat_ws("\u0001", *[coalesce(col(c).cast("string"), lit("\\N")) for c in columns]), 256)
+
+def update_product_dimension(spark, inventory_df, output_path, snapshot_date=None):
+    """
+    Apply an inventory snapshot to the type 2 product dimension.
+    
+    The dimension is partitioned by is_current and category. Products whose
+    tracked attributes (PRODUCT_TRACKED_COLUMNS) changed, detected by
+    comparing attribute hashes with the current versions, get a new version
+    valid from snapshot_date; the version it replaces is closed the day
+    before and appended to the history partitions, which are never
+    rewritten. A version that already starts on snapshot_date, from an
+    earlier run for the same day, is replaced in place instead. Product names
+    and categories are taken from the snapshot in place (type 1). Only the
+    current partitions of the categories with changes are rewritten: they
+    are staged, then swapped in one by one. Products missing from the
+    snapshot keep their current version. The first snapshot's versions are
+    valid from SCD_START_DATE, so earlier sales still find a version.
     
     Args:
         spark: SparkSession
-        orders_df: Orders DataFrame
-        user_activity_df: User Activity DataFrame
-        output_path: Path to output Parquet directory
+        inventory_df: Inventory snapshot DataFrame
+        output_path: Path to the product dimension Parquet directory
+        snapshot_date: Date the snapshot is valid from (defaults to today)
     
     Returns:
-        DataFrame with customer dimension
+        DataFrame with the changed product versions
     """
-    logger.info("Creating customer dimension table")
+    snapshot_date = to_datetime(snapshot_date).date() if snapshot_date is not None else datetime.date.today()
+    logger.info(f"Updating product dimension at {output_path} with the {snapshot_date} inventory snapshot")
+    
+    current_path = os.path.join(output_path, "is_current=true")
+    joined_df = None
     
     try:
-        # Get customer IDs from orders
-        customer_df = orders_df.select("customer_id").distinct()
-        
-        # Join with user activity to get additional customer information
-        user_df = user_activity_df.select("user_id", "device_type").distinct()
-        
-        # In a real scenario, we would have more customer data
-        # For this demo, we'll create a simple dimension with limited data
-        customer_df = customer_df.join(
-            user_df,
-            customer_df.customer_id == user_df.user_id,
-            "left"
-        ).select(
-            customer_df.customer_id,
-            user_df.device_type
+        snapshot_df = inventory_df.select(
+            "product_id", "product_name", "category", *PRODUCT_TRACKED_COLUMNS
+        ).dropDuplicates(["product_id"]).withColumn("attribute_hash", get_attribute_hash(PRODUCT_TRACKED_COLUMNS))
+        
+        def new_versions(df, valid_from):
+            return df.withColumn("valid_from", lit(valid_from)) \
+                .withColumn("valid_to", lit(SCD_END_DATE)) \
+                .withColumn("product_key", xxhash64(col("product_id"), col("valid_from")))
+        
+        dimension_columns = [
+            "product_key", "product_id", "product_name", "category", *PRODUCT_TRACKED_COLUMNS,
+            "attribute_hash", "valid_from", "valid_to"
+        ]
+        
+        if not os.path.exists(current_path):
+            versions_df = new_versions(snapshot_df, SCD_START_DATE).select(*dimension_columns)
+            versions_df.withColumn("is_current", lit(True)) \
+                .write.mode("overwrite") \
+                .partitionBy("is_current", "category") \
+                .parquet(output_path)
+            logger.info(f"Created product dimension with {versions_df.count()} versions")
+            return versions_df
+        
+        current_df = spark.read.parquet(output_path).filter(col("is_current")).drop("is_current")
+        
+        joined_df = snapshot_df.alias("s").join(
+            current_df.alias("c"), col("s.product_id") == col("c.product_id"), "full"
+        ).persist(StorageLevel.MEMORY_AND_DISK)
+        
+        in_snapshot = col("s.product_id").isNotNull()
+        in_current = col("c.product_id").isNotNull()
+        changed = in_snapshot & (~in_current | (col("s.attribute_hash") != col("c.attribute_hash")))
+        renamed = in_snapshot & in_current & (
+            ~col("s.product_name").eqNullSafe(col("c.product_name"))
+            | ~col("s.category").eqNullSafe(col("c.category"))
         )
         
-        # Fill missing values
-        customer_df = customer_df.na.fill({"device_type": "unknown"})
+        changed_df = new_versions(joined_df.filter(changed).select("s.*"), snapshot_date).select(*dimension_columns)
         
-        # Write to Parquet
-        customer_df.write.mode("overwrite").parquet(output_path)
+        # A version opened by an earlier run for the same day is replaced, not closed
+        closed_df = joined_df.filter(changed & in_current & (col("c.valid_from") < lit(snapshot_date))).select("c.*") \
+            .withColumn("valid_to", date_sub(lit(snapshot_date), 1))
+        kept_df = joined_df.filter(~changed).select(
+            *[
+                coalesce(col(f"s.{c}"), col(f"c.{c}")).alias(c) if c in ("product_name", "category") else col(f"c.{c}")
+                for c in dimension_columns
+            ]
+        )
         
-        logger.info(f"Successfully created customer dimension with {customer_df.count()} records")
-        return customer_df
+        # Categories whose current partition gains, loses or updates a product
+        affected_categories = {
+            category
+            for row in joined_df.filter(changed | renamed).select("s.category", "c.category").distinct().collect()
+            for category in row
+            if category is not None
+        }
+        changed_count = changed_df.count()
+        if not affected_categories:
+            logger.info("Inventory snapshot has no product changes")
+            return changed_df
+        
+        # Append the closed versions to history, then rewrite the affected current partitions
+        closed_df.select(*dimension_columns).withColumn("is_current", lit(False)) \
+            .write.mode("append") \
+            .partitionBy("is_current", "category") \
+            .parquet(output_path)
+        
+        # Stage the affected categories first, as their current rows are read from the partitions being replaced
+        staging_path = os.path.join(output_path, "_staging_current")
+        kept_df.unionByName(changed_df) \
+            .filter(col("category").isin(list(affected_categories))) \
+            .write.mode("overwrite") \
+            .partitionBy("category") \
+            .parquet(staging_path)
+        
+        # Swap in the staged categories; categories left without products are removed
+        for category in affected_categories:
+            category_dir = f"category={category}"
+            if os.path.exists(os.path.join(staging_path, category_dir)):
+                swap_directory(os.path.join(staging_path, category_dir), os.path.join(current_path, category_dir))
+            else:
+                shutil.rmtree(os.path.join(current_path, category_dir), ignore_errors=True)
+        shutil.rmtree(staging_path, ignore_errors=True)
+        
+        logger.info(
+            f"Successfully wrote {changed_count} new product versions, "
+            f"rewriting {len(affected_categories)} current category partitions"
+        )
+        return changed_df
     
     except Exception as e:
-        logger.error(f"Error creating customer dimension: {str(e)}")
+        logger.error(f"Error updating product dimension: {str(e)}")
         raise
+    
+    finally:
+        if joined_df is not None:
+            joined_df.unpersist()
 
-def create_date_dimension(spark, start_date, end_date, output_path):
+def join_product_versions(sales_df, product_dim_df, date_column="order_date"):
     """
-    Create date dimension table.
+    Join sales to the product dimension version valid on each sale date.
     
     Args:
-        spark: SparkSession
-        start_date: Start date (YYYY-MM-DD)
-        end_date: End date (YYYY-MM-DD)
-        output_path: Path to output Parquet directory
+        sales_df: Sales fact DataFrame
+        product_dim_df: Type 2 product dimension DataFrame
+        date_column: Sale date column of sales_df
     
     Returns:
-        DataFrame with date dimension
+        DataFrame of sales with product_key and the versioned product attributes
     """
-    logger.info(f"Creating date dimension table from {start_date} to {end_date}")
+    product_df = product_dim_df.select(
+        col("product_id").alias("dim_product_id"), "product_key", "product_name", *PRODUCT_TRACKED_COLUMNS,
+        "valid_from", "valid_to"
+    )
     
-    try:
-        # Create date range
-        date_df = spark.sql(f"""
-            SELECT explode(sequence(to_date('{start_date}'), to_date('{end_date}'), interval 1 day)) as date
-        """)
-        
-        # Add date attributes
-        date_df = date_df.withColumn("year", year(col("date")))
-        date_df = date_df.withColumn("month", month(col("date")))
-        date_df = date_df.withColumn("day", dayofmonth(col("date")))
-        date_df = date_df.withColumn("month_name", date_format(col("date"), "MMMM"))
-        date_df = date_df.withColumn("day_of_week", date_format(col("date"), "EEEE"))
-        date_df = date_df.withColumn("quarter", expr("quarter(date)"))
-        
-        # Write to Parquet
-        date_df.write.mode("overwrite").partitionBy("year", "month").parquet(output_path)
-        
-        logger.info(f"Successfully created date dimension with {date_df.count()} records")
-        return date_df
+    return sales_df.join(
+        product_df,
+        (sales_df.product_id == product_df.dim_product_id)
+        & (sales_df[date_column] >= product_df.valid_from)
+        & (sales_df[date_column] <= product_df.valid_to),
+        "left"
+    ).drop("dim_product_id", "valid_from", "valid_to")
+
+def dominant_device(device_counts_column):
+    """
+    Get the device with the most events from a device to event count map.
     
-    except Exception as e:
-        logger.error(f"Error creating date dimension: {str(e)}")
-        raise
+    Ties go to the device name that sorts last, so the result is deterministic.
+    
+    Args:
+        device_counts_column: Name of a map<string,bigint> column
+    
+    Returns:
+        Column with the dominant device, or "unknown"
+    """
+    return coalesce(
+        expr(f"array_max(transform(map_entries({device_counts_column}), e -> struct(e.value AS events, e.key AS device))).device"),
+        lit("unknown")
+    )
 
-def create_sales_fact(spark, orders_df, output_path):
+def build_customer_profiles(orders_df, user_activity_df, how="left", broadcast_side=None):
     """
-    Create sales fact table.
+    Aggregate orders and user activity into one profile row per customer.
+    
+    User activity is aggregated per user and device, then per user, so the
+    events are shuffled once and every later step works on per-user rows.
+    The join strategy is left to adaptive query execution, which switches to
+    a broadcast join once the aggregated sides turn out to be small.
+    broadcast_side forces a broadcast where AQE is disabled or mis-sized.
     
     Args:
-        spark: SparkSession
         orders_df: Orders DataFrame
-        output_path: Path to output Parquet directory
+        user_activity_df: User Activity DataFrame
+        how: "left" for customers with orders only, "full" to also keep
+            users with activity but no orders
+        broadcast_side: "activity" to broadcast the activity profiles, or
+            "orders" to broadcast the ordering customers to trim the activity
+            profiles before a left join (None to let Spark decide)
     
     Returns:
-        DataFrame with sales fact
+        DataFrame of customer profiles with device_event_counts
     """
-    logger.info("Creating sales fact table")
+    order_profile_df = orders_df.groupBy("customer_id").agg(
+        spark_min("order_date").alias("first_order_date"),
+        spark_max("order_date").alias("last_order_date"),
+        count("order_id").alias("order_count"),
+        spark_sum("total").alias("total_spent")
+    )
     
-    try:
-        # Explode items array to get one row per item
-        sales_df = orders_df.select(
-            "order_id",
-            "customer_id",
-            "order_date",
-            "order_status",
-            "payment_method",
-            "shipping_method",
-            "subtotal",
-            "tax",
-            "shipping_cost",
-            "discount",
-            "total",
-            "order_year",
-            "order_month",
-            "order_day",
-            explode("items").alias("item")
-        )
-        
+    device_df = user_activity_df.groupBy(col("user_id").alias("customer_id"), "device_type").agg(
+        count(lit(1)).alias("device_events"),
+        spark_min("timestamp").alias("first_seen"),
+        spark_max("timestamp").alias("last_seen")
+    )
+    activity_profile_df = device_df.groupBy("customer_id").agg(
+        expr("map_from_entries(collect_list(struct(coalesce(device_type, 'unknown'), device_events)))")
+            .alias("device_event_counts"),
+        spark_min("first_seen").alias("first_seen"),
+        spark_max("last_seen").alias("last_seen"),
+        spark_sum("device_events").alias("event_count")
+    )
+    
+    if broadcast_side == "activity":
+        activity_profile_df = broadcast(activity_profile_df)
+    elif broadcast_side == "orders" and how == "left":
+        activity_profile_df = activity_profile_df.join(
+            broadcast(order_profile_df.select("customer_id")), "customer_id", "left_semi"
+        )
+    
+    return order_profile_df.join(activity_profile_df, "customer_id", how)
+
+def finish_customer_dimension(profile_df):
+    """
+    Select the customer dimension columns from customer profiles.
+    
+    Args:
+        profile_df: DataFrame of customer profiles
+    
+    Returns:
+        DataFrame with the customer dimension
+    """
+    return profile_df.select(
+        "customer_id",
+        dominant_device("device_event_counts").alias("device_type"),
+        coalesce(col("device_event_counts"), expr("map()").cast("map<string,bigint>")).alias("device_event_counts"),
+        "first_seen",
+        "last_seen",
+        coalesce(col("event_count"), lit(0)).alias("event_count"),
+        "first_order_date",
+        "last_order_date",
+        coalesce(col("order_count"), lit(0)).alias("order_count"),
+        coalesce(col("total_spent"), lit(0.0)).alias("total_spent"),
+        current_timestamp().alias("updated_at")
+    )
+
+def create_customer_dimension(spark, orders_df, user_activity_df, output_path, bucketed=False,
+                              num_buckets=GOLD_BUCKETS, broadcast_side=None):
+    """
+    Create customer dimension table.
+    
+    Each customer with orders gets one row with their dominant device, first
+    and last activity, event count and order totals.
+    
+    Args:
+        spark: SparkSession
+        orders_df: Orders DataFrame
+        user_activity_df: User Activity DataFrame
+        output_path: Path to output Parquet directory
+        bucketed: Whether to write a bucketed table sorted within buckets
+        num_buckets: Number of buckets, matching the tables it is joined with
+        broadcast_side: Side of the profile join to broadcast, "activity" or
+            "orders" (None to let adaptive query execution decide)
+    
+    Returns:
+        DataFrame with customer dimension
+    """
+    logger.info("Creating customer dimension table")
+    
+    try:
+        profile_df = build_customer_profiles(orders_df, user_activity_df, broadcast_side=broadcast_side)
+        customer_df = finish_customer_dimension(profile_df)
+        
+        # Write to Parquet, bucketed like the user activity fact
+        write_gold(
+            customer_df, output_path,
+            bucket_column="customer_id" if bucketed else None, num_buckets=num_buckets
+        )
+        
+        logger.info(f"Successfully created customer dimension with {customer_df.count()} records")
+        return customer_df
+    
+    except Exception as e:
+        logger.error(f"Error creating customer dimension: {str(e)}")
+        raise
+
+def upsert_customer_dimension(spark, orders_df, user_activity_df, output_path, bucketed=False,
+                              num_buckets=GOLD_BUCKETS, broadcast_side=None):
+    """
+    Merge a batch of new orders and user activity into the customer dimension.
+    
+    Only the batch is aggregated. Its profiles are broadcast to split the
+    existing dimension into untouched and matched rows without shuffling
+    it, matched rows are combined with the batch (type 1: attributes are
+    overwritten, counts added up), and new customers with orders are
+    inserted. Users with activity but no orders are only merged into
+    existing customers. The result is staged and swapped in.
+    
+    Args:
+        spark: SparkSession
+        orders_df: DataFrame of new orders
+        user_activity_df: DataFrame of new user activity
+        output_path: Path to the customer dimension Parquet directory
+        bucketed: Whether the dimension is a bucketed table
+        num_buckets: Number of buckets
+        broadcast_side: "activity" to broadcast the batch's activity profiles
+            in the profile join (None to let adaptive query execution decide)
+    
+    Returns:
+        DataFrame with the upserted customer dimension rows
+    """
+    logger.info(f"Upserting customer dimension at {output_path}")
+    
+    if not os.path.exists(output_path):
+        return create_customer_dimension(
+            spark, orders_df, user_activity_df, output_path, bucketed, num_buckets, broadcast_side
+        )
+    
+    batch_df = None
+    
+    try:
+        batch_df = build_customer_profiles(orders_df, user_activity_df, how="full", broadcast_side=broadcast_side)
+        batch_df = batch_df.persist(StorageLevel.MEMORY_AND_DISK)
+        batch_keys_df = broadcast(batch_df.select("customer_id"))
+        
+        if bucketed:
+            existing_df = read_gold_table(spark, output_path, bucket_column="customer_id", num_buckets=num_buckets)
+        else:
+            existing_df = spark.read.parquet(output_path)
+        untouched_df = existing_df.join(batch_keys_df, "customer_id", "left_anti")
+        matched_df = existing_df.join(batch_keys_df, "customer_id", "left_semi")
+        
+        old = matched_df.alias("old")
+        new = batch_df.alias("new")
+        merged_df = new.join(old, col("new.customer_id") == col("old.customer_id"), "left") \
+            .filter(col("old.customer_id").isNotNull() | col("new.order_count").isNotNull()) \
+            .select(
+                col("new.customer_id").alias("customer_id"),
+                expr(
+                    "map_zip_with(coalesce(new.device_event_counts, map()), coalesce(old.device_event_counts, map()), "
+                    "(k, a, b) -> coalesce(a, 0) + coalesce(b, 0))"
+                ).alias("device_event_counts"),
+                least("old.first_seen", "new.first_seen").alias("first_seen"),
+                greatest("old.last_seen", "new.last_seen").alias("last_seen"),
+                (coalesce(col("old.event_count"), lit(0)) + coalesce(col("new.event_count"), lit(0))).alias("event_count"),
+                least("old.first_order_date", "new.first_order_date").alias("first_order_date"),
+                greatest("old.last_order_date", "new.last_order_date").alias("last_order_date"),
+                (coalesce(col("old.order_count"), lit(0)) + coalesce(col("new.order_count"), lit(0))).alias("order_count"),
+                (coalesce(col("old.total_spent"), lit(0.0)) + coalesce(col("new.total_spent"), lit(0.0))).alias("total_spent")
+            )
+        
+        customer_df = untouched_df.unionByName(finish_customer_dimension(merged_df))
+        
+        # Stage the merged dimension, then swap it in
+        output_path = output_path.rstrip("/")
+        staging_path = os.path.join(os.path.dirname(output_path), f"_staging_{os.path.basename(output_path)}")
+        write_gold(customer_df, staging_path, bucket_column="customer_id" if bucketed else None, num_buckets=num_buckets)
+        swap_directory(staging_path, output_path)
+        
+        if bucketed:
+            spark.sql(f"DROP TABLE IF EXISTS {get_gold_table_name(staging_path)}")
+            spark.sql(f"DROP TABLE IF EXISTS {get_gold_table_name(output_path)}")
+            customer_df = read_gold_table(spark, output_path, bucket_column="customer_id", num_buckets=num_buckets)
+        else:
+            customer_df = spark.read.parquet(output_path)
+        
+        logger.info(f"Successfully upserted {batch_df.count()} customer profiles into the customer dimension")
+        return customer_df
+    
+    except Exception as e:
+        logger.error(f"Error upserting customer dimension: {str(e)}")
+        raise
+    
+    finally:
+        if batch_df is not None:
+            batch_df.unpersist()
+
+def create_date_dimension(spark, start_date, end_date, output_path):
+    """
+    Create date dimension table.
+    
+    Args:
+        spark: SparkSession
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD)
+        output_path: Path to output Parquet directory
+    
+    Returns:
+        DataFrame with date dimension
+    """
+    logger.info(f"Creating date dimension table from {start_date} to {end_date}")
+    
+    try:
+        # Create date range
+        date_df = spark.sql(f"""
+            SELECT explode(sequence(to_date('{start_date}'), to_date('{end_date}'), interval 1 day)) as date
+        """)
+        
+        # Add date attributes
+        date_df = date_df.withColumn("year", year(col("date")))
+        date_df = date_df.withColumn("month", month(col("date")))
+        date_df = date_df.withColumn("day", dayofmonth(col("date")))
+        date_df = date_df.withColumn("month_name", date_format(col("date"), "MMMM"))
+        date_df = date_df.withColumn("day_of_week", date_format(col("date"), "EEEE"))
+        date_df = date_df.withColumn("quarter", expr("quarter(date)"))
+        
+        # Write to Parquet
+        date_df.write.mode("overwrite").partitionBy("year", "month").parquet(output_path)
+        
+        logger.info(f"Successfully created date dimension with {date_df.count()} records")
+        return date_df
+    
+    except Exception as e:
+        logger.error(f"Error creating date dimension: {str(e)}")
+        raise
+
+def create_sales_fact(spark, orders_df, output_path, bucketed=False, num_buckets=GOLD_BUCKETS,
+                      product_versions_path=None, dynamic_overwrite=False):
+    """
+    Create sales fact table.
+    
+    With dynamic overwrite only the months present in orders_df are
+    replaced, so passing the orders of new or changed months (such as the
+    slice an incremental clean_orders returns) leaves the other month
+    partitions untouched, and update_kpis_incremental only reprocesses the
+    months that were written.
+    
+    Args:
+        spark: SparkSession
+        orders_df: Orders DataFrame
+        output_path: Path to output Parquet directory
+        bucketed: Whether to write a bucketed table sorted within buckets
+        num_buckets: Number of buckets, matching the tables it is joined with
+        product_versions_path: Path to the type 2 product dimension, to add
+            the product_key of the version valid on each order date (None to skip it)
+        dynamic_overwrite: Whether to overwrite only the months present in orders_df
+    
+    Returns:
+        DataFrame with sales fact
+    """
+    logger.info("Creating sales fact table")
+    
+    try:
+        # Explode items array to get one row per item
+        sales_df = orders_df.select(
+            "order_id",
+            "customer_id",
+            "order_date",
+            "order_status",
+            "payment_method",
+            "shipping_method",
+            "subtotal",
+            "tax",
+            "shipping_cost",
+            "discount",
+            "total",
+            "order_year",
+            "order_month",
+            "order_day",
+            explode("items").alias("item")
+        )
+        
         # Extract item fields
         sales_df = sales_df.select(
             "order_id",
@@ -448,8 +1329,18 @@ def create_sales_fact(spark, orders_df, output_path):
             col("product_price") * col("quantity")
         )
         
-        # Write to Parquet
-        sales_df.write.mode("overwrite").partitionBy("order_year", "order_month").parquet(output_path)
+        # Reference the product version valid when the order was placed
+        if product_versions_path is not None:
+            sales_columns = sales_df.columns
+            sales_df = join_product_versions(sales_df, spark.read.parquet(product_versions_path)) \
+                .select(*sales_columns, "product_key")
+        
+        # Write to Parquet, bucketed by product for joins to the product dimension
+        write_gold(
+            sales_df, output_path, ["order_year", "order_month"],
+            bucket_column="product_id" if bucketed else None, num_buckets=num_buckets,
+            dynamic_overwrite=dynamic_overwrite
+        )
         
         logger.info(f"Successfully created sales fact with {sales_df.count()} records")
         return sales_df
@@ -458,7 +1349,7 @@ def create_sales_fact(spark, orders_df, output_path):
         logger.error(f"Error creating sales fact: {str(e)}")
         raise
 
-def create_user_activity_fact(spark, user_activity_df, output_path):
+def create_user_activity_fact(spark, user_activity_df, output_path, bucketed=False, num_buckets=GOLD_BUCKETS):
     """
     Create user activity fact table.
     
@@ -466,6 +1357,8 @@ def create_user_activity_fact(spark, user_activity_df, output_path):
         spark: SparkSession
         user_activity_df: User Activity DataFrame
         output_path: Path to output Parquet directory
+        bucketed: Whether to write a bucketed table sorted within buckets
+        num_buckets: Number of buckets, matching the tables it is joined with
     
     Returns:
         DataFrame with user activity fact
@@ -488,5 +1381,946 @@ def create_user_activity_fact(spark, user_activity_df, output_path):
         
         # Add year, month, day columns for partitioning
         activity_df = activity_df.withColumn("activity_year", year(col("event_date")))
-        activity_df = activity_df.withColumn("activity_mon
-(Content truncated due to size limit. Use line ranges to read in chunks)
\ No newline at end of file
+        activity_df = activity_df.withColumn("activity_month", month(col("event_date")))
+        activity_df = activity_df.withColumn("activity_day", dayofmonth(col("event_date")))
+        
+        # Write to Parquet, bucketed by user for joins to the customer dimension
+        write_gold(
+            activity_df, output_path, ["activity_year", "activity_month"],
+            bucket_column="user_id" if bucketed else None, num_buckets=num_buckets
+        )
+        
+        logger.info(f"Successfully created user activity fact with {activity_df.count()} records")
+        return activity_df
+    
+    except Exception as e:
+        logger.error(f"Error creating user activity fact: {str(e)}")
+        raise
+
+def read_sales_fact(spark, fact_path, bucketed=False, num_buckets=GOLD_BUCKETS):
+    """
+    Read the sales fact, through its catalog table when it is bucketed.
+    
+    Args:
+        spark: SparkSession
+        fact_path: Path to the sales fact Parquet directory
+        bucketed: Whether the fact was written as a bucketed table
+        num_buckets: Number of buckets
+    
+    Returns:
+        DataFrame with the sales fact
+    """
+    if bucketed:
+        return read_gold_table(spark, fact_path, ["order_year", "order_month"], "product_id", num_buckets)
+    return spark.read.parquet(fact_path)
+
+def read_user_activity_fact(spark, fact_path, bucketed=False, num_buckets=GOLD_BUCKETS):
+    """
+    Read the user activity fact, through its catalog table when it is bucketed.
+    
+    Args:
+        spark: SparkSession
+        fact_path: Path to the user activity fact Parquet directory
+        bucketed: Whether the fact was written as a bucketed table
+        num_buckets: Number of buckets
+    
+    Returns:
+        DataFrame with the user activity fact
+    """
+    if bucketed:
+        return read_gold_table(spark, fact_path, ["activity_year", "activity_month"], "user_id", num_buckets)
+    return spark.read.parquet(fact_path)
+
+# KPI functions
+def get_grouping_id(group_columns, grouping_set):
+    """
+    Get the grouping_id() value of a grouping set.
+    
+    Args:
+        group_columns: List of all group-by columns, in GROUP BY order
+        grouping_set: List of columns in the grouping set
+    
+    Returns:
+        Integer with a bit set for each column not in the grouping set
+    """
+    grouping_id = 0
+    for column in group_columns:
+        grouping_id = (grouping_id << 1) | (0 if column in grouping_set else 1)
+    return grouping_id
+
+def aggregate_grouping_sets(spark, df, view_name, group_columns, grouping_sets, measures, distinct_counts=None):
+    """
+    Compute several aggregations of a DataFrame in one scan with grouping sets.
+    
+    COUNT(DISTINCT) inside GROUPING SETS makes Spark expand every row, with
+    all its measure columns, once per grouping set and distinct column.
+    Distinct counts are therefore computed separately: a narrow projection
+    of the grouping keys and the counted column is expanded per grouping
+    set and deduplicated before it is counted, then combined with the
+    additive measures by key.
+    
+    Both queries read the same narrow projection of df (the group-by,
+    measure and counted columns), which is persisted while the aggregate is
+    built, so the source is scanned once. The returned DataFrames all filter
+    one persisted aggregate, which is materialized here, so writing them
+    does not read the source again. Unpersist the aggregate when done.
+    
+    Args:
+        spark: SparkSession
+        df: DataFrame to aggregate
+        view_name: Name of the temporary view to register df as
+        group_columns: List of all group-by columns
+        grouping_sets: Dictionary of grouping set name to list of columns
+        measures: Dictionary of measure name to additive SQL aggregate expression
+        distinct_counts: Dictionary of measure name to the column whose
+            distinct values it counts
+    
+    Returns:
+        Tuple of (persisted aggregate DataFrame, dictionary of name to DataFrame)
+    """
+    distinct_counts = distinct_counts or {}
+    
+    input_df = None
+    if distinct_counts:
+        # Keep only the columns the queries use, and share one scan between them
+        used_columns = [
+            c for c in df.columns
+            if c in group_columns or c in distinct_counts.values()
+            or any(re.search(rf"\b{re.escape(c)}\b", expression) for expression in measures.values())
+        ]
+        input_df = df.select(*used_columns).persist(StorageLevel.MEMORY_AND_DISK)
+        df = input_df
+    
+    df.createOrReplaceTempView(view_name)
+    
+    group_sql = ", ".join(group_columns)
+    sets_sql = ", ".join(f"({', '.join(columns)})" for columns in grouping_sets.values())
+    measure_names = list(measures.keys()) + list(distinct_counts.keys())
+    
+    def select_measures(computed):
+        return ", ".join(f"{computed.get(name, 'NULL')} AS {name}" for name in measure_names)
+    
+    queries = [f"""
+        SELECT {group_sql}, grouping_id() AS _grouping_id, {select_measures(measures)}
+        FROM {view_name}
+        GROUP BY {group_sql}
+        GROUPING SETS ({sets_sql})
+    """]
+    
+    grouping_ids = {name: get_grouping_id(group_columns, columns) for name, columns in grouping_sets.items()}
+    ids_sql = ", ".join(str(grouping_id) for grouping_id in grouping_ids.values())
+    masked_sql = ", ".join(
+        f"CASE WHEN _grouping_id IN ({', '.join(str(grouping_ids[name]) for name, columns in grouping_sets.items() if column in columns) or 'NULL'}) "
+        f"THEN {column} END AS {column}"
+        for column in group_columns
+    )
+    for name, column in distinct_counts.items():
+        queries.append(f"""
+            SELECT {group_sql}, _grouping_id, {select_measures({name: "COUNT(_distinct_value)"})}
+            FROM (
+                SELECT DISTINCT {masked_sql}, _grouping_id, {column} AS _distinct_value
+                FROM {view_name} LATERAL VIEW explode(array({ids_sql})) _sets AS _grouping_id
+            ) _distinct_keys
+            GROUP BY {group_sql}, _grouping_id
+        """)
+    
+    if len(queries) == 1:
+        aggregate_sql = queries[0]
+    else:
+        # Each group has one row per query, carrying only that query's measures
+        union_sql = " UNION ALL ".join(f"({query})" for query in queries)
+        aggregate_sql = f"""
+            SELECT {group_sql}, _grouping_id, {', '.join(f"MAX({name}) AS {name}" for name in measure_names)}
+            FROM ({union_sql}) _partial_aggregates
+            GROUP BY {group_sql}, _grouping_id
+        """
+    
+    aggregate_df = spark.sql(aggregate_sql).persist(StorageLevel.MEMORY_AND_DISK)
+    
+    # Materialize the aggregate with full parallelism, before single-file writes read it
+    try:
+        aggregate_df.count()
+    finally:
+        if input_df is not None:
+            input_df.unpersist()
+    
+    results = {}
+    for name, columns in grouping_sets.items():
+        results[name] = aggregate_df \
+            .filter(col("_grouping_id") == grouping_ids[name]) \
+            .select(*columns, *measure_names)
+    
+    return aggregate_df, results
+
+def compute_top_products(product_revenue_df, top_n=KPI_TOP_N):
+    """
+    Rank products by revenue, overall and within each category.
+    
+    Args:
+        product_revenue_df: DataFrame of revenue by product_category and product_id
+        top_n: Number of products to keep per ranking
+    
+    Returns:
+        Dictionary with "by_category" and "overall" DataFrames
+    """
+    products_df = product_revenue_df.select(
+        "product_id",
+        "product_category",
+        col("total_revenue").alias("revenue"),
+        col("items_sold").alias("quantity_sold"),
+        "order_count",
+        when(col("items_sold") > 0, col("total_revenue") / col("items_sold")).otherwise(lit(0.0)).alias("avg_price")
+    )
+    
+    category_window = Window.partitionBy("product_category").orderBy(col("revenue").desc(), col("product_id"))
+    by_category_df = products_df \
+        .withColumn("rank", row_number().over(category_window)) \
+        .filter(col("rank") <= top_n)
+    
+    overall_window = Window.orderBy(col("revenue").desc(), col("product_id"))
+    overall_df = products_df \
+        .orderBy(col("revenue").desc(), col("product_id")) \
+        .limit(top_n) \
+        .withColumn("rank", row_number().over(overall_window))
+    
+    return {"by_category": by_category_df, "overall": overall_df}
+
+def compute_cohort_retention(user_month_df):
+    """
+    Compute monthly cohort retention from distinct active user months.
+    
+    A user's cohort is the first month they were active in.
+    
+    Args:
+        user_month_df: DataFrame of user_id, activity_year, activity_month
+    
+    Returns:
+        DataFrame with cohort_month, activity_month, months_since_cohort,
+        active_users and retention_rate
+    """
+    month_index = col("activity_year") * 12 + col("activity_month") - 1
+    
+    user_month_df = user_month_df \
+        .withColumn("month_index", month_index) \
+        .withColumn("cohort_index", spark_min("month_index").over(Window.partitionBy("user_id")))
+    
+    retention_df = user_month_df.groupBy("cohort_index", "month_index").agg(
+        count("user_id").alias("active_users")
+    )
+    
+    cohort_size_df = retention_df \
+        .filter(col("cohort_index") == col("month_index")) \
+        .select("cohort_index", col("active_users").alias("cohort_size"))
+    
+    def month_label(index_column):
+        return format_string("%04d-%02d", expr(f"floor({index_column} / 12)"), expr(f"{index_column} % 12 + 1"))
+    
+    return retention_df.join(cohort_size_df, "cohort_index").select(
+        month_label("cohort_index").alias("cohort_month"),
+        month_label("month_index").alias("activity_month"),
+        (col("month_index") - col("cohort_index")).alias("months_since_cohort"),
+        "active_users",
+        (col("active_users") / col("cohort_size")).alias("retention_rate")
+    )
+
+def write_kpi(df, output_path, sort_columns, partition_columns=None, dynamic_overwrite=False):
+    """
+    Write a KPI table as a few sorted files for fast dashboard reads.
+    
+    Args:
+        df: DataFrame to write
+        output_path: Path to output Parquet directory
+        sort_columns: List of columns to sort by
+        partition_columns: List of columns to partition by
+        dynamic_overwrite: Whether to overwrite only the partitions present in df
+    """
+    partition_columns = partition_columns or []
+    
+    # A shuffle into one partition keeps the upstream stages parallel
+    writer = df.repartition(1) \
+        .sortWithinPartitions(*sort_columns) \
+        .write.mode("overwrite") \
+        .partitionBy(*partition_columns)
+    if dynamic_overwrite:
+        writer = writer.option("partitionOverwriteMode", "dynamic")
+    writer.parquet(output_path)
+
+def compute_kpis(spark, sales_df, user_activity_df, output_dir, top_n=KPI_TOP_N, sales_fact_path=None):
+    """
+    Compute the gold KPI tables from the sales and user activity facts.
+    
+    Each fact is scanned once: revenue by date, month, category and product
+    come from one grouping sets aggregation of the sales fact, and daily
+    active users and user months from one of the user activity fact. Top
+    products and cohort retention are derived from those small aggregates.
+    
+    Per-month revenue partials are written alongside, so update_kpis_incremental
+    can later merge new months into the tables. Once it does, pass no sales
+    fact to refresh only the user retention tables.
+    
+    Args:
+        spark: SparkSession
+        sales_df: Sales fact DataFrame (None to skip the revenue and top products tables)
+        user_activity_df: User activity fact DataFrame
+        output_dir: Path to the gold KPI directory
+        top_n: Number of products to keep per top products table
+        sales_fact_path: Path the sales fact was read from, to record its
+            partitions as processed for update_kpis_incremental
+    
+    Returns:
+        Dictionary of KPI table path (relative to output_dir) to DataFrame
+    """
+    logger.info(f"Computing KPIs into {output_dir}")
+    
+    revenue_aggregate_df = None
+    activity_aggregate_df = None
+    
+    try:
+        kpis = {}
+        
+        if sales_df is not None:
+            revenue_aggregate_df, revenue = aggregate_grouping_sets(
+                spark, sales_df, "sales_fact", REVENUE_GROUP_COLUMNS, REVENUE_GROUPING_SETS,
+                REVENUE_MEASURES, REVENUE_DISTINCT_COUNTS
+            )
+            top_products = compute_top_products(revenue["by_product"], top_n)
+            
+            kpis.update({
+                "total_revenue/by_date": (revenue["by_date"], ["order_date"], None),
+                "total_revenue/by_month": (revenue["by_month"], ["order_year", "order_month"], None),
+                "total_revenue/by_category": (revenue["by_category"], ["product_category"], None),
+                "total_revenue/by_product": (revenue["by_product"], ["product_category", "product_id"], None),
+                "total_revenue/_partials/by_category_month": (
+                    revenue["by_category_month"], ["product_category"], ["order_year", "order_month"]
+                ),
+                "total_revenue/_partials/by_product_month": (
+                    revenue["by_product_month"], ["product_category", "product_id"], ["order_year", "order_month"]
+                ),
+                "top_products/by_category": (top_products["by_category"], ["rank"], ["product_category"]),
+                "top_products/overall": (top_products["overall"], ["rank"], None)
+            })
+        
+        activity_aggregate_df, activity = aggregate_grouping_sets(
+            spark, user_activity_df, "user_activity_fact",
+            ACTIVITY_GROUP_COLUMNS, ACTIVITY_GROUPING_SETS, ACTIVITY_MEASURES, ACTIVITY_DISTINCT_COUNTS
+        )
+        user_activity_dates = activity["by_date"]
+        user_monthly_activity = compute_cohort_retention(
+            activity["by_user_month"].drop(*ACTIVITY_MEASURES.keys(), *ACTIVITY_DISTINCT_COUNTS.keys())
+        )
+        
+        kpis.update({
+            "user_retention/user_activity_dates": (user_activity_dates, ["event_date"], None),
+            "user_retention/user_monthly_activity": (user_monthly_activity, ["cohort_month", "activity_month"], None)
+        })
+        
+        for name, (kpi_df, sort_columns, partition_columns) in kpis.items():
+            write_kpi(kpi_df, os.path.join(output_dir, name), sort_columns, partition_columns)
+            logger.info(f"Wrote KPI table {name}")
+        
+        if sales_df is not None and sales_fact_path is not None:
+            save_kpi_state(get_fact_partition_signatures(sales_fact_path), get_kpi_state_path(output_dir))
+        
+        logger.info(f"Successfully computed {len(kpis)} KPI tables")
+        return {name: kpi_df for name, (kpi_df, _, _) in kpis.items()}
+    
+    except Exception as e:
+        logger.error(f"Error computing KPIs: {str(e)}")
+        raise
+    
+    finally:
+        if revenue_aggregate_df is not None:
+            revenue_aggregate_df.unpersist()
+        if activity_aggregate_df is not None:
+            activity_aggregate_df.unpersist()
+
+# Incremental KPI maintenance functions
+def get_kpi_state_path(output_dir):
+    """Get the path of the processed sales fact partitions state file."""
+    return os.path.join(output_dir, "_state", "sales_fact_partitions.json")
+
+def get_fact_partition_signatures(fact_path):
+    """
+    Get the size and modification time of each month partition of the sales fact.
+    
+    Signatures only stay stable for months whose files are not rewritten, so
+    the fact should be maintained with create_sales_fact(dynamic_overwrite=True)
+    for the new or changed months rather than rebuilt in full.
+    
+    Args:
+        fact_path: Path to the sales fact Parquet directory
+    
+    Returns:
+        Dictionary of "<order_year>/<order_month>" to {"size", "mtime"}
+    """
+    signatures = {}
+    
+    for dirpath, dirnames, filenames in os.walk(fact_path):
+        relative_path = os.path.relpath(dirpath, fact_path)
+        parts = relative_path.split(os.sep)
+        if len(parts) != 2 or not parts[0].startswith("order_year=") or not parts[1].startswith("order_month="):
+            continue
+        
+        data_files = [os.path.join(dirpath, f) for f in filenames if not f.startswith((".", "_"))]
+        key = f"{int(parts[0].split('=', 1)[1])}/{int(parts[1].split('=', 1)[1])}"
+        signatures[key] = {
+            "size": sum(os.path.getsize(f) for f in data_files),
+            "mtime": max([os.path.getmtime(f) for f in data_files], default=0)
+        }
+    
+    return signatures
+
+def load_kpi_state(state_path):
+    """Load the processed sales fact partition signatures, or an empty dict."""
+    if not os.path.exists(state_path):
+        return {}
+    
+    with open(state_path, 'r') as f:
+        return json.load(f).get("partitions", {})
+
+def save_kpi_state(signatures, state_path):
+    """Save the processed sales fact partition signatures atomically."""
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    
+    temp_path = state_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({"partitions": signatures}, f, indent=2, sort_keys=True)
+    os.replace(temp_path, state_path)
+
+def find_changed_fact_partitions(fact_path, state_path):
+    """
+    Find the month partitions of the sales fact that are new, changed or deleted.
+    
+    Partitions recorded as processed that no longer exist are included, so
+    their rows are removed from the KPIs.
+    
+    Args:
+        fact_path: Path to the sales fact Parquet directory
+        state_path: Path to the processed partitions state file
+    
+    Returns:
+        Sorted list of (order_year, order_month) tuples
+    """
+    state = load_kpi_state(state_path)
+    signatures = get_fact_partition_signatures(fact_path)
+    
+    changed = [key for key, signature in signatures.items() if state.get(key) != signature]
+    deleted = [key for key in state if key not in signatures]
+    if deleted:
+        logger.info(f"Sales fact partitions deleted since the last run: {deleted}")
+    
+    return sorted(tuple(int(part) for part in key.split("/")) for key in changed + deleted)
+
+def get_month_filter(partitions, year_column, month_column):
+    """
+    Build a filter matching a list of (year, month) partitions.
+    
+    Args:
+        partitions: List of (year, month) tuples
+        year_column: Column or expression holding the year
+        month_column: Column or expression holding the month
+    
+    Returns:
+        Boolean Column
+    """
+    return reduce(
+        lambda left, right: left | right,
+        [(year_column == y) & (month_column == m) for y, m in partitions]
+    )
+
+def merge_additive(total_df, new_df, old_df, key_columns, measure_columns):
+    """
+    Merge per-month partials into a cross-month total.
+    
+    The total becomes total + new - old, so months that were already
+    counted are replaced rather than added twice. Keys left without orders
+    are dropped.
+    
+    Args:
+        total_df: DataFrame of the current totals
+        new_df: DataFrame of the new partials of the reprocessed months
+        old_df: DataFrame of the previous partials of the reprocessed months
+        key_columns: List of key columns
+        measure_columns: List of additive measure columns
+    
+    Returns:
+        DataFrame of the merged totals
+    """
+    negated_df = old_df.select(*key_columns, *[(-col(m)).alias(m) for m in measure_columns])
+    
+    return total_df.select(*key_columns, *measure_columns) \
+        .unionByName(new_df.select(*key_columns, *measure_columns)) \
+        .unionByName(negated_df) \
+        .groupBy(*key_columns) \
+        .agg(*[spark_sum(m).alias(m) for m in measure_columns]) \
+        .filter(col("order_count") > 0)
+
+def swap_directory(staging_path, output_path):
+    """Replace a directory with a staged copy."""
+    if os.path.exists(output_path):
+        shutil.rmtree(output_path)
+    os.rename(staging_path, output_path)
+
+def update_kpis_incremental(spark, sales_fact_path, output_dir, partitions=None, top_n=KPI_TOP_N,
+                            bucketed=False, num_buckets=GOLD_BUCKETS):
+    """
+    Merge new, changed or deleted sales fact months into the revenue and top products KPIs.
+    
+    Only the given month partitions of the sales fact are scanned, with one
+    grouping sets aggregation. Revenue by date and month replaces the rows of
+    those months; revenue by category and product is merged with the stored
+    per-month partials. Top products are re-ranked only for the categories
+    the months touch. All tables are staged first and only then swapped in,
+    so a run that fails while staging leaves the previous KPIs and partials
+    untouched.
+    
+    Args:
+        spark: SparkSession
+        sales_fact_path: Path to the sales fact Parquet directory
+        output_dir: Path to the gold KPI directory, built by compute_kpis
+        partitions: List of (order_year, order_month) tuples to merge
+            (defaults to the partitions changed since the last run)
+        top_n: Number of products to keep per top products table
+        bucketed: Whether the sales fact is a bucketed table
+        num_buckets: Number of buckets of the sales fact
+    
+    Returns:
+        List of (order_year, order_month) tuples merged
+    """
+    state_path = get_kpi_state_path(output_dir)
+    revenue_dir = os.path.join(output_dir, "total_revenue")
+    top_products_dir = os.path.join(output_dir, "top_products")
+    
+    if partitions is None:
+        partitions = find_changed_fact_partitions(sales_fact_path, state_path)
+    
+    if not partitions:
+        logger.info("No new sales fact partitions, KPIs are up to date")
+        return []
+    
+    if not os.path.exists(os.path.join(revenue_dir, "_partials")):
+        raise ValueError(f"No KPI partials in {output_dir}, run compute_kpis first")
+    
+    logger.info(f"Merging sales fact partitions {partitions} into KPIs at {output_dir}")
+    
+    incremental_sets = {
+        name: REVENUE_GROUPING_SETS[name]
+        for name in ["by_date", "by_month", "by_category_month", "by_product_month"]
+    }
+    measure_columns = list(REVENUE_MEASURES.keys()) + list(REVENUE_DISTINCT_COUNTS.keys())
+    by_category_path = os.path.join(top_products_dir, "by_category")
+    staging_paths = {
+        name: os.path.join(revenue_dir, f"_staging_{name}")
+        for name in ["by_date", "by_month", *REVENUE_PARTIALS.keys(), *REVENUE_PARTIALS.values()]
+    }
+    staging_paths["top_by_category"] = os.path.join(top_products_dir, "_staging_by_category")
+    staging_paths["top_overall"] = os.path.join(top_products_dir, "_staging_overall")
+    aggregate_df = None
+    
+    try:
+        new_sales_df = read_sales_fact(spark, sales_fact_path, bucketed, num_buckets) \
+            .filter(get_month_filter(partitions, col("order_year"), col("order_month")))
+        aggregate_df, new = aggregate_grouping_sets(
+            spark, new_sales_df, "sales_fact_increment", REVENUE_GROUP_COLUMNS, incremental_sets,
+            REVENUE_MEASURES, REVENUE_DISTINCT_COUNTS
+        )
+        
+        # Revenue by date and month: keep the other months and add the new ones
+        by_date_df = spark.read.parquet(os.path.join(revenue_dir, "by_date")) \
+            .filter(~get_month_filter(partitions, year(col("order_date")), month(col("order_date")))) \
+            .unionByName(new["by_date"])
+        by_month_df = spark.read.parquet(os.path.join(revenue_dir, "by_month")) \
+            .filter(~get_month_filter(partitions, col("order_year"), col("order_month"))) \
+            .unionByName(new["by_month"])
+        
+        tables = {
+            "by_date": (by_date_df, ["order_date"]),
+            "by_month": (by_month_df, ["order_year", "order_month"])
+        }
+        
+        # Revenue by category and product: merge with the partials of those months
+        affected_categories = set()
+        for total_name, partial_name in REVENUE_PARTIALS.items():
+            key_columns = REVENUE_GROUPING_SETS[total_name]
+            partial_path = os.path.join(revenue_dir, "_partials", partial_name)
+            old_partial_df = spark.read.parquet(partial_path) \
+                .filter(get_month_filter(partitions, col("order_year"), col("order_month")))
+            
+            tables[total_name] = (
+                merge_additive(
+                    spark.read.parquet(os.path.join(revenue_dir, total_name)),
+                    new[partial_name], old_partial_df, key_columns, measure_columns
+                ),
+                key_columns
+            )
+            
+            if total_name == "by_category":
+                affected_categories = {
+                    row["product_category"]
+                    for row in new[partial_name].select("product_category")
+                        .union(old_partial_df.select("product_category")).distinct().collect()
+                }
+        
+        # Stage the merged totals and the new partials
+        for name, (table_df, sort_columns) in tables.items():
+            write_kpi(table_df, staging_paths[name], sort_columns)
+        
+        for partial_name in REVENUE_PARTIALS.values():
+            write_kpi(
+                new[partial_name], staging_paths[partial_name],
+                REVENUE_GROUPING_SETS[partial_name][2:], ["order_year", "order_month"]
+            )
+        
+        # Stage top products re-ranked for the affected categories, from the staged totals
+        ranked_categories = set()
+        if affected_categories:
+            products_df = spark.read.parquet(staging_paths["by_product"]) \
+                .filter(col("product_category").isin(list(affected_categories)))
+            write_kpi(
+                compute_top_products(products_df, top_n)["by_category"],
+                staging_paths["top_by_category"], ["rank"], ["product_category"]
+            )
+            ranked_categories = {
+                row["product_category"] for row in products_df.select("product_category").distinct().collect()
+            }
+            
+            # The overall top products are among the top products of each category
+            top_by_category_df = spark.read.parquet(by_category_path) \
+                .filter(~col("product_category").isin(list(affected_categories)))
+            if ranked_categories:
+                top_by_category_df = top_by_category_df.unionByName(spark.read.parquet(staging_paths["top_by_category"]))
+            overall_df = compute_top_products(
+                top_by_category_df.drop("rank")
+                    .withColumnRenamed("revenue", "total_revenue")
+                    .withColumnRenamed("quantity_sold", "items_sold")
+                    .drop("avg_price"),
+                top_n
+            )["overall"]
+            write_kpi(overall_df, staging_paths["top_overall"], ["rank"])
+        
+        # Swap in the merged totals and replace the partials of the merged months
+        for name in tables:
+            swap_directory(staging_paths[name], os.path.join(revenue_dir, name))
+        
+        for partial_name in REVENUE_PARTIALS.values():
+            partial_path = os.path.join(revenue_dir, "_partials", partial_name)
+            for order_year, order_month in partitions:
+                partition_dir = os.path.join(f"order_year={order_year}", f"order_month={order_month}")
+                staged_partition = os.path.join(staging_paths[partial_name], partition_dir)
+                if os.path.exists(staged_partition):
+                    os.makedirs(os.path.dirname(os.path.join(partial_path, partition_dir)), exist_ok=True)
+                    swap_directory(staged_partition, os.path.join(partial_path, partition_dir))
+                elif os.path.exists(os.path.join(partial_path, partition_dir)):
+                    shutil.rmtree(os.path.join(partial_path, partition_dir))
+        
+        # Replace the rankings of the affected categories; categories left without products keep none
+        if affected_categories:
+            for category in affected_categories:
+                category_dir = f"product_category={category}"
+                if category in ranked_categories:
+                    swap_directory(
+                        os.path.join(staging_paths["top_by_category"], category_dir),
+                        os.path.join(by_category_path, category_dir)
+                    )
+                else:
+                    shutil.rmtree(os.path.join(by_category_path, category_dir), ignore_errors=True)
+            swap_directory(staging_paths["top_overall"], os.path.join(top_products_dir, "overall"))
+    
+    except Exception as e:
+        logger.error(f"Error merging KPIs: {str(e)}")
+        raise
+    
+    finally:
+        if aggregate_df is not None:
+            aggregate_df.unpersist()
+        for staging_path in staging_paths.values():
+            shutil.rmtree(staging_path, ignore_errors=True)
+    
+    # Record the merged partitions as processed
+    state = load_kpi_state(state_path)
+    signatures = get_fact_partition_signatures(sales_fact_path)
+    for order_year, order_month in partitions:
+        key = f"{order_year}/{order_month}"
+        if key in signatures:
+            state[key] = signatures[key]
+        else:
+            state.pop(key, None)
+    save_kpi_state(state, state_path)
+    
+    logger.info(f"Successfully merged {len(partitions)} sales fact partitions into KPIs")
+    return partitions
+
+# Sketch-backed KPI functions
+def check_sketch_support(spark):
+    """
+    Check that the Spark session supports the HyperLogLog sketch functions.
+    
+    Args:
+        spark: SparkSession
+    
+    Raises:
+        RuntimeError: If Spark is older than HLL_MIN_SPARK_VERSION
+    """
+    version = tuple(int(part) for part in spark.version.split(".")[:2])
+    if version < HLL_MIN_SPARK_VERSION:
+        required = ".".join(str(part) for part in HLL_MIN_SPARK_VERSION)
+        raise RuntimeError(
+            f"Sketch-backed KPIs need the hll_* functions of Spark {required} or later, "
+            f"but this session runs Spark {spark.version}"
+        )
+
+def get_sketch_paths(output_dir):
+    """
+    Get the paths of the KPI sketch state tables.
+    
+    Args:
+        output_dir: Path to the gold KPI directory
+    
+    Returns:
+        Dictionary of sketch table name to path
+    """
+    sketch_dir = os.path.join(output_dir, "_sketches")
+    return {
+        "users_by_date": os.path.join(sketch_dir, "users_by_date"),
+        "customers_by_date": os.path.join(sketch_dir, "customers_by_date"),
+        "top_products_by_date": os.path.join(sketch_dir, "top_products_by_date")
+    }
+
+def compute_kpi_sketches(spark, sales_df, user_activity_df, output_dir, lg_config_k=HLL_LG_CONFIG_K,
+                         top_k_capacity=TOP_K_CAPACITY):
+    """
+    Build the mergeable sketch state behind the approximate KPIs.
+    
+    Three tables are written, partitioned by year and month so a run can
+    replace single months:
+    - users_by_date: a HyperLogLog sketch of user_id per event date and category
+    - customers_by_date: a HyperLogLog sketch of customer_id per order date and category
+    - top_products_by_date: the top_k_capacity products by items sold per
+      order date and category, with the largest count that was cut off
+    
+    The customer sketches and product counts come from one aggregation of
+    the sales fact at product level; the per-category sketch is the union
+    of the product sketches, which is exact for HyperLogLog.
+    
+    Args:
+        spark: SparkSession
+        sales_df: Sales fact DataFrame
+        user_activity_df: User activity fact DataFrame
+        output_dir: Path to the gold KPI directory
+        lg_config_k: HyperLogLog precision, from 4 to 21
+        top_k_capacity: Products kept per day and category
+    
+    Returns:
+        Dictionary of sketch table name to DataFrame
+    """
+    logger.info(f"Computing KPI sketches into {output_dir}")
+    check_sketch_support(spark)
+    
+    paths = get_sketch_paths(output_dir)
+    product_df = None
+    
+    try:
+        users_df = user_activity_df.groupBy("event_date", "category").agg(
+            expr(f"hll_sketch_agg(user_id, {lg_config_k})").alias("users_sketch")
+        ).withColumn("year", year(col("event_date"))).withColumn("month", month(col("event_date")))
+        
+        product_df = sales_df.groupBy("order_date", "product_category", "product_id").agg(
+            expr(f"hll_sketch_agg(customer_id, {lg_config_k})").alias("customers_sketch"),
+            spark_sum("quantity").alias("items_sold")
+        ).persist(StorageLevel.MEMORY_AND_DISK)
+        
+        customers_df = product_df.groupBy("order_date", "product_category").agg(
+            expr("hll_union_agg(customers_sketch)").alias("customers_sketch")
+        ).withColumn("year", year(col("order_date"))).withColumn("month", month(col("order_date")))
+        
+        day_window = Window.partitionBy("order_date", "product_category") \
+            .orderBy(col("items_sold").desc(), col("product_id"))
+        ranked_df = product_df.select("order_date", "product_category", "product_id", "items_sold") \
+            .withColumn("rank", row_number().over(day_window))
+        
+        threshold_df = ranked_df.filter(col("rank") > top_k_capacity) \
+            .groupBy("order_date", "product_category") \
+            .agg(spark_max("items_sold").alias("threshold"))
+        
+        top_products_df = ranked_df.filter(col("rank") <= top_k_capacity) \
+            .join(threshold_df, ["order_date", "product_category"], "left") \
+            .na.fill({"threshold": 0}) \
+            .drop("rank") \
+            .withColumn("year", year(col("order_date"))).withColumn("month", month(col("order_date")))
+        
+        sketches = {
+            "users_by_date": users_df,
+            "customers_by_date": customers_df,
+            "top_products_by_date": top_products_df
+        }
+        
+        for name, sketch_df in sketches.items():
+            sketch_df.write.mode("overwrite") \
+                .option("partitionOverwriteMode", "dynamic") \
+                .partitionBy("year", "month") \
+                .parquet(paths[name])
+            logger.info(f"Wrote KPI sketch table {name}")
+        
+        logger.info(f"Successfully computed {len(sketches)} KPI sketch tables")
+        return sketches
+    
+    except Exception as e:
+        logger.error(f"Error computing KPI sketches: {str(e)}")
+        raise
+    
+    finally:
+        if product_df is not None:
+            product_df.unpersist()
+
+def read_sketches(spark, sketch_path, date_column, start_date=None, end_date=None):
+    """
+    Read sketch rows for a date range, pruning year and month partitions.
+    
+    Args:
+        spark: SparkSession
+        sketch_path: Path to a sketch table
+        date_column: Date column of the sketch table
+        start_date: First date to include (defaults to all history)
+        end_date: Last date to include (defaults to all history)
+    
+    Returns:
+        DataFrame of sketch rows
+    """
+    df = spark.read.parquet(sketch_path)
+    start_date, end_date = to_datetime(start_date), to_datetime(end_date)
+    
+    if start_date is not None:
+        df = df.filter((col("year") * 100 + col("month")) >= start_date.year * 100 + start_date.month)
+        df = df.filter(col(date_column) >= lit(start_date.date()))
+    if end_date is not None:
+        df = df.filter((col("year") * 100 + col("month")) <= end_date.year * 100 + end_date.month)
+        df = df.filter(col(date_column) <= lit(end_date.date()))
+    
+    return df
+
+def estimate_distinct(spark, sketch_path, date_column, sketch_column, start_date=None, end_date=None,
+                      group_columns=None, period=None):
+    """
+    Estimate distinct counts by merging HyperLogLog sketches, without reading facts.
+    
+    Each estimate has a relative standard error of about
+    1.04 / sqrt(2 ** lg_config_k) whatever the number of sketches merged:
+    about 1.6% at the default precision of 12, so 95% of estimates fall
+    within 3.3% of the exact count. Small counts are close to exact.
+    
+    Args:
+        spark: SparkSession
+        sketch_path: Path to users_by_date or customers_by_date
+        date_column: Date column of the sketch table
+        sketch_column: Sketch column of the sketch table
+        start_date: First date to include (defaults to all history)
+        end_date: Last date to include (defaults to all history)
+        group_columns: List of columns to estimate per, e.g. the category
+        period: None for one estimate over the range, "day" or "month"
+    
+    Returns:
+        DataFrame with the group and period columns and distinct_count
+    """
+    check_sketch_support(spark)
+    df = read_sketches(spark, sketch_path, date_column, start_date, end_date)
+    
+    group_columns = list(group_columns or [])
+    if period == "day":
+        group_columns.append(date_column)
+    elif period == "month":
+        group_columns.extend(["year", "month"])
+    elif period is not None:
+        raise ValueError(f"Unknown period: {period}")
+    
+    return df.groupBy(*group_columns).agg(
+        expr(f"hll_sketch_estimate(hll_union_agg({sketch_column}))").alias("distinct_count")
+    )
+
+def estimate_rolling_distinct(spark, sketch_path, date_column, sketch_column, window_days,
+                              start_date=None, end_date=None, group_columns=None):
+    """
+    Estimate distinct counts over a trailing window of days ending on each day.
+    
+    Each day's sketch is fanned out to the window_days windows it belongs
+    to and the sketches of every window are merged, so the facts are not
+    read. The error bounds are those of estimate_distinct.
+    
+    Args:
+        spark: SparkSession
+        sketch_path: Path to users_by_date or customers_by_date
+        date_column: Date column of the sketch table
+        sketch_column: Sketch column of the sketch table
+        window_days: Number of days in each window, e.g. 7 or 30
+        start_date: First window end date (defaults to all history)
+        end_date: Last window end date (defaults to all history)
+        group_columns: List of columns to estimate per, e.g. the category
+    
+    Returns:
+        DataFrame with the group columns, window_end and distinct_count
+    """
+    read_start = to_datetime(start_date)
+    if read_start is not None:
+        read_start = read_start - datetime.timedelta(days=window_days - 1)
+    
+    check_sketch_support(spark)
+    df = read_sketches(spark, sketch_path, date_column, read_start, end_date)
+    group_columns = list(group_columns or [])
+    
+    windows_df = df.withColumn(
+        "window_end",
+        explode(expr(f"sequence({date_column}, date_add({date_column}, {window_days - 1}))"))
+    )
+    
+    if start_date is not None:
+        windows_df = windows_df.filter(col("window_end") >= lit(to_datetime(start_date).date()))
+    if end_date is not None:
+        windows_df = windows_df.filter(col("window_end") <= lit(to_datetime(end_date).date()))
+    
+    return windows_df.groupBy(*group_columns, "window_end").agg(
+        expr(f"hll_sketch_estimate(hll_union_agg({sketch_column}))").alias("distinct_count")
+    )
+
+def estimate_top_products(spark, sketch_path, start_date=None, end_date=None, top_n=KPI_TOP_N):
+    """
+    Estimate the top products per category by merging daily top-K summaries.
+    
+    Each day and category keeps only its top TOP_K_CAPACITY products and
+    the largest count it cut off (threshold). Over a date range a product's
+    items sold is at least the sum of its kept counts (lower bound) and at
+    most that plus the thresholds of the days it was cut off (upper bound).
+    A product whose true total exceeds the sum of all thresholds is always
+    kept on some day, so heavy hitters are never missed, and rankings are
+    exact when no day of the range had more products than the capacity.
+    
+    Args:
+        spark: SparkSession
+        sketch_path: Path to top_products_by_date
+        start_date: First order date to include (defaults to all history)
+        end_date: Last order date to include (defaults to all history)
+        top_n: Number of products per category
+    
+    Returns:
+        DataFrame with product_category, product_id, items_sold,
+        items_sold_upper_bound and rank
+    """
+    df = read_sketches(spark, sketch_path, "order_date", start_date, end_date)
+    
+    total_threshold_df = df.select("order_date", "product_category", "threshold").distinct() \
+        .groupBy("product_category") \
+        .agg(spark_sum("threshold").alias("total_threshold"))
+    
+    products_df = df.groupBy("product_category", "product_id").agg(
+        spark_sum("items_sold").alias("items_sold"),
+        spark_sum("threshold").alias("kept_threshold")
+    )
+    
+    category_window = Window.partitionBy("product_category").orderBy(col("items_sold").desc(), col("product_id"))
+    
+    return products_df.join(total_threshold_df, "product_category") \
+        .withColumn(
+            "items_sold_upper_bound",
+            col("items_sold") + col("total_threshold") - col("kept_threshold")
+        ) \
+        .withColumn("rank", row_number().over(category_window)) \
+        .filter(col("rank") <= top_n) \
+        .select("product_category", "product_id", "items_sold", "items_sold_upper_bound", "rank")
@@ -20,13 +20,23 @@ The data includes:
 """
 
 import json
+import gzip
+import heapq
+import io
 import random
-import uuid
 import datetime
 import ipaddress
 import os
+import sys
+import numpy as np
 from faker import Faker
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import shared generator helpers
+from data_generation.generator_utils import generate_uuid
+
 # Initialize Faker
 fake = Faker()
 
@@ -96,6 +106,9 @@ USER_AGENTS = [
     "Mozilla/5.0 (Linux; Android 11; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.120 Mobile Safari/537.36"
 ]
 
+# ASCII codes of the hex digits, for building UUID strings in bulk
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
 def generate_ip():
     """Generate a random IP address."""
     return str(ipaddress.IPv4Address(random.randint(0, 2**32 - 1)))
@@ -117,6 +130,158 @@ def generate_product_data(category=None):
         "price": price
     }
 
+def generate_session_events(user_id, session_start, events_per_user_range=(1, 20), end_date=None):
+    """
+    Generate the events of a single user session.
+    
+    Args:
+        user_id: ID of the user owning the session
+        session_start: Start time of the session (datetime object)
+        events_per_user_range: Range of events per session (min, max)
+        end_date: Events after this date are not generated (datetime object)
+    
+    Returns:
+        List of the session's events as dictionaries, in generation order
+    """
+    if not end_date:
+        end_date = datetime.datetime.now()
+    
+    session_id = generate_uuid()
+    device_type = random.choices(DEVICE_TYPES, weights=DEVICE_WEIGHTS, k=1)[0]
+    ip_address = generate_ip()
+    user_agent = random.choice(USER_AGENTS)
+    
+    # Random number of events in this session
+    num_events = random.randint(*events_per_user_range)
+    
+    # Keep track of cart items for this session
+    cart_items = {}
+    
+    # Generate events for this session
+    session_events = []
+    for event_idx in range(num_events):
+        # Events happen in sequence with some time passing between them
+        event_time = session_start + datetime.timedelta(minutes=random.randint(1, 10) * event_idx)
+        
+        if event_time > end_date:
+            break
+        
+        # Select event type with weighted probability
+        event_type = random.choices(EVENT_TYPES, weights=EVENT_WEIGHTS, k=1)[0]
+        
+        # Base event data
+        event = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "timestamp": event_time.isoformat(),
+            "event_type": event_type,
+            "device_type": device_type,
+            "ip_address": ip_address,
+            "user_agent": user_agent
+        }
+        
+        # Add event-specific data
+        if event_type == "page_view":
+            # Page views might be to category pages or other site pages
+            if random.random() < 0.3:
+                event["page"] = f"/category/{random.choice(CATEGORIES)}"
+            else:
+                event["page"] = random.choice(["/", "/about", "/contact", "/deals", "/account"])
+        
+        elif event_type == "product_view":
+            # Product views always have product data
+            product_data = generate_product_data()
+            event.update(product_data)
+            event["page"] = f"/product/{product_data['product_id']}"
+        
+        elif event_type == "add_to_cart":
+            # Add to cart events have product data and quantity
+            product_data = generate_product_data()
+            quantity = random.randint(1, 5)
+            
+            # Store in cart for potential removal later
+            cart_items[product_data["product_id"]] = {
+                "quantity": quantity,
+                "product_data": product_data
+            }
+            
+            event.update(product_data)
+            event["quantity"] = quantity
+        
+        elif event_type == "remove_from_cart":
+            # Can only remove items that are in the cart
+            if cart_items:
+                product_id = random.choice(list(cart_items.keys()))
+                item = cart_items[product_id]
+                
+                # Sometimes remove all, sometimes just reduce quantity
+                if random.random() < 0.7 or item["quantity"] == 1:
+                    # Remove completely
+                    event.update(item["product_data"])
+                    event["quantity"] = item["quantity"]
+                    del cart_items[product_id]
+                else:
+                    # Reduce quantity
+                    remove_qty = random.randint(1, item["quantity"] - 1)
+                    event.update(item["product_data"])
+                    event["quantity"] = remove_qty
+                    cart_items[product_id]["quantity"] -= remove_qty
+            else:
+                # If cart is empty, change to a page view event
+                event["event_type"] = "page_view"
+                event["page"] = random.choice(["/", "/cart"])
+        
+        elif event_type == "checkout_start":
+            # Checkout events include cart total
+            if cart_items:
+                cart_total = sum(
+                    item["product_data"]["price"] * item["quantity"] 
+                    for item in cart_items.values()
+                )
+                event["cart_total"] = round(cart_total, 2)
+                event["items_count"] = sum(item["quantity"] for item in cart_items.values())
+            else:
+                # If cart is empty, change to a page view event
+                event["event_type"] = "page_view"
+                event["page"] = random.choice(["/", "/cart"])
+        
+        elif event_type == "checkout_complete" or event_type == "purchase":
+            # Purchase events include cart items and total
+            if cart_items:
+                cart_total = sum(
+                    item["product_data"]["price"] * item["quantity"] 
+                    for item in cart_items.values()
+                )
+                
+                event["cart_total"] = round(cart_total, 2)
+                event["items_count"] = sum(item["quantity"] for item in cart_items.values())
+                
+                # Add order ID for purchases
+                if event_type == "purchase":
+                    event["order_id"] = generate_uuid()
+                    
+                    # Add purchased items detail
+                    event["items"] = [
+                        {
+                            "product_id": pid,
+                            "category": item["product_data"]["category"],
+                            "price": item["product_data"]["price"],
+                            "quantity": item["quantity"]
+                        }
+                        for pid, item in cart_items.items()
+                    ]
+                    
+                    # Clear cart after purchase
+                    cart_items = {}
+            else:
+                # If cart is empty, change to a page view event
+                event["event_type"] = "page_view"
+                event["page"] = random.choice(["/", "/cart"])
+        
+        session_events.append(event)
+    
+    return session_events
+
 def generate_user_activity(num_users=1000, events_per_user_range=(1, 20), start_date=None, end_date=None):
     """
     Generate user activity data.
@@ -138,161 +303,575 @@ def generate_user_activity(num_users=1000, events_per_user_range=(1, 20), start_
     user_activities = []
     
     # Generate user IDs
-    user_ids = [str(uuid.uuid4()) for _ in range(num_users)]
+    user_ids = [generate_uuid() for _ in range(num_users)]
     
     for user_id in user_ids:
         # Each user has a random number of sessions
         num_sessions = random.randint(1, 5)
         
         for _ in range(num_sessions):
-            session_id = str(uuid.uuid4())
-            device_type = random.choices(DEVICE_TYPES, weights=DEVICE_WEIGHTS, k=1)[0]
-            ip_address = generate_ip()
-            user_agent = random.choice(USER_AGENTS)
-            
-            # Random number of events in this session
-            num_events = random.randint(*events_per_user_range)
-            
             # Session start time
             session_start = start_date + datetime.timedelta(
                 seconds=random.randint(0, int((end_date - start_date).total_seconds()))
             )
             
-            # Keep track of cart items for this session
-            cart_items = {}
-            
-            # Generate events for this session
-            for event_idx in range(num_events):
-                # Events happen in sequence with some time passing between them
-                event_time = session_start + datetime.timedelta(minutes=random.randint(1, 10) * event_idx)
-                
-                if event_time > end_date:
-                    break
-                
-                # Select event type with weighted probability
-                event_type = random.choices(EVENT_TYPES, weights=EVENT_WEIGHTS, k=1)[0]
-                
-                # Base event data
-                event = {
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "timestamp": event_time.isoformat(),
-                    "event_type": event_type,
-                    "device_type": device_type,
-                    "ip_address": ip_address,
-                    "user_agent": user_agent
-                }
-                
-                # Add event-specific data
-                if event_type == "page_view":
-                    # Page views might be to category pages or other site pages
-                    if random.random() < 0.3:
-                        event["page"] = f"/category/{random.choice(CATEGORIES)}"
-                    else:
-                        event["page"] = random.choice(["/", "/about", "/contact", "/deals", "/account"])
-                
-                elif event_type == "product_view":
-                    # Product views always have product data
-                    product_data = generate_product_data()
-                    event.update(product_data)
-                    event["page"] = f"/product/{product_data['product_id']}"
-                
-                elif event_type == "add_to_cart":
-                    # Add to cart events have product data and quantity
-                    product_data = generate_product_data()
-                    quantity = random.randint(1, 5)
-                    
-                    # Store in cart for potential removal later
-                    cart_items[product_data["product_id"]] = {
-                        "quantity": quantity,
-                        "product_data": product_data
-                    }
-                    
-                    event.update(product_data)
-                    event["quantity"] = quantity
-                
-                elif event_type == "remove_from_cart":
-                    # Can only remove items that are in the cart
-                    if cart_items:
-                        product_id = random.choice(list(cart_items.keys()))
-                        item = cart_items[product_id]
-                        
-                        # Sometimes remove all, sometimes just reduce quantity
-                        if random.random() < 0.7 or item["quantity"] == 1:
-                            # Remove completely
-                            event.update(item["product_data"])
-                            event["quantity"] = item["quantity"]
-                            del cart_items[product_id]
-                        else:
-                            # Reduce quantity
-                            remove_qty = random.randint(1, item["quantity"] - 1)
-                            event.update(item["product_data"])
-                            event["quantity"] = remove_qty
-                            cart_items[product_id]["quantity"] -= remove_qty
-                    else:
-                        # If cart is empty, change to a page view event
-                        event["event_type"] = "page_view"
-                        event["page"] = random.choice(["/", "/cart"])
-                
-                elif event_type == "checkout_start":
-                    # Checkout events include cart total
-                    if cart_items:
-                        cart_total = sum(
-                            item["product_data"]["price"] * item["quantity"] 
-                            for item in cart_items.values()
-                        )
-                        event["cart_total"] = round(cart_total, 2)
-                        event["items_count"] = sum(item["quantity"] for item in cart_items.values())
-                    else:
-                        # If cart is empty, change to a page view event
-                        event["event_type"] = "page_view"
-                        event["page"] = random.choice(["/", "/cart"])
-                
-                elif event_type == "checkout_complete" or event_type == "purchase":
-                    # Purchase events include cart items and total
-                    if cart_items:
-                        cart_total = sum(
-                            item["product_data"]["price"] * item["quantity"] 
-                            for item in cart_items.values()
-                        )
-                        
-                        event["cart_total"] = round(cart_total, 2)
-                        event["items_count"] = sum(item["quantity"] for item in cart_items.values())
-                        
-                        # Add order ID for purchases
-                        if event_type == "purchase":
-                            event["order_id"] = str(uuid.uuid4())
-                            
-                            # Add purchased items detail
-                            event["items"] = [
-                                {
-                                    "product_id": pid,
-                                    "category": item["product_data"]["category"],
-                                    "price": item["product_data"]["price"],
-                                    "quantity": item["quantity"]
-                                }
-                                for pid, item in cart_items.items()
-                            ]
-                            
-                            # Clear cart after purchase
-                            cart_items = {}
-                    else:
-                        # If cart is empty, change to a page view event
-                        event["event_type"] = "page_view"
-                        event["page"] = random.choice(["/", "/cart"])
-                
-                user_activities.append(event)
+            user_activities.extend(
+                generate_session_events(user_id, session_start, events_per_user_range, end_date)
+            )
     
     # Sort all events by timestamp
     user_activities.sort(key=lambda x: x["timestamp"])
     
     return user_activities
 
+def next_session_offset(previous_offset, span_seconds, remaining):
+    """
+    Draw the next of a user's session start offsets in increasing order.
+    
+    The smallest of `remaining` uniform draws over (previous_offset,
+    span_seconds] is sampled directly, so a user's sorted session starts
+    can be produced one at a time without drawing them all up front.
+    
+    Args:
+        previous_offset: Offset in seconds of the previous session start
+        span_seconds: Length of the time range in seconds
+        remaining: Number of session starts still to draw for the user
+    
+    Returns:
+        Offset in seconds of the next session start
+    """
+    fraction = 1 - random.random() ** (1 / remaining)
+    return previous_offset + int((span_seconds - previous_offset) * fraction)
+
+def iter_user_activity(num_users=1000, events_per_user_range=(1, 20), start_date=None, end_date=None):
+    """
+    Lazily generate user activity data in global timestamp order.
+    
+    Each user only holds the start of their next session and the number of
+    sessions left; session starts are drawn lazily in increasing order.
+    Sessions are generated one at a time in start-time order and k-way
+    merged, so memory is bounded by the number of users plus the sessions
+    that overlap in time, instead of the total number of events.
+    
+    Args:
+        num_users: Number of unique users to simulate
+        events_per_user_range: Range of events per user (min, max)
+        start_date: Start date for events (datetime object)
+        end_date: End date for events (datetime object)
+    
+    Yields:
+        User activity events as dictionaries, sorted by timestamp
+    """
+    if not start_date:
+        start_date = datetime.datetime.now() - datetime.timedelta(days=30)
+    if not end_date:
+        end_date = datetime.datetime.now()
+    
+    # Heap of (next session offset, user sequence, user ID, sessions left)
+    span_seconds = int((end_date - start_date).total_seconds())
+    user_heap = []
+    for user_seq in range(num_users):
+        user_id = generate_uuid()
+        num_sessions = random.randint(1, 5)
+        offset = next_session_offset(0, span_seconds, num_sessions)
+        user_heap.append((offset, user_seq, user_id, num_sessions))
+    heapq.heapify(user_heap)
+    
+    # Heap of (timestamp, session sequence, position, session events)
+    heap = []
+    seq = 0
+    while user_heap:
+        offset, user_seq, user_id, num_sessions = heapq.heappop(user_heap)
+        if num_sessions > 1:
+            next_offset = next_session_offset(offset, span_seconds, num_sessions - 1)
+            heapq.heappush(user_heap, (next_offset, user_seq, user_id, num_sessions - 1))
+        
+        # Every pending event earlier than this session's start can be emitted
+        session_start = start_date + datetime.timedelta(seconds=offset)
+        session_start_str = session_start.isoformat()
+        while heap and heap[0][0] <= session_start_str:
+            _, heap_seq, pos, events = heapq.heappop(heap)
+            yield events[pos]
+            if pos + 1 < len(events):
+                heapq.heappush(heap, (events[pos + 1]["timestamp"], heap_seq, pos + 1, events))
+        
+        # Events within a session are not generated in time order
+        events = generate_session_events(user_id, session_start, events_per_user_range, end_date)
+        events.sort(key=lambda x: x["timestamp"])
+        if events:
+            heapq.heappush(heap, (events[0]["timestamp"], seq, 0, events))
+        seq += 1
+    
+    while heap:
+        _, heap_seq, pos, events = heapq.heappop(heap)
+        yield events[pos]
+        if pos + 1 < len(events):
+            heapq.heappush(heap, (events[pos + 1]["timestamp"], heap_seq, pos + 1, events))
+
+def generate_uuid_array(rng, size):
+    """Generate an object array of random version 4 UUID strings."""
+    raw = rng.integers(0, 256, size=(size, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    
+    # Hex digits as ASCII codes, with the dashes inserted, decoded as one string
+    digits = HEX_DIGITS[np.stack([raw >> 4, raw & 0x0F], axis=2).reshape(size, 32)]
+    text = np.insert(digits, [8, 12, 16, 20], ord("-"), axis=1).tobytes().decode("ascii")
+    
+    uuids = np.empty(size, dtype=object)
+    uuids[:] = [text[i:i + 36] for i in range(0, size * 36, 36)]
+    return uuids
+
+def generate_ip_array(rng, size):
+    """Generate an object array of random IPv4 address strings."""
+    octets = rng.integers(0, 256, size=(size, 4), dtype=np.uint8).tolist()
+    return np.array([f"{a}.{b}.{c}.{d}" for a, b, c, d in octets], dtype=object)
+
+def generate_user_activity_batches(num_users=1000, events_per_user_range=(1, 20), start_date=None, end_date=None,
+                                   users_per_batch=10000, seed=None):
+    """
+    Generate user activity data as columnar NumPy batches.
+    
+    This is the bulk counterpart of generate_user_activity for load tests.
+    Users, sessions, event types, timestamps and product fields are drawn as
+    NumPy arrays. Cart state keeps the row generator's semantics: each
+    session's cart is a row of lines in insertion order, and the n-th cart
+    event of every session is applied in one vectorized step, so the loop
+    runs once per cart event position instead of once per event.
+    
+    Args:
+        num_users: Number of unique users to simulate
+        events_per_user_range: Range of events per session (min, max)
+        start_date: Start date for events (datetime object)
+        end_date: End date for events (datetime object)
+        users_per_batch: Number of users whose events make up one batch
+        seed: Seed for the NumPy random generator
+    
+    Yields:
+        Dictionaries mapping column names to NumPy arrays, one per batch of
+        users, with events sorted by timestamp within the batch. Missing
+        values are None for object columns, NaN for float columns and -1 for
+        integer columns.
+    """
+    if not start_date:
+        start_date = datetime.datetime.now() - datetime.timedelta(days=30)
+    if not end_date:
+        end_date = datetime.datetime.now()
+    
+    rng = np.random.default_rng(seed)
+    
+    # Lookup tables shared by every batch
+    event_names = np.array(EVENT_TYPES, dtype=object)
+    event_probs = np.array(EVENT_WEIGHTS, dtype=float) / sum(EVENT_WEIGHTS)
+    device_names = np.array(DEVICE_TYPES, dtype=object)
+    device_probs = np.array(DEVICE_WEIGHTS, dtype=float) / sum(DEVICE_WEIGHTS)
+    user_agents = np.array(USER_AGENTS, dtype=object)
+    category_names = np.array(CATEGORIES, dtype=object)
+    category_pages = np.array([f"/category/{c}" for c in CATEGORIES], dtype=object)
+    site_pages = np.array(["/", "/about", "/contact", "/deals", "/account"], dtype=object)
+    product_low = np.array([PRODUCT_RANGES[c][0] for c in CATEGORIES])
+    product_high = np.array([PRODUCT_RANGES[c][1] for c in CATEGORIES])
+    price_low = np.array([PRICE_RANGES[c][0] for c in CATEGORIES], dtype=float)
+    price_high = np.array([PRICE_RANGES[c][1] for c in CATEGORIES], dtype=float)
+    product_pages = np.array([f"/product/{i}" for i in range(product_high.max() + 1)], dtype=object)
+    
+    page_view, product_view, add_to_cart, remove_from_cart = 0, 1, 2, 3
+    purchase = EVENT_TYPES.index("purchase")
+    
+    start = np.datetime64(start_date, "us")
+    end = np.datetime64(end_date, "us")
+    span_seconds = int((end_date - start_date).total_seconds())
+    
+    for batch_start in range(0, num_users, users_per_batch):
+        batch_users = min(users_per_batch, num_users - batch_start)
+        user_ids = generate_uuid_array(rng, batch_users)
+        
+        # Session level attributes
+        sessions_per_user = rng.integers(1, 6, size=batch_users)
+        num_sessions = int(sessions_per_user.sum())
+        session_user = np.repeat(np.arange(batch_users), sessions_per_user)
+        session_ids = generate_uuid_array(rng, num_sessions)
+        session_device = rng.choice(len(DEVICE_TYPES), size=num_sessions, p=device_probs)
+        session_ip = generate_ip_array(rng, num_sessions)
+        session_agent = rng.integers(0, len(USER_AGENTS), size=num_sessions)
+        session_start = start + (rng.integers(0, span_seconds + 1, size=num_sessions) * 1_000_000).astype("timedelta64[us]")
+        events_per_session = rng.integers(events_per_user_range[0], events_per_user_range[1] + 1, size=num_sessions)
+        
+        # Event timestamps, same spacing rule as the row generator
+        session = np.repeat(np.arange(num_sessions), events_per_session)
+        session_offset = np.cumsum(events_per_session) - events_per_session
+        event_idx = np.arange(len(session)) - session_offset[session]
+        minutes = rng.integers(1, 11, size=len(session)) * event_idx
+        timestamp = session_start[session] + (minutes * 60_000_000).astype("timedelta64[us]")
+        
+        # A session stops at its first event past end_date
+        late = (timestamp > end).astype(np.int64)
+        late_total = np.cumsum(late)
+        late_before = np.concatenate(([0], late_total))[session_offset]
+        keep = (late_total - late_before[session]) == 0
+        session = session[keep]
+        timestamp = timestamp[keep]
+        num_events = len(session)
+        
+        # Bulk draws for event types and product fields
+        codes = rng.choice(len(EVENT_TYPES), size=num_events, p=event_probs)
+        draw_category = rng.integers(0, len(CATEGORIES), size=num_events)
+        draw_product = product_low[draw_category] + (
+            rng.random(num_events) * (product_high - product_low + 1)[draw_category]
+        ).astype(np.int64)
+        draw_price = np.round(
+            price_low[draw_category] + rng.random(num_events) * (price_high - price_low)[draw_category], 2
+        )
+        draw_quantity = rng.integers(1, 6, size=num_events)
+        page_draw = rng.random(num_events)
+        
+        page = np.full(num_events, None, dtype=object)
+        product_id = np.full(num_events, -1, dtype=np.int64)
+        category = np.full(num_events, None, dtype=object)
+        price = np.full(num_events, np.nan)
+        quantity = np.full(num_events, -1, dtype=np.int64)
+        cart_total = np.full(num_events, np.nan)
+        items_count = np.full(num_events, -1, dtype=np.int64)
+        order_id = np.full(num_events, None, dtype=object)
+        items = np.full(num_events, None, dtype=object)
+        
+        # Page views go to a category page 30% of the time
+        is_page_view = codes == page_view
+        to_category = is_page_view & (page_draw < 0.3)
+        page[to_category] = category_pages[rng.integers(0, len(CATEGORIES), size=int(to_category.sum()))]
+        to_site = is_page_view & ~to_category
+        page[to_site] = site_pages[rng.integers(0, len(site_pages), size=int(to_site.sum()))]
+        
+        # Product views and add to cart events carry the drawn product
+        has_product = (codes == product_view) | (codes == add_to_cart)
+        product_id[has_product] = draw_product[has_product]
+        category[has_product] = category_names[draw_category[has_product]]
+        price[has_product] = draw_price[has_product]
+        is_product_view = codes == product_view
+        page[is_product_view] = product_pages[draw_product[is_product_view]]
+        is_add = codes == add_to_cart
+        quantity[is_add] = draw_quantity[is_add]
+        
+        # Resolve cart state for all sessions at once, one cart event position at a time
+        cart_events = np.flatnonzero(codes >= add_to_cart)
+        num_cart_events = len(cart_events)
+        pick = rng.random(num_cart_events)
+        remove_all = rng.random(num_cart_events)
+        remove_share = rng.random(num_cart_events)
+        order_ids = generate_uuid_array(rng, int((codes == purchase).sum()))
+        
+        cart_code = codes[cart_events]
+        cart_product = draw_product[cart_events]
+        cart_category = draw_category[cart_events]
+        cart_price = draw_price[cart_events]
+        cart_quantity = draw_quantity[cart_events]
+        
+        # Each session with cart events gets a row of cart lines, in insertion order
+        _, first_event, cart_row = np.unique(session[cart_events], return_index=True, return_inverse=True)
+        position = np.arange(num_cart_events) - first_event[cart_row]
+        num_rows = len(first_event)
+        adds_per_row = np.bincount(cart_row[cart_code == add_to_cart], minlength=num_rows)
+        width = max(int(adds_per_row.max(initial=0)), 1)
+        line_quantity = np.zeros((num_rows, width), dtype=np.int64)
+        line_product = np.full((num_rows, width), -1, dtype=np.int64)
+        line_category = np.zeros((num_rows, width), dtype=np.int64)
+        line_price = np.zeros((num_rows, width))
+        next_line = np.zeros(num_rows, dtype=np.int64)
+        
+        by_position = np.argsort(position, kind="stable")
+        bounds = np.searchsorted(position[by_position], np.arange(position.max(initial=-1) + 2))
+        bought = []
+        
+        for step in range(len(bounds) - 1):
+            # The step-th cart event of every session, at most one per cart row
+            j = by_position[bounds[step]:bounds[step + 1]]
+            row = cart_row[j]
+            code = cart_code[j]
+            
+            # Adding a product already in the cart replaces its line in place
+            is_add = code == add_to_cart
+            j_add, row_add = j[is_add], row[is_add]
+            same = (line_product[row_add] == cart_product[j_add, None]) & (line_quantity[row_add] > 0)
+            in_cart = same.any(axis=1)
+            line = np.where(in_cart, same.argmax(axis=1), next_line[row_add])
+            next_line[row_add] += ~in_cart
+            line_quantity[row_add, line] = cart_quantity[j_add]
+            line_product[row_add, line] = cart_product[j_add]
+            line_category[row_add, line] = cart_category[j_add]
+            line_price[row_add, line] = cart_price[j_add]
+            
+            j, row, code = j[~is_add], row[~is_add], code[~is_add]
+            live = line_quantity[row] > 0
+            lines = live.sum(axis=1)
+            
+            # Empty cart turns the event into a page view
+            empty = lines == 0
+            idx = cart_events[j[empty]]
+            codes[idx] = page_view
+            page[idx] = np.where(pick[j[empty]] < 0.5, "/", "/cart").astype(object)
+            
+            # Remove picks the n-th live line: the first whose running count of live lines reaches n
+            is_remove = (code == remove_from_cart) & ~empty
+            j_remove, row_remove = j[is_remove], row[is_remove]
+            target = (pick[j_remove] * lines[is_remove]).astype(np.int64) + 1
+            line = (np.cumsum(live[is_remove], axis=1) == target[:, None]).argmax(axis=1)
+            line_qty = line_quantity[row_remove, line]
+            remove_qty = np.where(
+                (remove_all[j_remove] < 0.7) | (line_qty == 1),
+                line_qty,
+                1 + (remove_share[j_remove] * (line_qty - 1)).astype(np.int64)
+            )
+            idx = cart_events[j_remove]
+            product_id[idx] = line_product[row_remove, line]
+            category[idx] = category_names[line_category[row_remove, line]]
+            price[idx] = line_price[row_remove, line]
+            quantity[idx] = remove_qty
+            line_quantity[row_remove, line] -= remove_qty
+            
+            # checkout_start, checkout_complete and purchase
+            is_checkout = (code > remove_from_cart) & ~empty
+            row_checkout = row[is_checkout]
+            checkout_qty = line_quantity[row_checkout]
+            idx = cart_events[j[is_checkout]]
+            cart_total[idx] = np.round((line_price[row_checkout] * checkout_qty).sum(axis=1), 2)
+            items_count[idx] = checkout_qty.sum(axis=1)
+            
+            # Purchases list the cart lines, then empty the cart
+            is_purchase = (code == purchase) & ~empty
+            row_purchase = row[is_purchase]
+            buyer, line = np.nonzero(line_quantity[row_purchase] > 0)
+            line_items = [
+                {"product_id": pid, "category": CATEGORIES[cat], "price": item_price, "quantity": item_qty}
+                for pid, cat, item_price, item_qty in zip(
+                    line_product[row_purchase[buyer], line].tolist(),
+                    line_category[row_purchase[buyer], line].tolist(),
+                    line_price[row_purchase[buyer], line].tolist(),
+                    line_quantity[row_purchase[buyer], line].tolist()
+                )
+            ]
+            splits = np.cumsum(np.bincount(buyer, minlength=len(row_purchase))).tolist()
+            bought.extend(zip(j[is_purchase].tolist(), (line_items[a:b] for a, b in zip([0] + splits, splits))))
+            line_quantity[row_purchase] = 0
+            next_line[row_purchase] = 0
+        
+        if bought:
+            # Order IDs go to purchases in event order
+            bought.sort(key=lambda p: p[0])
+            idx = cart_events[[p[0] for p in bought]]
+            order_id[idx] = order_ids[:len(bought)]
+            purchased_items = np.empty(len(bought), dtype=object)
+            for i, (_, purchase_items) in enumerate(bought):
+                purchased_items[i] = purchase_items
+            items[idx] = purchased_items
+        
+        
+        # Sort the batch by timestamp
+        order = np.argsort(timestamp, kind="stable")
+        event_session = session[order]
+        
+        yield {
+            "user_id": user_ids[session_user[event_session]],
+            "session_id": session_ids[event_session],
+            "timestamp": timestamp[order],
+            "event_type": event_names[codes[order]],
+            "device_type": device_names[session_device[event_session]],
+            "ip_address": session_ip[event_session],
+            "user_agent": user_agents[session_agent[event_session]],
+            "page": page[order],
+            "product_id": product_id[order],
+            "category": category[order],
+            "price": price[order],
+            "quantity": quantity[order],
+            "cart_total": cart_total[order],
+            "items_count": items_count[order],
+            "order_id": order_id[order],
+            "items": items[order]
+        }
+
+def batch_to_records(batch):
+    """
+    Convert a columnar batch into event dictionaries.
+    
+    Args:
+        batch: Dictionary of column arrays from generate_user_activity_batches
+    
+    Returns:
+        List of user activity events as dictionaries, with missing optional
+        fields left out as in generate_user_activity
+    """
+    columns = list(batch.keys())
+    values = []
+    for name in columns:
+        if name == "timestamp":
+            values.append(np.datetime_as_string(batch[name], unit="us").tolist())
+        else:
+            values.append(batch[name].tolist())
+    
+    records = []
+    for row in zip(*values):
+        event = {}
+        for name, value in zip(columns, row):
+            # Skip nulls: None, NaN and the -1 integer sentinel
+            if value is None or value != value or (value == -1 and name in ("product_id", "quantity", "items_count")):
+                continue
+            event[name] = value
+        records.append(event)
+    
+    return records
+
+def get_user_activity_arrow_schema():
+    """Define and return the Arrow schema for user activity data."""
+    import pyarrow as pa
+    
+    item_type = pa.struct([
+        ("product_id", pa.int32()),
+        ("category", pa.string()),
+        ("price", pa.float64()),
+        ("quantity", pa.int32())
+    ])
+    
+    return pa.schema([
+        ("user_id", pa.string()),
+        ("session_id", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("event_type", pa.string()),
+        ("device_type", pa.string()),
+        ("ip_address", pa.string()),
+        ("user_agent", pa.string()),
+        ("page", pa.string()),
+        ("product_id", pa.int32()),
+        ("category", pa.string()),
+        ("price", pa.float64()),
+        ("quantity", pa.int32()),
+        ("cart_total", pa.float64()),
+        ("items_count", pa.int32()),
+        ("order_id", pa.string()),
+        ("items", pa.list_(item_type))
+    ])
+
+def batch_to_arrow(batch):
+    """
+    Convert a columnar batch into an Arrow record batch without going through Python dicts.
+    
+    Args:
+        batch: Dictionary of column arrays from generate_user_activity_batches
+    
+    Returns:
+        pyarrow.RecordBatch with the user activity Arrow schema
+    """
+    import pyarrow as pa
+    
+    schema = get_user_activity_arrow_schema()
+    arrays = []
+    for field in schema:
+        values = batch[field.name]
+        if values.dtype.kind == "i":
+            # -1 is the null sentinel for integer columns
+            arrays.append(pa.array(values, type=field.type, mask=values == -1))
+        elif values.dtype.kind == "f":
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def save_to_parquet(data, filename):
+    """
+    Save user activity data to a Parquet file with nested item types.
+    
+    Args:
+        data: List of event dictionaries, or an iterable of columnar batches
+            from generate_user_activity_batches (written one row group per batch)
+        filename: Path to output Parquet file
+    
+    Returns:
+        Number of events written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = get_user_activity_arrow_schema()
+    
+    if isinstance(data, list):
+        rows = [
+            dict(event, timestamp=datetime.datetime.fromisoformat(event["timestamp"]))
+            for event in data
+        ]
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), filename)
+        return len(rows)
+    
+    count = 0
+    with pq.ParquetWriter(filename, schema) as writer:
+        for batch in data:
+            record_batch = batch_to_arrow(batch)
+            writer.write_batch(record_batch)
+            count += record_batch.num_rows
+    
+    return count
+
 def save_to_json(data, filename):
     """Save data to a JSON file."""
     with open(filename, 'w') as f:
         json.dump(data, f, indent=2)
 
+def open_jsonl(filename, mode="rt", compression=None):
+    """
+    Open a JSON Lines file, optionally compressed.
+    
+    Args:
+        filename: Path to the file
+        mode: Text file mode ("rt" or "wt")
+        compression: None, "gzip" or "zstd"; inferred from the file
+            extension (.gz / .zst) when not given
+    
+    Returns:
+        Text file object
+    """
+    if compression is None:
+        if filename.endswith(".gz"):
+            compression = "gzip"
+        elif filename.endswith(".zst"):
+            compression = "zstd"
+    
+    if compression == "gzip":
+        # Fixed header mtime keeps compressed output reproducible
+        binary_mode = mode.replace("t", "") + "b"
+        return io.TextIOWrapper(gzip.GzipFile(filename, binary_mode, mtime=0), encoding="utf-8")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the zstandard package")
+        return zstandard.open(filename, mode, encoding="utf-8")
+    elif compression is None:
+        return open(filename, mode, encoding="utf-8")
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+def save_to_jsonl(events, filename, compression=None):
+    """
+    Save events to a JSON Lines file, one compact JSON object per line.
+    
+    Events are written as they are consumed, so a generator such as
+    iter_user_activity is never materialized in memory.
+    
+    Args:
+        events: Iterable of event dictionaries
+        filename: Path to output file
+        compression: None, "gzip" or "zstd" (see open_jsonl)
+    
+    Returns:
+        Number of events written
+    """
+    count = 0
+    with open_jsonl(filename, "wt", compression) as f:
+        for event in events:
+            f.write(json.dumps(event, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    
+    return count
+
 def main():
     """Main function to generate and save user activity data."""
     # Create data directory if it doesn't exist